@@ -1,12 +1,13 @@
 from __future__ import annotations
-import numpy as np
 import math
 import yaml
 import os
 import simpy
-from typing import TYPE_CHECKING, List, Tuple, Optional, Union, TypedDict, Generator
-from functools import reduce
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple, Optional, Sequence, Union, TypedDict, Generator, cast
 from lapidary.app import AppConfig
+from lapidary.bandwidth import BandwidthModel
+from lapidary.util.free_ranges import FreeRangeIndex
+from lapidary.util.maximal_rectangles import MaximalRectangles
 from lapidary.components import ComponentStatus, NoC, PRR, Bank, OffchipInterface
 from lapidary.kernel import Kernel
 if TYPE_CHECKING:
@@ -30,7 +31,7 @@ class PartitionType(Enum):
     FULL_FLEXIBLE = 4
 
 
-class AcceleratorConfigType(TypedDict):
+class _AcceleratorConfigType(TypedDict):
     name: str
     num_glb_banks: int
     num_prr_height: int
@@ -39,6 +40,39 @@ class AcceleratorConfigType(TypedDict):
     partition: str
 
 
+class AcceleratorConfigType(_AcceleratorConfigType, total=False):
+    offchip_bandwidth: float
+    noc_bandwidth: float
+    glb_bank_size: int
+    bank_allocation: str
+    prr_placement: str
+    defragmentation: bool
+    migration_delay: int
+    max_migrations: int
+    reconfiguration_latency: int
+    max_batch_size: int
+    batch_window: int
+    preemption: bool
+    save_latency: int
+    restore_latency: int
+    elastic: bool
+    resize_penalty: int
+
+
+class BankAllocationType(Enum):
+    FIRST_IDLE = 1
+    FIRST_FIT = 2
+    BEST_FIT = 3
+    PRR_ADJACENT = 4
+
+
+class PRRPlacementType(Enum):
+    FIRST_FIT = 1
+    BEST_SHORT_SIDE_FIT = 2
+    BOTTOM_LEFT = 3
+    CONTACT_PERIMETER = 4
+
+
 class AcceleratorConfig:
     def __init__(self, config: Optional[Union[str, AcceleratorConfigType]] = None) -> None:
         self.name = 'accelerator'
@@ -46,6 +80,38 @@ class AcceleratorConfig:
         self.num_prr_height = 1
         self.num_prr_width = 8
         self.partition = PartitionType.FIXED
+        # Bandwidth shared by off-chip traffic of kernels. 0 means unlimited.
+        self.offchip_bandwidth = 0.0
+        self.noc_bandwidth = 0.0
+        # Capacity of a glb bank in bytes. 0 means that kernels only need their number of banks.
+        self.glb_bank_size = 0
+        # How FLEXIBLE and FULL_FLEXIBLE partitions choose banks: the first idle banks anywhere, or a contiguous run
+        # of banks that is the first, the smallest, or the closest to the prrs of the kernel
+        self.bank_allocation = BankAllocationType.FIRST_IDLE
+        # Where FLEXIBLE partitions place a prr shape: the first window in row-major order, or a maximal empty
+        # rectangle chosen by best short side fit, bottom left, or contact perimeter
+        self.prr_placement = PRRPlacementType.FIRST_FIT
+        # If True, FLEXIBLE partitions move running kernels to make room for a kernel that is blocked by
+        # fragmentation. A move stalls the kernel for migration_delay cycles, and at most max_migrations kernels
+        # are moved for one blocked kernel.
+        self.defragmentation = False
+        self.migration_delay = 0
+        self.max_migrations = 1
+        # Cycles to load the bitstream of one prr. It is only paid when a prr holds a different bitstream.
+        self.reconfiguration_latency = 0
+        # Ready kernels of the same app from up to max_batch_size tasks run together on one placement. A batch that
+        # is not full waits up to batch_window cycles for more kernels while other kernels run.
+        self.max_batch_size = 1
+        self.batch_window = 0
+        # If True, a kernel that does not fit preempts running kernels of lower task priority. Prrs of a preempted
+        # kernel stay busy for save_latency cycles, and it resumes its remaining runtime plus restore_latency.
+        self.preemption = False
+        self.save_latency = 0
+        self.restore_latency = 0
+        # If True, running kernels grow into idle adjacent prrs when no kernel is waiting. Their remaining runtime is
+        # scaled by the runtime of the larger app config, plus resize_penalty cycles.
+        self.elastic = False
+        self.resize_penalty = 0
 
         self.prr_height = 16
         self.prr_width = 4
@@ -87,6 +153,46 @@ class AcceleratorConfig:
                 self.partition = PartitionType.FULL_FLEXIBLE
             else:
                 raise Exception(f"Partition type should be either 'fixed', 'variable', or 'flexible'")
+        if 'offchip_bandwidth' in config_dict:
+            self.offchip_bandwidth = config_dict['offchip_bandwidth']
+        if 'noc_bandwidth' in config_dict:
+            self.noc_bandwidth = config_dict['noc_bandwidth']
+        if 'glb_bank_size' in config_dict:
+            self.glb_bank_size = config_dict['glb_bank_size']
+        if 'bank_allocation' in config_dict:
+            bank_allocation = config_dict['bank_allocation'].upper()
+            if bank_allocation not in BankAllocationType.__members__:
+                raise Exception(f"Bank allocation should be either 'first_idle', 'first_fit', 'best_fit', or "
+                                f"'prr_adjacent'")
+            self.bank_allocation = BankAllocationType[bank_allocation]
+        if 'prr_placement' in config_dict:
+            prr_placement = config_dict['prr_placement'].upper()
+            if prr_placement not in PRRPlacementType.__members__:
+                raise Exception(f"PRR placement should be either 'first_fit', 'best_short_side_fit', 'bottom_left', "
+                                f"or 'contact_perimeter'")
+            self.prr_placement = PRRPlacementType[prr_placement]
+        if 'defragmentation' in config_dict:
+            self.defragmentation = config_dict['defragmentation']
+        if 'migration_delay' in config_dict:
+            self.migration_delay = config_dict['migration_delay']
+        if 'max_migrations' in config_dict:
+            self.max_migrations = config_dict['max_migrations']
+        if 'reconfiguration_latency' in config_dict:
+            self.reconfiguration_latency = config_dict['reconfiguration_latency']
+        if 'max_batch_size' in config_dict:
+            self.max_batch_size = config_dict['max_batch_size']
+        if 'batch_window' in config_dict:
+            self.batch_window = config_dict['batch_window']
+        if 'preemption' in config_dict:
+            self.preemption = config_dict['preemption']
+        if 'save_latency' in config_dict:
+            self.save_latency = config_dict['save_latency']
+        if 'restore_latency' in config_dict:
+            self.restore_latency = config_dict['restore_latency']
+        if 'elastic' in config_dict:
+            self.elastic = config_dict['elastic']
+        if 'resize_penalty' in config_dict:
+            self.resize_penalty = config_dict['resize_penalty']
 
         if 'prr' in config_dict:
             if 'height' in config_dict['prr']:
@@ -109,13 +215,50 @@ class Accelerator:
         self.noc = self._generate_noc()
         self.prrs = self._generate_prrs()
 
-        # self.prr_mask is a readonly property
-        self._prr_available_mask: Optional[List[List[bool]]] = [
-            [True for _ in range(len(self.prrs[0]))] for _ in range(len(self.prrs))]
-        self._bank_available_mask: Optional[List[bool]] = [True for _ in range(len(self.banks))]
-
-        # task_done event
+        # Occupancy bitsets. Bit (y * num_prr_width + x) is set when prrs[y][x] is not idle and bit i is set when
+        # banks[i] is not idle. They are updated in allocate/deallocate so that a placement check is a bitwise AND.
+        self._prr_occupancy = 0
+        self._bank_occupancy = 0
+        # Placement table per prr shape: list of (mask, x, y) for every legal top-left corner in row-major order
+        self._placement_table: Dict[Tuple[int, int], List[Tuple[int, int, int]]] = {}
+        # Maximal empty rectangles of prrs for placement policies other than first fit
+        self.free_prrs: Optional[MaximalRectangles] = None
+        if self.config.partition == PartitionType.FLEXIBLE and self.config.prr_placement != PRRPlacementType.FIRST_FIT:
+            self.free_prrs = MaximalRectangles(self.config.num_prr_width, self.config.num_prr_height)
+        # Free runs of banks and time integrals of their fragmentation since the first allocation
+        self.free_banks = FreeRangeIndex(self.config.num_glb_banks)
+        self._fragmentation_start: Optional[int] = None
+        self._fragmentation_time = 0
+        self._largest_free_run_sum = 0.0
+        self._external_fragmentation_sum = 0.0
+        # Called with (time, largest free run, external fragmentation) whenever banks are allocated or released. The
+        # accelerator keeps no trace itself.
+        self.trace_bank_fragmentation: Optional[Callable[[int, int, float], None]] = None
+
+        # Off-chip traffic crosses the off-chip interface and the NoC, so it is bounded by the slower of the two
+        bandwidths = [bandwidth for bandwidth in [self.config.offchip_bandwidth, self.config.noc_bandwidth]
+                      if bandwidth > 0]
+        self.bandwidth_model = BandwidthModel(min(bandwidths)) if len(bandwidths) > 0 else None
+        # Events of kernels waiting for their off-chip traffic to finish
+        self._flow_events: Dict[Kernel, simpy.Event] = {}
+
+        # kernel_done event. It is triggered with the kernel whenever a kernel finishes.
         self.evt_kernel_done = self.env.event()
+        # Finished kernels that the scheduler has not handled yet
+        self.done_kernels: List[Kernel] = []
+
+        # End time of running kernels with a fixed runtime, and their processes
+        self._kernel_end: Dict[Kernel, int] = {}
+        self._exec_procs: Dict[Kernel, simpy.Process] = {}
+        # (prr mask, time) of prrs vacated by migrations and preemptions that cannot be used until time
+        self._migration_windows: List[Tuple[int, int]] = []
+        self.num_migrations = 0
+        self.num_preemptions = 0
+        self.num_resizes = 0
+        # Kernel starts that reused the bitstreams of all their prrs or not, and cycles spent on reconfiguration
+        self.num_configuration_hits = 0
+        self.num_configuration_misses = 0
+        self.reconfiguration_time = 0
 
         self.scheduler: Scheduler
         self.interrupt_controller = simpy.Resource(self.env, capacity=1)
@@ -143,66 +286,570 @@ class Accelerator:
 
     def _generate_banks(self) -> List[Bank]:
         """Return 1d-list of global buffer banks."""
-        # TODO: Set bank size to 0 for now.
-        banks: List[Bank] = [Bank(id=i, status=ComponentStatus.idle, kernel=None, size=0)
+        banks: List[Bank] = [Bank(id=i, status=ComponentStatus.idle, kernel=None, size=self.config.glb_bank_size)
                              for i in range(self.config.num_glb_banks)]
         return banks
 
     def _generate_offchip_interface(self) -> OffchipInterface:
         """Return an offchip interface."""
-        offchip_interface = OffchipInterface()
+        offchip_interface = OffchipInterface(max_bandwidth=self.config.offchip_bandwidth)
         return offchip_interface
 
     def _generate_noc(self) -> NoC:
         """Return a NoC."""
-        noc = NoC()
+        noc = NoC(max_bandwidth=self.config.noc_bandwidth)
         return noc
 
+    @property
+    def prr_occupancy(self) -> int:
+        """Return a bitset of prrs that are not idle."""
+        return self._prr_occupancy
+
+    @property
+    def bank_occupancy(self) -> int:
+        """Return a bitset of banks that are not idle."""
+        return self._bank_occupancy
+
     @property
     def prr_available_mask(self) -> List[List[bool]]:
         """Return a 2-D mask for available prrs."""
-        if self._prr_available_mask is None:
-            prr_mask = [[True for _ in range(len(self.prrs[0]))] for _ in range(len(self.prrs))]
-            for y in range(len(prr_mask)):
-                for x in range(len(prr_mask[0])):
-                    if self.prrs[y][x].status != ComponentStatus.idle:
-                        prr_mask[y][x] = False
-            self._prr_available_mask = prr_mask
-
-        return self._prr_available_mask
+        width = self.config.num_prr_width
+        return [[not (self._prr_occupancy >> (y * width + x)) & 1 for x in range(width)]
+                for y in range(self.config.num_prr_height)]
 
     @property
     def bank_available_mask(self) -> List[bool]:
         """Return a 1-D mask for available banks."""
-        if self._bank_available_mask is None:
-            bank_mask = [True for _ in range(len(self.banks))]
-            for x in range(len(bank_mask)):
-                if self.banks[x].status != ComponentStatus.idle:
-                    bank_mask[x] = False
-            self._bank_available_mask = bank_mask
+        return [not (self._bank_occupancy >> x) & 1 for x in range(self.config.num_glb_banks)]
 
-        return self._bank_available_mask
+    @property
+    def bank_fragmentation(self) -> Dict[str, float]:
+        """Return time averages of the largest free run of banks and of external bank fragmentation."""
+        self._record_bank_fragmentation()
+        start = self._fragmentation_start
+        if start is None or self._fragmentation_time == start:
+            return {'largest_free_run': float(self.free_banks.largest),
+                    'external_fragmentation': self.free_banks.external_fragmentation}
+        duration = self._fragmentation_time - start
+        return {'largest_free_run': self._largest_free_run_sum / duration,
+                'external_fragmentation': self._external_fragmentation_sum / duration}
+
+    def _record_bank_fragmentation(self) -> None:
+        """Accumulate the fragmentation of banks since the last change."""
+        now = int(self.env.now)
+        if self._fragmentation_start is None:
+            self._fragmentation_start = now
+        else:
+            elapsed = now - self._fragmentation_time
+            self._largest_free_run_sum += self.free_banks.largest * elapsed
+            self._external_fragmentation_sum += self.free_banks.external_fragmentation * elapsed
+        self._fragmentation_time = now
+
+    def get_num_banks(self, app_config: AppConfig) -> int:
+        """Return the number of banks an app config needs for its glb banks and bytes."""
+        if self.config.glb_bank_size > 0 and app_config.glb_bytes > 0:
+            return max(app_config.glb, int(math.ceil(app_config.glb_bytes / self.config.glb_bank_size)))
+        return app_config.glb
+
+    def _find_banks(self, num: int, prr_ids: Sequence[int]) -> List[int]:
+        """Return ids of num idle banks chosen by the bank allocation policy, or [] if they do not fit."""
+        if num <= 0:
+            return []
+        bank_allocation = self.config.bank_allocation
+        if bank_allocation == BankAllocationType.FIRST_IDLE:
+            return self._find_idle_bits(self._bank_occupancy, self.config.num_glb_banks, num)
+        if bank_allocation == BankAllocationType.FIRST_FIT:
+            start = self.free_banks.first_fit(num)
+        elif bank_allocation == BankAllocationType.BEST_FIT:
+            start = self.free_banks.best_fit(num)
+        else:
+            # Banks are spread evenly under the columns of prrs
+            banks_per_column = self.config.num_glb_banks / self.config.num_prr_width
+            num_prr_width = self.config.num_prr_width
+            center = sum((i % num_prr_width + 0.5) * banks_per_column for i in prr_ids) / len(prr_ids)
+            start = self.free_banks.nearest_fit(num, center)
+        if start is None:
+            return []
+        return list(range(start, start + num))
+
+    def get_placements(self, shape: Tuple[int, int]) -> List[Tuple[int, int, int]]:
+        """Return (mask, x, y) of every legal placement of a prr shape in row-major order.
+
+            The table is built once per shape and reused by every map call.
+        """
+        if shape not in self._placement_table:
+            height, width = shape
+            num_prr_width = self.config.num_prr_width
+            row_mask = (1 << width) - 1
+            placements: List[Tuple[int, int, int]] = []
+            for y in range(self.config.num_prr_height - height + 1):
+                for x in range(num_prr_width - width + 1):
+                    mask = 0
+                    for dy in range(height):
+                        mask |= row_mask << ((y + dy) * num_prr_width + x)
+                    placements.append((mask, x, y))
+            self._placement_table[shape] = placements
+
+        return self._placement_table[shape]
+
+    def _find_placement(self, shape: Tuple[int, int]) -> Optional[Tuple[int, int, int]]:
+        """Return the first (mask, x, y) placement of a prr shape that does not overlap with used prrs."""
+        occupancy = self._prr_occupancy
+        for placement in self.get_placements(shape):
+            if not occupancy & placement[0]:
+                return placement
+        return None
+
+    def _find_affinity_placement(self, shape: Tuple[int, int], app: str,
+                                 app_config: AppConfig) -> Optional[Tuple[int, int, int]]:
+        """Return the (mask, x, y) placement of a prr shape that needs the fewest reconfigurations.
+
+            Ties go to the placement that overwrites the fewest bitstreams of other app configs, and then to the
+            placement that the prr placement policy chooses, then the ones it scores best, or the first one in
+            row-major order for first fit.
+        """
+        free_prrs = self.free_prrs
+        policy = self.config.prr_placement.name.lower()
+        chosen = self._find_best_placement(shape) if free_prrs is not None else None
+        best: Optional[Tuple[int, int, int]] = None
+        best_cost: Tuple[int, ...] = ()
+        occupancy = self._prr_occupancy
+        for placement in self.get_placements(shape):
+            if occupancy & placement[0]:
+                continue
+            _, x, y = placement
+            prrs = self._get_prrs_in_window(x, y, *shape)
+            count = self.count_reconfigurations(app, app_config, prrs)
+            cost: Tuple[int, ...] = (count, sum(prr.bitstream is not None and prr.bitstream[:2] != (app, app_config)
+                                                for prr in prrs))
+            if free_prrs is not None:
+                cost += (int(placement != chosen), *free_prrs.score((x, y), shape, policy, occupancy))
+            if best is None or cost < best_cost:
+                best, best_cost = placement, cost
+                if free_prrs is None and cost == (0, 0):
+                    break
+        return best
+
+    def _find_best_placement(self, shape: Tuple[int, int]) -> Optional[Tuple[int, int, int]]:
+        """Return the (mask, x, y) placement of a prr shape that the prr placement policy chooses."""
+        assert self.free_prrs is not None
+        position = self.free_prrs.find(shape, self.config.prr_placement.name.lower(), self._prr_occupancy)
+        if position is None:
+            return None
+        x, y = position
+        height, width = shape
+        row_mask = (1 << width) - 1
+        num_prr_width = self.config.num_prr_width
+        mask = 0
+        for dy in range(height):
+            mask |= row_mask << ((y + dy) * num_prr_width + x)
+        return mask, x, y
+
+    def _update_free_prrs(self, prrs: List[PRR], allocated: bool) -> None:
+        assert self.free_prrs is not None
+        if allocated:
+            xs = [prr.coord[0] for prr in prrs]
+            ys = [prr.coord[1] for prr in prrs]
+            rect = (min(xs), min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1)
+            if rect[2] * rect[3] == len(prrs):
+                self.free_prrs.place(rect)
+                return
+        self.free_prrs.rebuild(self._prr_occupancy)
+
+    def _get_prrs_in_window(self, x: int, y: int, height: int, width: int) -> List[PRR]:
+        """Return prrs in a window in row-major order."""
+        return [prr for row in self.prrs[y:y+height] for prr in row[x:x+width]]
+
+    def get_prrs(self, prr_ids: Sequence[int]) -> List[PRR]:
+        """Return prrs of ids in order."""
+        num_prr_width = self.config.num_prr_width
+        return [self.prrs[i // num_prr_width][i % num_prr_width] for i in prr_ids]
+
+    def get_banks(self, bank_ids: Sequence[int]) -> List[Bank]:
+        """Return banks of ids in order."""
+        return [self.banks[i] for i in bank_ids]
+
+    def _find_idle_bits(self, occupancy: int, total: int, num: int) -> List[int]:
+        """Return the lowest num indices that are not set in occupancy, or [] if there are not enough."""
+        if num <= 0:
+            return []
+        free = ~occupancy & ((1 << total) - 1)
+        if bin(free).count('1') < num:
+            return []
+        indices: List[int] = []
+        while len(indices) < num:
+            lowest = free & -free
+            indices.append(lowest.bit_length() - 1)
+            free ^= lowest
+        return indices
 
     def execute(self, kernel: Kernel) -> None:
         """Start kernel execution process."""
         logger.debug(f"[@ {self.env.now}] {kernel.tag} execution starts.")
-        self.env.process(self.proc_execute(kernel))
+        self._exec_procs[kernel] = self.env.process(self.proc_execute(kernel))
 
     def proc_execute(self, kernel: Kernel) -> Generator[simpy.events.Event, None, None]:
         """Start kernel execution process."""
-        yield self.env.timeout(kernel.app_config.runtime)
+        start_delay = self.prepare_execution(kernel)
+        if start_delay > 0:
+            yield self.env.timeout(start_delay)
+        if self.is_flow(kernel):
+            evt_flow_done = self.env.event()
+            self._flow_events[kernel] = evt_flow_done
+            self._schedule_flow_timeout(self.start_flow(kernel))
+            yield evt_flow_done
+        else:
+            self.start_kernel(kernel)
+            # The end time moves if the kernel is migrated
+            while True:
+                try:
+                    yield self.env.timeout(self._kernel_end[kernel] - int(self.env.now))
+                    break
+                except simpy.Interrupt:
+                    if not self.is_executing(kernel):
+                        # Preempted. It is executed again when it is scheduled.
+                        return
+        self.finish(kernel)
+        self.evt_kernel_done.succeed(value=kernel)
+        self.evt_kernel_done = self.env.event()
+
+    def finish(self, kernel: Kernel) -> None:
+        """Record the end of kernel execution, release its resources and leave it for the scheduler."""
         kernel.timestamp.done = int(self.env.now)
         logger.debug(f"[@ {self.env.now}] {kernel.tag} execution finishes.")
-
-        # Controller is a shared resource
-        mut_kernel_done = self.scheduler.mut_controller.request()
-        yield mut_kernel_done
         self.deallocate(kernel.prrs, kernel.banks)
-        self.evt_kernel_done.succeed(value=(kernel, mut_kernel_done))
+        self.done_kernels.append(kernel)
+        for follower in kernel.batch:
+            follower.timestamp.done = int(self.env.now)
+            self.done_kernels.append(follower)
+        self._kernel_end.pop(kernel, None)
+        self._exec_procs.pop(kernel, None)
 
-    def acknowledge_kernel_done(self, mut_kernel_done: simpy.resources.resource.Request) -> None:
-        self.scheduler.mut_controller.release(mut_kernel_done)
-        self.evt_kernel_done = self.env.event()
+    def start_kernel(self, kernel: Kernel) -> int:
+        """Record the end time of a kernel with a fixed runtime and return its runtime.
+
+            A preempted kernel runs its remaining runtime after restoring its checkpoint.
+        """
+        runtime = kernel.app_config.runtime
+        if kernel.remaining_runtime is not None:
+            runtime = kernel.remaining_runtime + self.config.restore_latency
+            kernel.remaining_runtime = None
+        self._kernel_end[kernel] = int(self.env.now) + runtime
+        return runtime
+
+    def get_kernel_end(self, kernel: Kernel) -> int:
+        return self._kernel_end[kernel]
+
+    def get_running_kernels(self) -> List[Kernel]:
+        """Return kernels with a fixed runtime that have started and not finished."""
+        return list(self._kernel_end)
+
+    def is_executing(self, kernel: Kernel) -> bool:
+        """Return True if a kernel with a fixed runtime has started and not finished or been preempted."""
+        return kernel in self._kernel_end
+
+    def prepare_execution(self, kernel: Kernel) -> int:
+        """Load the bitstream of a kernel to its prrs and return the delay before its runtime starts.
+
+            The kernel waits for migrations out of its prrs to finish and then for prrs that hold a different
+            bitstream to be reconfigured.
+        """
+        delay = 0
+        if len(self._migration_windows) > 0:
+            now = int(self.env.now)
+            self._migration_windows = [window for window in self._migration_windows if window[1] > now]
+            mask = sum(1 << prr.id for prr in kernel.prrs)
+            delay = max([time - now for window_mask, time in self._migration_windows if window_mask & mask], default=0)
+
+        num_reconfigured = self.count_reconfigurations(kernel.app, kernel.app_config, kernel.prrs)
+        for i, prr in enumerate(kernel.prrs):
+            prr.bitstream = (kernel.app, kernel.app_config, i)
+        if num_reconfigured == 0:
+            self.num_configuration_hits += 1
+        else:
+            self.num_configuration_misses += 1
+        reconfiguration_delay = num_reconfigured * self.config.reconfiguration_latency
+        self.reconfiguration_time += reconfiguration_delay
+        return delay + reconfiguration_delay
+
+    @staticmethod
+    def count_reconfigurations(app: str, app_config: AppConfig, prrs: Sequence[PRR]) -> int:
+        """Return the number of prrs that need a new bitstream to run an app config."""
+        return sum(prr.bitstream != (app, app_config, i) for i, prr in enumerate(prrs))
+
+    @property
+    def configuration_hit_rate(self) -> float:
+        num_starts = self.num_configuration_hits + self.num_configuration_misses
+        if num_starts == 0:
+            return 0.0
+        return self.num_configuration_hits / num_starts
+
+    def plan_migration(self, app_config: AppConfig) -> Optional[List[Tuple[Kernel, int, int]]]:
+        """Return (kernel, x, y) moves of running kernels after which app_config can be mapped, or None.
+
+            Every window of the prr shape is tried. Kernels that overlap it must be movable to idle prrs outside the
+            window, finish later than the migration delay, and be at most max_migrations. The window that moves the
+            fewest kernels and then the fewest prrs is chosen.
+        """
+        if not self.config.defragmentation or self.config.partition != PartitionType.FLEXIBLE:
+            return None
+        now = int(self.env.now)
+        num_banks = self.get_num_banks(app_config)
+        best: Optional[List[Tuple[Kernel, int, int]]] = None
+        best_cost = (0, 0)
+        for mask, x, y in self.get_placements(app_config.prr_shape):
+            overlap = self._prr_occupancy & mask
+            kernels: List[Kernel] = []
+            for prr in self.get_prrs([i for i in range(overlap.bit_length()) if (overlap >> i) & 1]):
+                if prr.kernel is not None and prr.kernel not in kernels:
+                    kernels.append(prr.kernel)
+            if len(kernels) == 0 or len(kernels) > self.config.max_migrations:
+                continue
+            if any(kernel not in self._kernel_end or self._kernel_end[kernel] - now <= self.config.migration_delay
+                   for kernel in kernels):
+                continue
+            cost = (len(kernels), sum(len(kernel.prrs) for kernel in kernels))
+            if best is not None and cost >= best_cost:
+                continue
+            window_prrs = self._get_prrs_in_window(x, y, *app_config.prr_shape)
+            if len(self._find_banks(num_banks, [prr.id for prr in window_prrs])) < num_banks:
+                continue
+            # Move the largest kernels first. Prrs they leave are not reused by the moves.
+            occupancy = self._prr_occupancy | mask
+            moves: List[Tuple[Kernel, int, int]] = []
+            for kernel in sorted(kernels, key=lambda kernel: -len(kernel.prrs)):
+                target = next((placement for placement in self.get_placements(kernel.app_config.prr_shape)
+                               if not occupancy & placement[0]), None)
+                if target is None:
+                    break
+                occupancy |= target[0]
+                moves.append((kernel, target[1], target[2]))
+            if len(moves) == len(kernels):
+                best, best_cost = moves, cost
+        return best
+
+    def plan_preemption(self, app_config: AppConfig, priority: int) -> Optional[List[Kernel]]:
+        """Return running kernels whose preemption leaves room for app_config, or None.
+
+            Victims belong to tasks of lower priority than priority, have started their runtime and do not run
+            batches. On a FLEXIBLE or VARIABLE grid every window of the prr shape is tried, and the window that
+            preempts the fewest kernels and then the least remaining runtime is chosen. On a FULL_FLEXIBLE grid the
+            kernels with the least remaining runtime are preempted until enough prrs are idle. Glb banks are only
+            counted.
+        """
+        if not self.config.preemption or self.config.partition == PartitionType.FIXED:
+            return None
+        now = int(self.env.now)
+        shape = app_config.prr_shape
+        num_banks = self.get_num_banks(app_config)
+        num_idle_banks = self.config.num_glb_banks - bin(self._bank_occupancy).count('1')
+        if self.config.partition == PartitionType.VARIABLE:
+            # Banks come with the prrs above them, which are widened as in map_prr
+            banks_per_prr = self.config.num_glb_banks // self.config.num_prr_width
+            shape = (shape[0], max(shape[1], int(math.ceil(num_banks / banks_per_prr))))
+            num_banks = 0
+
+        def preemptible(kernel: Kernel) -> bool:
+            return (kernel.task.priority < priority and self.is_executing(kernel) and len(kernel.batch) == 0
+                    and self._kernel_end[kernel] > now)
+
+        best: Optional[List[Kernel]] = None
+        if self.config.partition == PartitionType.FULL_FLEXIBLE:
+            num_prrs = shape[0] * shape[1]
+            num_idle_prrs = self.config.num_prr_height * self.config.num_prr_width - bin(self._prr_occupancy).count('1')
+            candidates = sorted([kernel for kernel in self._kernel_end if preemptible(kernel)],
+                                key=lambda kernel: self._kernel_end[kernel])
+            kernels: List[Kernel] = []
+            for kernel in candidates:
+                if num_idle_prrs >= num_prrs and num_idle_banks >= num_banks:
+                    break
+                kernels.append(kernel)
+                num_idle_prrs += len(kernel.prrs)
+                num_idle_banks += len(kernel.banks)
+            if len(kernels) > 0 and num_idle_prrs >= num_prrs and num_idle_banks >= num_banks:
+                best = kernels
+            return best
+
+        best_cost = (0, 0)
+        for mask, _, _ in self.get_placements(shape):
+            overlap = self._prr_occupancy & mask
+            if overlap == 0:
+                continue
+            kernels = []
+            for prr in self.get_prrs([i for i in range(overlap.bit_length()) if (overlap >> i) & 1]):
+                if prr.kernel is not None and prr.kernel not in kernels:
+                    kernels.append(prr.kernel)
+            if not all(preemptible(kernel) for kernel in kernels):
+                continue
+            if num_idle_banks + sum(len(kernel.banks) for kernel in kernels) < num_banks:
+                continue
+            cost = (len(kernels), sum(self._kernel_end[kernel] - now for kernel in kernels))
+            if best is None or cost < best_cost:
+                best, best_cost = kernels, cost
+        return best
+
+    def preempt(self, kernel: Kernel) -> None:
+        """Stop a running kernel, save its remaining runtime and release its resources."""
+        now = int(self.env.now)
+        logger.debug(f"[@ {self.env.now}] {kernel.tag} is preempted.")
+        kernel.remaining_runtime = self._kernel_end.pop(kernel) - now
+        kernel.num_preemptions += 1
+        self.num_preemptions += 1
+        # Saving the checkpoint keeps the prrs busy
+        if self.config.save_latency > 0:
+            self._migration_windows.append((sum(1 << prr.id for prr in kernel.prrs), now + self.config.save_latency))
+        self._close_segment(kernel)
+        self.deallocate(kernel.prrs, kernel.banks)
+        kernel.set_prrs([])
+        kernel.set_banks([])
+        self._exec_procs[kernel].interrupt()
+        self._exec_procs.pop(kernel, None)
+
+    def migrate(self, moves: List[Tuple[Kernel, int, int]]) -> None:
+        """Move running kernels to the prr windows at (x, y). Each one stalls for the migration delay."""
+        now = int(self.env.now)
+        for kernel, x, y in moves:
+            logger.debug(f"[@ {self.env.now}] {kernel.tag} migrates to prr ({x}, {y}).")
+            vacated = sum(1 << prr.id for prr in kernel.prrs)
+            banks = kernel.banks
+            self._close_segment(kernel)
+            self.deallocate(kernel.prrs, [])
+            self.allocate(kernel, self._get_prrs_in_window(x, y, *kernel.app_config.prr_shape), [])
+            kernel.set_banks(banks)
+            # The migration delay covers loading the bitstream to the new prrs
+            for i, prr in enumerate(kernel.prrs):
+                prr.bitstream = (kernel.app, kernel.app_config, i)
+            self._migration_windows.append((vacated, now + self.config.migration_delay))
+            self._kernel_end[kernel] += self.config.migration_delay
+            self.num_migrations += 1
+            self._exec_procs[kernel].interrupt()
+
+    def _close_segment(self, kernel: Kernel) -> None:
+        """Record the current allocation of a running kernel as a segment that ends now."""
+        now = int(self.env.now)
+        kernel.segments.append((kernel.segment_start, now, [prr.id for prr in kernel.prrs],
+                                [bank.id for bank in kernel.banks]))
+        kernel.segment_start = now
+
+    def plan_resize(self, kernel: Kernel,
+                    app_configs: Sequence[AppConfig]) -> Optional[Tuple[AppConfig, List[PRR], List[Bank], int]]:
+        """Return (app config, prrs, banks, end time) of a running kernel grown into idle prrs, or None.
+
+            Candidates are app configs of the kernel with more prrs whose window contains the prrs of the kernel.
+            The remaining runtime is scaled by the runtime ratio of the app configs, and the resize penalty and the
+            reconfiguration of the new prrs are added. The app config that finishes first is chosen if it finishes
+            before the current one.
+        """
+        partition = self.config.partition
+        if partition not in [PartitionType.FLEXIBLE, PartitionType.VARIABLE] or not self.is_executing(kernel):
+            return None
+        if len(kernel.batch) > 0:
+            return None
+        now = int(self.env.now)
+        remaining = self._kernel_end[kernel] - now
+        if remaining <= 0:
+            return None
+        mask = sum(1 << prr.id for prr in kernel.prrs)
+        # Prrs vacated by migrations and preemptions are still busy
+        self._migration_windows = [window for window in self._migration_windows if window[1] > now]
+        busy = self._prr_occupancy | sum(window_mask for window_mask, _ in self._migration_windows)
+        bank_mask = sum(1 << bank.id for bank in kernel.banks)
+        banks_per_prr = self.config.num_glb_banks // self.config.num_prr_width
+        area = len(kernel.prrs)
+
+        best: Optional[Tuple[AppConfig, List[PRR], List[Bank], int]] = None
+        for app_config in app_configs:
+            height, width = app_config.prr_shape
+            num_banks = self.get_num_banks(app_config)
+            if partition == PartitionType.VARIABLE and num_banks > width * banks_per_prr:
+                width = int(math.ceil(num_banks / banks_per_prr))
+            if height * width <= area:
+                continue
+            end = now + int(math.ceil(remaining * app_config.runtime / kernel.app_config.runtime))
+            if best is not None and end >= best[3]:
+                continue
+            for placement, x, y in self.get_placements((height, width)):
+                if placement & mask != mask or placement & ~mask & busy:
+                    continue
+                prrs = self._get_prrs_in_window(x, y, height, width)
+                if partition == PartitionType.VARIABLE:
+                    banks = self.banks[x:x+width]
+                    if any((self._bank_occupancy & ~bank_mask) >> bank.id & 1 for bank in banks):
+                        continue
+                elif num_banks <= len(kernel.banks):
+                    banks = kernel.banks[:num_banks]
+                else:
+                    bank_ids = self._find_banks(num_banks - len(kernel.banks), [prr.id for prr in prrs])
+                    if len(bank_ids) == 0:
+                        continue
+                    banks = kernel.banks + self.get_banks(bank_ids)
+                num_reconfigured = self.count_reconfigurations(kernel.app, app_config, prrs)
+                resized_end = end + self.config.resize_penalty + num_reconfigured * self.config.reconfiguration_latency
+                if resized_end < self._kernel_end[kernel] and (best is None or resized_end < best[3]):
+                    best = (app_config, prrs, banks, resized_end)
+                break
+        return best
+
+    def resize(self, kernel: Kernel, app_config: AppConfig, prrs: List[PRR], banks: List[Bank], end: int) -> None:
+        """Move a running kernel to a larger app config on prrs and banks that contain its own, finishing at end."""
+        logger.debug(f"[@ {self.env.now}] {kernel.tag} grows to prr{[prr.id for prr in prrs]}.")
+        self._close_segment(kernel)
+        self.deallocate(kernel.prrs, kernel.banks)
+        self.allocate(kernel, prrs, banks)
+        kernel.set_app_config(app_config)
+        for i, prr in enumerate(prrs):
+            prr.bitstream = (kernel.app, app_config, i)
+        self._kernel_end[kernel] = end
+        self.num_resizes += 1
+        self._exec_procs[kernel].interrupt()
+
+    def is_flow(self, kernel: Kernel) -> bool:
+        """Return True if the runtime of a kernel depends on the off-chip bandwidth it gets."""
+        return self.bandwidth_model is not None and kernel.app_config.offchip_bw > 0
+
+    def _update_bandwidth(self) -> None:
+        assert self.bandwidth_model is not None
+        self.offchip_interface.bandwidth = self.noc.bandwidth = self.bandwidth_model.bandwidth
+
+    def start_flow(self, kernel: Kernel) -> int:
+        """Start off-chip traffic of a kernel and return the delay until the earliest flow finishes."""
+        assert self.bandwidth_model is not None
+        self.bandwidth_model.add(kernel, int(self.env.now))
+        self._update_bandwidth()
+        next_finish_time = self.bandwidth_model.next_finish_time()
+        assert next_finish_time is not None
+        return next_finish_time - int(self.env.now)
+
+    def end_flows(self, generation: int) -> Tuple[List[Kernel], Optional[int]]:
+        """Return kernels whose flows finish now and the delay until the next flow finishes.
+
+            Nothing finishes on a timeout of an old generation, because finish times have changed since.
+        """
+        assert self.bandwidth_model is not None
+        if generation != self.bandwidth_model.generation:
+            return [], None
+        kernels = self.bandwidth_model.pop_finished(int(self.env.now))
+        self._update_bandwidth()
+        next_finish_time = self.bandwidth_model.next_finish_time()
+        return kernels, None if next_finish_time is None else next_finish_time - int(self.env.now)
+
+    def _schedule_flow_timeout(self, delay: int) -> None:
+        assert self.bandwidth_model is not None
+        timeout = self.env.timeout(delay, value=self.bandwidth_model.generation)
+        timeout.callbacks.append(self._on_flow_timeout)
+
+    def _on_flow_timeout(self, event: simpy.events.Event) -> None:
+        kernels, delay = self.end_flows(cast(int, event.value))
+        for kernel in kernels:
+            self._flow_events.pop(kernel).succeed()
+        if delay is not None:
+            self._schedule_flow_timeout(delay)
+
+    def pop_done_kernels(self) -> List[Kernel]:
+        """Return finished kernels in the order they finished and clear them."""
+        kernels = self.done_kernels
+        self.done_kernels = []
+        return kernels
 
     def allocate(self, kernel: Kernel, prrs: List[PRR], banks: List[Bank]) -> None:
         """Allocate prrs to a task."""
@@ -213,14 +860,20 @@ class Accelerator:
                 raise Exception(f"Cannot allocate PRR_{prr.id} to {kernel.tag}. It is not idle.")
             prr.status = ComponentStatus.used
             prr.kernel = kernel
+            self._prr_occupancy |= 1 << prr.id
+        if self.free_prrs is not None and len(prrs) > 0:
+            self._update_free_prrs(prrs, allocated=True)
+        if len(banks) > 0:
+            self._record_bank_fragmentation()
         for bank in banks:
             if bank.status != ComponentStatus.idle:
                 raise Exception(f"Cannot allocate BANK_{bank.id} to {kernel.tag}. It is not idle.")
             bank.status = ComponentStatus.used
             bank.kernel = kernel
-        # Initialize prr_mask to None
-        self._prr_available_mask = None
-        self._bank_available_mask = None
+            self._bank_occupancy |= 1 << bank.id
+            self.free_banks.allocate(bank.id)
+        if len(banks) > 0:
+            self._trace_bank_fragmentation()
 
     def deallocate(self, prrs: List[PRR], banks: List[Bank]) -> None:
         """Deallocate prrs."""
@@ -229,125 +882,101 @@ class Accelerator:
                 raise Exception(f"Cannot deallocate PRR_{prr.id}. It is already idle.")
             prr.status = ComponentStatus.idle
             prr.kernel = None
+            self._prr_occupancy &= ~(1 << prr.id)
+        if self.free_prrs is not None and len(prrs) > 0:
+            self._update_free_prrs(prrs, allocated=False)
+        if len(banks) > 0:
+            self._record_bank_fragmentation()
         for bank in banks:
             if bank.status == ComponentStatus.idle:
                 raise Exception(f"Cannot deallocate Bank_{bank.id}. It is already idle.")
             bank.status = ComponentStatus.idle
             bank.kernel = None
-        # Initialize prr_mask to None
-        self._prr_available_mask = None
-        self._bank_available_mask = None
+            self._bank_occupancy &= ~(1 << bank.id)
+            self.free_banks.free(bank.id)
+        if len(banks) > 0:
+            self._trace_bank_fragmentation()
+
+    def _trace_bank_fragmentation(self) -> None:
+        if self.trace_bank_fragmentation is not None:
+            self.trace_bank_fragmentation(int(self.env.now), self.free_banks.largest,
+                                          self.free_banks.external_fragmentation)
+
+    def map(self, app_config: AppConfig, app: Optional[str] = None) -> Tuple[List[PRR], List[Bank]]:
+        """Return a list of available prrs where an app_config can be mapped.
 
-    def map(self, app_config: AppConfig) -> Tuple[List[PRR], List[Bank]]:
-        """Return a list of available prrs where an app_config can be mapped."""
+            If app is given, prrs that already hold the bitstream of the app config are preferred.
+        """
         # prrs, banks = self.map_prr(app_config.prr_shape, app_config.input + app_config.output)
-        prrs, banks = self.map_prr(app_config.prr_shape, app_config.glb)
+        affinity = (app, app_config) if app is not None else None
+        prrs, banks = self.map_prr(app_config.prr_shape, self.get_num_banks(app_config), affinity)
         return prrs, banks
 
-    def map_prr(self, shape: Tuple[int, int], num_io: int) -> Tuple[List[PRR], List[Bank]]:
+    def map_prr(self, shape: Tuple[int, int], num_io: int,
+                affinity: Optional[Tuple[str, AppConfig]] = None) -> Tuple[List[PRR], List[Bank]]:
         """Return a list of prs where input shape fits in.
 
             Parameters
             ----------
             shape: (height, width)
             num_io: number of inputs and outputs
+            affinity: (app, app_config) whose bitstream is preferred
         """
+        height, width = shape
         if self.config.partition == PartitionType.FULL_FLEXIBLE:
-            height, width = shape
-            total_required_prr = height * width
-            total_required_banks = num_io
-            # Note: Greedy search algorithm for available prrs.
-            found_prr = False
-            found_bank = False
-            prrs = []
-            banks = []
-            found_prrs = 0
-            num_found_banks = 0
-            prr_available_mask = self.prr_available_mask
-            bank_available_mask = self.bank_available_mask
-            for y in range(self.config.num_prr_height):
-                for x in range(self.config.num_prr_width):
-                    if prr_available_mask[y][x]:
-                        prrs.append(self.prrs[y][x])
-                        found_prrs += 1
-                    if found_prrs >= total_required_prr:
-                        found_prr = True
-                        break
-                if found_prr is True:
-                    break
-
-            for x in range(self.config.num_glb_banks):
-                if bank_available_mask[x]:
-                    banks.append(self.banks[x])
-                    num_found_banks += 1
-                if num_found_banks >= total_required_banks:
-                    found_bank = True
-                    break
-
-            if found_prr is False or found_bank is False:
-                return [], []
+            num_prrs = self.config.num_prr_height * self.config.num_prr_width
+            if affinity is not None:
+                # Idle prrs that hold the bitstream first, in the order of their part of it, then unconfigured ones
+                num_idle = num_prrs - bin(self._prr_occupancy).count('1')
+                idle = self._find_idle_bits(self._prr_occupancy, num_prrs, num_idle)
+                hits = sorted((prr.bitstream[2], prr.id) for prr in self.get_prrs(idle)
+                              if prr.bitstream is not None and prr.bitstream[:2] == affinity)
+                hit_ids = [i for _, i in hits]
+                others = sorted((prr.bitstream is not None, prr.id) for prr in self.get_prrs(idle)
+                                if prr.id not in hit_ids)
+                prr_ids = (hit_ids + [i for _, i in others])[:height * width]
+                if len(prr_ids) < height * width:
+                    prr_ids = []
             else:
-                return prrs, banks
-        elif self.config.partition == PartitionType.FLEXIBLE:
-            height, width = shape
-            total_required_prr = height * width
-            total_required_banks = num_io
-            # Note: Greedy search algorithm for available prrs.
-            found_prr = False
-            prrs = []
-            prr_available_mask = self.prr_available_mask
-
-            for y in range(self.config.num_prr_height - height + 1):
-                for x in range(self.config.num_prr_width - width + 1):
-                    prr_mask = np.array(prr_available_mask)[y:y+height, x:x+width]
-                    is_available = reduce(lambda x, y: x and y, prr_mask.flatten())
-                    if is_available:
-                        found_prr = True
-                        break
-                if found_prr is True:
-                    prrs = list(np.array(self.prrs)[y:y+height, x:x+width].flatten())
-                    break
-
-            found_bank = False
-            banks = []
-            num_found_banks = 0
-            bank_available_mask = self.bank_available_mask
-            for x in range(self.config.num_glb_banks):
-                if bank_available_mask[x]:
-                    banks.append(self.banks[x])
-                    num_found_banks += 1
-                if num_found_banks >= total_required_banks:
-                    found_bank = True
-                    break
-
-            if found_prr is False or found_bank is False:
+                # Note: Greedy search algorithm for available prrs.
+                prr_ids = self._find_idle_bits(self._prr_occupancy, num_prrs, height * width)
+            if len(prr_ids) == 0:
+                return [], []
+            bank_ids = self._find_banks(num_io, prr_ids)
+            if len(bank_ids) < num_io:
                 return [], []
+            return self.get_prrs(prr_ids), self.get_banks(bank_ids)
+        elif self.config.partition == PartitionType.FLEXIBLE:
+            if affinity is not None:
+                placement = self._find_affinity_placement(shape, *affinity)
+            elif self.free_prrs is not None:
+                placement = self._find_best_placement(shape)
             else:
-                return prrs, banks
+                # Note: Greedy search algorithm for available prrs.
+                placement = self._find_placement(shape)
+            if placement is None:
+                return [], []
+            _, x, y = placement
+            prrs = self._get_prrs_in_window(x, y, height, width)
+            bank_ids = self._find_banks(num_io, [prr.id for prr in prrs])
+            if len(bank_ids) < num_io:
+                return [], []
+            return prrs, self.get_banks(bank_ids)
         elif self.config.partition == PartitionType.VARIABLE:
-            height, width = shape
             banks_per_prr = self.config.num_glb_banks // self.config.num_prr_width
             # TODO: Assume PRR is also 1-D for WDDSA paper
             if num_io > width * banks_per_prr:
                 width = int(math.ceil(num_io / banks_per_prr))
-            # Note: Greedy search algorithm for available prrs.
-            found_prr = False
-            prr_available_mask = self.prr_available_mask
-            for y in range(self.config.num_prr_height - height + 1):
-                for x in range(self.config.num_prr_width - width + 1):
-                    prr_mask = np.array(prr_available_mask)[y:y+height, x:x+width]
-                    is_available = reduce(lambda x, y: x and y, prr_mask.flatten())
-                    if is_available:
-                        found_prr = True
-                        break
-                if found_prr is True:
-                    break
-
-            if found_prr is False:
-                return [], []
+            if affinity is not None:
+                placement = self._find_affinity_placement((height, width), *affinity)
             else:
-                prrs = list(np.array(self.prrs)[y:y+height, x:x+width].flatten())
-                banks = self.banks[x:x+width]
-                return prrs, banks
+                # Note: Greedy search algorithm for available prrs.
+                placement = self._find_placement((height, width))
+            if placement is None:
+                return [], []
+            _, x, y = placement
+            prrs = self._get_prrs_in_window(x, y, height, width)
+            banks = self.banks[x:x+width]
+            return prrs, banks
         else:
             raise Exception(f"Partition type should be either 'fixed', 'variable', or 'flexible'")
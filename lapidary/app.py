@@ -1,6 +1,17 @@
-from typing import Dict, List, Tuple
+import bisect
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+# Resource footprint of an app config: (prr shape, number of glb banks, glb bytes)
+FootprintType = Tuple[Tuple[int, int], int, int]
+
+# Columns of an app config in a compiled app table
+APP_CONFIG_COLUMNS = ['prr_height', 'prr_width', 'pe', 'mem', 'input', 'output', 'glb', 'glb_bytes', 'offchip_bw',
+                      'runtime', 'batch_size']
+# Values of columns that an app pool file omits, other than 0
+COLUMN_DEFAULTS = {'batch_size': 1}
 
 
 @dataclass(frozen=True)
@@ -11,17 +22,154 @@ class AppConfig:
     input: int = 0
     output: int = 0
     glb: int = 0
+    # Global buffer footprint in bytes. It needs more than glb banks if the banks are smaller.
+    glb_bytes: int = 0
     offchip_bw: int = 0
     runtime: int = 0
+    # Number of kernels of different tasks that run together in the runtime. Smaller batches of more than one kernel
+    # run padded, and single kernels only use app configs of a batch size of 1.
+    batch_size: int = 1
+
+    @property
+    def footprint(self) -> FootprintType:
+        """Resources that decide whether the app config can be mapped."""
+        return self.prr_shape, self.glb, self.glb_bytes
+
+    @classmethod
+    def from_row(cls, row: Sequence[int]) -> 'AppConfig':
+        """Create an app config from a row of APP_CONFIG_COLUMNS."""
+        values = [int(value) for value in row]
+        prr_height, prr_width, pe, mem, input, output, glb, glb_bytes, offchip_bw, runtime, batch_size = values
+        return cls(prr_shape=(prr_height, prr_width), pe=pe, mem=mem, input=input, output=output, glb=glb,
+                   glb_bytes=glb_bytes, offchip_bw=offchip_bw, runtime=runtime, batch_size=batch_size)
+
+    def to_row(self) -> List[int]:
+        return [self.prr_shape[0], self.prr_shape[1], self.pe, self.mem, self.input, self.output, self.glb,
+                self.glb_bytes, self.offchip_bw, self.runtime, self.batch_size]
+
+
+def group_by_footprint(app_configs: List[AppConfig]) -> Dict[FootprintType, List[AppConfig]]:
+    """Group app configs by footprint. Footprints keep the order of their first app config."""
+    footprints: Dict[FootprintType, List[AppConfig]] = {}
+    for app_config in app_configs:
+        footprints.setdefault(app_config.footprint, []).append(app_config)
+    return footprints
 
 
 class AppPool:
     def __init__(self, name: str) -> None:
         self.name = name
         self.app_pool: Dict[str, List[AppConfig]] = defaultdict(list)
+        # Incremented whenever the pool changes, so that cached scheduling decisions can be invalidated
+        self.version = 0
+        # App configs of each app sorted by (runtime, order of addition)
+        self._sorted_keys: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._sorted: Dict[str, List[AppConfig]] = defaultdict(list)
+        # Sorted app configs of each app grouped by footprint, built on first use
+        self._footprints: Dict[str, Dict[FootprintType, List[AppConfig]]] = {}
+        # Compiled app table (rows of APP_CONFIG_COLUMNS) and row range of each app that is not loaded yet
+        self._table: Optional[np.ndarray] = None
+        self._row_ranges: Dict[str, Tuple[int, int]] = {}
 
-    def add(self, app: str, app_config: AppConfig) -> None:
+    def attach_table(self, table: np.ndarray, row_ranges: Dict[str, Tuple[int, int]]) -> None:
+        """Use a compiled app table as the source of the pool. App configs of an app are loaded on first use."""
+        self._table = table
+        self._row_ranges.update(row_ranges)
+
+    def _load(self, app: str) -> None:
+        row_range = self._row_ranges.pop(app, None)
+        if row_range is None or self._table is None:
+            return
+        for row in self._table[row_range[0]:row_range[1]]:
+            self._insert(app, AppConfig.from_row(row))
+
+    @property
+    def app_names(self) -> List[str]:
+        """Names of every app in the pool, including apps that are not loaded yet."""
+        return list(self.app_pool.keys()) + [app for app in self._row_ranges if app not in self.app_pool]
+
+    def _insert(self, app: str, app_config: AppConfig) -> None:
         self.app_pool[app].append(app_config)
+        key = (app_config.runtime, len(self.app_pool[app]))
+        i = bisect.bisect(self._sorted_keys[app], key)
+        self._sorted_keys[app].insert(i, key)
+        self._sorted[app].insert(i, app_config)
+        self._footprints.pop(app, None)
+
+    def add(self, app: str, app_config: AppConfig) -> None:
+        if self._row_ranges:
+            self._load(app)
+        self._insert(app, app_config)
+        self.version += 1
 
     def get(self, app: str) -> List[AppConfig]:
+        if self._row_ranges:
+            self._load(app)
         return self.app_pool[app]
+
+    def get_sorted(self, app: str) -> List[AppConfig]:
+        """Return app configs of an app sorted by runtime. Ties keep the order of addition."""
+        if self._row_ranges:
+            self._load(app)
+        return self._sorted[app]
+
+    def get_footprints(self, app: str) -> Dict[FootprintType, List[AppConfig]]:
+        """Return app configs of single kernels of an app grouped by footprint, in order of the fastest config of
+            each footprint.
+        """
+        if app not in self._footprints:
+            self._footprints[app] = group_by_footprint([app_config for app_config in self.get_sorted(app)
+                                                        if app_config.batch_size <= 1])
+        return self._footprints[app]
+
+    def freeze(self, apps: Optional[Iterable[str]] = None) -> 'FrozenAppPool':
+        """Return an immutable, hashable snapshot of the pool, or of the given apps only.
+
+            Only apps in the snapshot are loaded from the compiled app table.
+        """
+        app_names = self.app_names
+        if apps is not None:
+            selected = set(apps)
+            app_names = [app for app in app_names if app in selected]
+        for app in app_names:
+            self._load(app)
+        return FrozenAppPool(self.name, tuple((app, tuple(self.app_pool[app])) for app in app_names))
+
+
+@dataclass(frozen=True)
+class FrozenAppPool:
+    """Immutable, hashable app pool. One snapshot can be shared by many simulations and used as a cache key."""
+    name: str
+    apps: Tuple[Tuple[str, Tuple[AppConfig, ...]], ...] = ()
+    _index: Dict[str, List[AppConfig]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _sorted: Dict[str, List[AppConfig]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _footprints: Dict[str, Dict[FootprintType, List[AppConfig]]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        for app, app_configs in self.apps:
+            self._index[app] = list(app_configs)
+            order = sorted(range(len(app_configs)), key=lambda i: (app_configs[i].runtime, i))
+            self._sorted[app] = [app_configs[i] for i in order]
+            self._footprints[app] = group_by_footprint([app_config for app_config in self._sorted[app]
+                                                        if app_config.batch_size <= 1])
+
+    @property
+    def version(self) -> int:
+        return 0
+
+    def get(self, app: str) -> List[AppConfig]:
+        return self._index.get(app, [])
+
+    def get_sorted(self, app: str) -> List[AppConfig]:
+        """Return app configs of an app sorted by runtime. Ties keep the order of addition."""
+        return self._sorted.get(app, [])
+
+    def get_footprints(self, app: str) -> Dict[FootprintType, List[AppConfig]]:
+        """Return app configs of single kernels of an app grouped by footprint, in order of the fastest config of
+            each footprint.
+        """
+        return self._footprints.get(app, {})
+
+
+AppPoolType = Union[AppPool, FrozenAppPool]
@@ -0,0 +1,118 @@
+import hashlib
+import io
+import os
+import yaml
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from lapidary.app import APP_CONFIG_COLUMNS, COLUMN_DEFAULTS, AppConfig, AppPool
+import logging
+logger = logging.getLogger(__name__)
+
+# Directory next to an app pool file where compiled app tables are cached
+CACHE_DIR = '.lapidary_cache'
+
+
+def _parse_yaml(source: bytes) -> Tuple[Optional[str], List[Tuple[str, AppConfig]]]:
+    """Parse an app pool YAML file of the form {name: ..., apps: {app: [{prr_shape: [h, w], glb: ..., ...}]}}."""
+    config = yaml.load(source, Loader=yaml.SafeLoader)
+    fields = set(AppConfig.__dataclass_fields__.keys())
+    rows = []
+    for app, app_configs in config['apps'].items():
+        for app_config in app_configs:
+            unknown = set(app_config.keys()) - fields
+            if len(unknown) > 0:
+                raise Exception(f"Unknown fields of app {app} in app pool: {sorted(unknown)}")
+            if 'prr_shape' in app_config:
+                app_config = {**app_config, 'prr_shape': tuple(app_config['prr_shape'])}
+            rows.append((app, AppConfig(**app_config)))
+    return config.get('name'), rows
+
+
+def _compile_yaml(source: bytes) -> Tuple[Optional[str], List[str], np.ndarray, np.ndarray]:
+    name, rows = _parse_yaml(source)
+    apps: List[str] = []
+    grouped: Dict[str, List[List[int]]] = {}
+    for app, app_config in rows:
+        if app not in grouped:
+            apps.append(app)
+            grouped[app] = []
+        grouped[app].append(app_config.to_row())
+    offsets = np.cumsum([0] + [len(grouped[app]) for app in apps]).astype(np.int64)
+    table = np.array([row for app in apps for row in grouped[app]], dtype=np.int64).reshape(-1, len(APP_CONFIG_COLUMNS))
+    return name, apps, offsets, table
+
+
+def _compile_csv(source: bytes) -> Tuple[Optional[str], List[str], np.ndarray, np.ndarray]:
+    """Compile an app pool CSV file with an 'app' column and any of APP_CONFIG_COLUMNS.
+
+        Missing columns are 0, or their value in COLUMN_DEFAULTS.
+    """
+    df = pd.read_csv(io.BytesIO(source))
+    if 'app' not in df.columns:
+        raise Exception("App pool csv should have an 'app' column.")
+    unknown = set(df.columns) - set(APP_CONFIG_COLUMNS) - {'app'}
+    if len(unknown) > 0:
+        raise Exception(f"Unknown columns in app pool csv: {sorted(unknown)}")
+    # Group rows by app in order of first appearance, keeping the order of rows in each app
+    codes, apps = pd.factorize(df['app'].astype(str))
+    order = np.argsort(codes, kind='stable')
+    table = np.zeros((len(df), len(APP_CONFIG_COLUMNS)), dtype=np.int64)
+    for i, column in enumerate(APP_CONFIG_COLUMNS):
+        if column in df.columns:
+            table[:, i] = df[column].to_numpy(dtype=np.int64)[order]
+        else:
+            table[:, i] = COLUMN_DEFAULTS.get(column, 0)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(apps)))]).astype(np.int64)
+    return None, list(apps), offsets, table
+
+
+def load_app_pool(path: str, cache_dir: Optional[str] = None, use_cache: bool = True) -> AppPool:
+    """Load an app pool from a YAML or CSV file.
+
+        The file is compiled into a table of APP_CONFIG_COLUMNS that is cached in cache_dir (by default a
+        .lapidary_cache directory next to the file) under the hash of the file content. Later loads of the same
+        content memory-map the table instead of parsing the file, and app configs of an app are only created when
+        the app is used.
+    """
+    path = os.path.realpath(path)
+    if not os.path.exists(path):
+        raise Exception(f"[ERROR] App pool file not found: {path}")
+    with open(path, 'rb') as f:
+        source = f.read()
+    stem, ext = os.path.splitext(os.path.basename(path))
+    # The table layout is part of the key, so that tables of older columns are not reused
+    digest = hashlib.sha1(source + ','.join(APP_CONFIG_COLUMNS).encode()).hexdigest()[:16]
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR)
+    prefix = os.path.join(cache_dir, f"{stem}.{digest}")
+
+    name: Optional[str]
+    if use_cache and os.path.exists(f"{prefix}.npy") and os.path.exists(f"{prefix}.npz"):
+        with np.load(f"{prefix}.npz") as index:
+            name = str(index['name']) if index['name'].size > 0 else None
+            apps = [str(app) for app in index['apps']]
+            offsets = index['offsets']
+        table = np.load(f"{prefix}.npy", mmap_mode='r')
+        logger.info(f"App pool read from cache: {prefix}.npy")
+    else:
+        if ext.lower() in ['.yml', '.yaml']:
+            name, apps, offsets, table = _compile_yaml(source)
+        elif ext.lower() == '.csv':
+            name, apps, offsets, table = _compile_csv(source)
+        else:
+            raise Exception(f"App pool file should be yaml or csv: {path}")
+        logger.info(f"App pool file read: {path}")
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to temporary files first, so that concurrent loads never see a partial cache
+            pid = os.getpid()
+            np.savez(f"{prefix}.{pid}.npz", name=np.array([] if name is None else name),
+                     apps=np.array(apps, dtype=str), offsets=offsets)
+            np.save(f"{prefix}.{pid}.npy", table)
+            os.replace(f"{prefix}.{pid}.npz", f"{prefix}.npz")
+            os.replace(f"{prefix}.{pid}.npy", f"{prefix}.npy")
+
+    app_pool = AppPool(name if name is not None else stem)
+    app_pool.attach_table(table, {app: (int(offsets[i]), int(offsets[i + 1])) for i, app in enumerate(apps)})
+    return app_pool
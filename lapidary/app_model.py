@@ -0,0 +1,75 @@
+import math
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from lapidary.app import AppConfig
+
+
+class AppModel:
+    def __init__(self, app_configs: Sequence[AppConfig]) -> None:
+        """Performance model of an app for any prr shape, interpolated from its profiled app configs.
+
+            Runtime is interpolated piecewise linearly in log-log space over the number of prrs of a shape, so that
+            an app that scales as 1 / area is exact between profiled points. Glb banks and bytes, inputs and outputs
+            are interpolated linearly and rounded up, and pe and mem are taken from the profiled config of the closest
+            area. Shapes smaller or larger than every profiled shape are not modeled.
+        """
+        self.app_configs = list(app_configs)
+        # The fastest profiled config of each area
+        profiled: Dict[int, AppConfig] = {}
+        for app_config in self.app_configs:
+            area = app_config.prr_shape[0] * app_config.prr_shape[1]
+            if area not in profiled or app_config.runtime < profiled[area].runtime:
+                profiled[area] = app_config
+        self._profiled = [profiled[area] for area in sorted(profiled)]
+        self._areas = np.array(sorted(profiled), dtype=np.float64)
+        self._log_areas = np.log(self._areas)
+        self._log_runtimes = np.log(np.array([max(app_config.runtime, 1) for app_config in self._profiled],
+                                             dtype=np.float64))
+        # Memo of predictions per shape and of candidate lists per grid shape
+        self._predictions: Dict[Tuple[int, int], Optional[AppConfig]] = {}
+        self._candidates: Dict[Tuple[int, int], List[AppConfig]] = {}
+
+    def _interp(self, area: int, values: List[int]) -> int:
+        return int(math.ceil(np.interp(area, self._areas, np.array(values, dtype=np.float64)) - 1e-9))
+
+    def predict(self, shape: Tuple[int, int]) -> Optional[AppConfig]:
+        """Return the modeled app config of a prr shape, or None if the shape is out of the profiled range."""
+        if shape in self._predictions:
+            return self._predictions[shape]
+        prediction: Optional[AppConfig] = None
+        area = shape[0] * shape[1]
+        if len(self._profiled) > 0 and self._areas[0] <= area <= self._areas[-1]:
+            profiled = [app_config for app_config in self.app_configs if app_config.prr_shape == shape]
+            if len(profiled) > 0:
+                prediction = min(profiled, key=lambda app_config: app_config.runtime)
+            else:
+                closest = self._profiled[int(np.argmin(np.abs(self._areas - area)))]
+                runtime = int(round(math.exp(float(np.interp(math.log(area), self._log_areas, self._log_runtimes)))))
+                prediction = AppConfig(prr_shape=shape, pe=closest.pe, mem=closest.mem,
+                                       input=self._interp(area, [c.input for c in self._profiled]),
+                                       output=self._interp(area, [c.output for c in self._profiled]),
+                                       glb=self._interp(area, [c.glb for c in self._profiled]),
+                                       glb_bytes=self._interp(area, [c.glb_bytes for c in self._profiled]),
+                                       offchip_bw=self._interp(area, [c.offchip_bw for c in self._profiled]),
+                                       runtime=runtime)
+        self._predictions[shape] = prediction
+        return prediction
+
+    def get_sorted(self, grid: Tuple[int, int]) -> List[AppConfig]:
+        """Return profiled app configs and modeled app configs of every other shape that fits in a grid of prrs.
+
+            App configs are sorted by runtime. Ties keep profiled configs first, in the order of addition.
+        """
+        if grid not in self._candidates:
+            profiled_shapes = {app_config.prr_shape for app_config in self.app_configs}
+            app_configs = list(self.app_configs)
+            for height in range(1, grid[0] + 1):
+                for width in range(1, grid[1] + 1):
+                    if (height, width) in profiled_shapes:
+                        continue
+                    prediction = self.predict((height, width))
+                    if prediction is not None:
+                        app_configs.append(prediction)
+            order = sorted(range(len(app_configs)), key=lambda i: (app_configs[i].runtime, i))
+            self._candidates[grid] = [app_configs[i] for i in order]
+        return self._candidates[grid]
@@ -0,0 +1,129 @@
+import math
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional
+
+
+class ArrivalProcess(ABC):
+    def __init__(self, rng: np.random.Generator, chunk_size: int = 4096) -> None:
+        """Stateful arrival process that generates absolute arrival times in vectorized chunks.
+
+            Times are relative to the start of the process and strictly continue across chunks,
+            so arrival patterns never repeat.
+        """
+        self.rng = rng
+        self.chunk_size = chunk_size
+        self.time = 0.0
+
+    @abstractmethod
+    def next_chunk(self) -> np.ndarray:
+        """Return the next sorted chunk of arrival times after self.time and advance self.time."""
+        pass
+
+    def __iter__(self) -> Iterator[float]:
+        while True:
+            for t in self.next_chunk():
+                yield float(t)
+
+
+class PoissonArrival(ArrivalProcess):
+    def __init__(self, rng: np.random.Generator, interval: float, chunk_size: int = 4096) -> None:
+        """Poisson process with exponential inter-arrival times of mean interval."""
+        super().__init__(rng, chunk_size)
+        self.interval = interval
+
+    def next_chunk(self) -> np.ndarray:
+        times = self.time + np.cumsum(self.rng.exponential(self.interval, self.chunk_size))
+        self.time = float(times[-1])
+        return times
+
+
+class MMPPArrival(ArrivalProcess):
+    def __init__(self, rng: np.random.Generator, intervals: List[Optional[float]], dwells: List[float],
+                 transition: Optional[List[List[float]]] = None, chunk_size: int = 4096) -> None:
+        """Markov-modulated Poisson process.
+
+            In state i, arrivals are Poisson with mean inter-arrival time intervals[i] (None means no arrivals) and
+            the process stays for an exponential time of mean dwells[i]. Then it moves to the next state with
+            probabilities of transition[i], or to state (i + 1) % num_states if transition is not given.
+        """
+        super().__init__(rng, chunk_size)
+        if len(intervals) != len(dwells):
+            raise Exception("MMPP intervals and dwells should have the same number of states.")
+        self.rates = np.array([0.0 if interval is None else 1 / interval for interval in intervals])
+        self.dwells = np.array(dwells, dtype=np.float64)
+        self.transition = None
+        if transition is not None:
+            self.transition = np.array(transition, dtype=np.float64)
+            self.transition /= self.transition.sum(axis=1, keepdims=True)
+        if self.rates.max() == 0:
+            raise Exception("MMPP should have at least one state with arrivals.")
+        self.state = 0
+        # Expected number of state segments that produce a chunk of arrivals
+        mean_arrivals = float(np.mean(self.rates * self.dwells))
+        self.num_segments = max(int(math.ceil(self.chunk_size / mean_arrivals)), 1)
+
+    def _next_states(self, num: int) -> np.ndarray:
+        if self.transition is None:
+            states = (self.state + np.arange(num)) % len(self.rates)
+        else:
+            states = np.empty(num, dtype=np.int64)
+            state = self.state
+            choices = self.rng.random(num)
+            cumulative = np.cumsum(self.transition, axis=1)
+            # Rounding can leave a row just below 1, which would draw a state past the last one
+            cumulative[:, -1] = 1.0
+            for i in range(num):
+                states[i] = state
+                state = int(np.searchsorted(cumulative[state], choices[i], side='right'))
+        self.state = int((states[-1] + 1) % len(self.rates)) if self.transition is None else state
+        return states
+
+    def next_chunk(self) -> np.ndarray:
+        times = np.empty(0)
+        while len(times) == 0:
+            states = self._next_states(self.num_segments)
+            lengths = self.rng.exponential(self.dwells[states])
+            starts = self.time + np.concatenate([[0.0], np.cumsum(lengths)[:-1]])
+            counts = self.rng.poisson(self.rates[states] * lengths)
+            segment = np.repeat(np.arange(len(states)), counts)
+            times = np.sort(starts[segment] + self.rng.random(len(segment)) * lengths[segment])
+            self.time = float(starts[-1] + lengths[-1])
+        return times
+
+
+class OnOffArrival(MMPPArrival):
+    def __init__(self, rng: np.random.Generator, interval: float, on: float, off: float,
+                 chunk_size: int = 4096) -> None:
+        """Poisson arrivals of mean inter-arrival time interval during on periods and none during off periods.
+
+            On and off periods are exponential with mean on and off.
+        """
+        super().__init__(rng, [interval, None], [on, off], chunk_size=chunk_size)
+
+
+class DiurnalArrival(ArrivalProcess):
+    def __init__(self, rng: np.random.Generator, interval: float, period: float, amplitude: float,
+                 phase: float = 0.0, chunk_size: int = 4096) -> None:
+        """Non-homogeneous Poisson process with a sinusoidal rate curve.
+
+            The rate is (1 + amplitude * sin(2 * pi * t / period + phase)) / interval with 0 <= amplitude <= 1,
+            generated by thinning a Poisson process at the peak rate.
+        """
+        super().__init__(rng, chunk_size)
+        if not 0 <= amplitude <= 1:
+            raise Exception("Diurnal amplitude should be between 0 and 1.")
+        self.interval = interval
+        self.period = period
+        self.amplitude = amplitude
+        self.phase = phase
+
+    def next_chunk(self) -> np.ndarray:
+        times = np.empty(0)
+        peak_interval = self.interval / (1 + self.amplitude)
+        while len(times) == 0:
+            candidates = self.time + np.cumsum(self.rng.exponential(peak_interval, self.chunk_size))
+            rate = 1 + self.amplitude * np.sin(2 * np.pi * candidates / self.period + self.phase)
+            times = candidates[self.rng.random(self.chunk_size) * (1 + self.amplitude) < rate]
+            self.time = float(candidates[-1])
+        return times
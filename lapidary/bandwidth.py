@@ -0,0 +1,79 @@
+from __future__ import annotations
+import math
+from typing import TYPE_CHECKING, Dict, List, Optional
+if TYPE_CHECKING:
+    from lapidary.kernel import Kernel
+
+
+class _Flow:
+    def __init__(self, demand: float, work: float) -> None:
+        self.demand = demand
+        # Remaining work in cycles at full bandwidth
+        self.remaining = work
+        # Fraction of the demand that is allocated, i.e. progress per cycle
+        self.rate = 1.0
+        self.finish_time = 0
+
+
+class BandwidthModel:
+    def __init__(self, capacity: float) -> None:
+        """Fluid-flow model of kernels sharing off-chip bandwidth.
+
+            A kernel that demands offchip_bw progresses at full speed while the total demand fits in capacity.
+            Otherwise bandwidth is shared max-min fairly and the kernel progresses at allocated / demanded speed.
+            Rates are only recomputed when a kernel starts or finishes, and finish times are rounded up to cycles.
+        """
+        self.capacity = capacity
+        self.flows: Dict[Kernel, _Flow] = {}
+        self.time = 0
+        # Incremented whenever finish times change, so that timeouts scheduled for older finish times are ignored
+        self.generation = 0
+        self.num_updates = 0
+
+    @property
+    def bandwidth(self) -> float:
+        """Return the bandwidth in use."""
+        return sum(flow.demand * flow.rate for flow in self.flows.values())
+
+    def _advance(self, now: int) -> None:
+        elapsed = now - self.time
+        if elapsed > 0:
+            for flow in self.flows.values():
+                flow.remaining = max(flow.remaining - flow.rate * elapsed, 0.0)
+        self.time = now
+
+    def _allocate(self) -> None:
+        # Water-filling: the smallest demands are satisfied first and the rest share what is left equally
+        capacity = self.capacity
+        flows = sorted(self.flows.values(), key=lambda flow: flow.demand)
+        for i, flow in enumerate(flows):
+            share = capacity / (len(flows) - i)
+            allocated = min(flow.demand, share)
+            flow.rate = allocated / flow.demand
+            capacity -= allocated
+        for flow in self.flows.values():
+            flow.finish_time = self.time + int(math.ceil(flow.remaining / flow.rate - 1e-9))
+        self.generation += 1
+        self.num_updates += 1
+
+    def add(self, kernel: Kernel, now: int) -> None:
+        """Start a flow of a kernel."""
+        self._advance(now)
+        self.flows[kernel] = _Flow(kernel.app_config.offchip_bw, kernel.app_config.runtime)
+        self._allocate()
+
+    def pop_finished(self, now: int) -> List[Kernel]:
+        """Remove and return kernels whose flows finish by now, in the order they started."""
+        self._advance(now)
+        kernels = [kernel for kernel, flow in self.flows.items() if flow.finish_time <= now]
+        for kernel in kernels:
+            del self.flows[kernel]
+        if len(kernels) > 0:
+            self._allocate()
+        return kernels
+
+    def next_finish_time(self) -> Optional[int]:
+        """Return the earliest finish time of running flows, or None if there is none."""
+        if len(self.flows) == 0:
+            return None
+        return min(flow.finish_time for flow in self.flows.values())
@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from typing import TYPE_CHECKING, Optional, Tuple
 from enum import Enum
 if TYPE_CHECKING:
+    from lapidary.app import AppConfig
     from lapidary.kernel import Kernel
 
 
@@ -22,6 +23,8 @@ class PRR:
     width: int = 0
     num_input: int = 0
     num_output: int = 0
+    # Last loaded bitstream: (app, app config, index of the prr in the kernel's prrs)
+    bitstream: Optional[Tuple[str, AppConfig, int]] = None
 
 
 @dataclass
@@ -34,11 +37,11 @@ class Bank:
 
 @dataclass
 class OffchipInterface:
-    max_bandwidth: int = 0
-    bandwidth: int = 0
+    max_bandwidth: float = 0
+    bandwidth: float = 0
 
 
 @dataclass
 class NoC:
-    max_bandwidth: int = 0
-    bandwidth: int = 0
+    max_bandwidth: float = 0
+    bandwidth: float = 0
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from lapidary.app import AppConfig
-from typing import TYPE_CHECKING, Tuple, List
+from typing import TYPE_CHECKING, Optional, Tuple, List, Sequence
 if TYPE_CHECKING:
     from lapidary.components import PRR, Bank
     from lapidary.task import Task
@@ -23,9 +23,11 @@ class KernelStatus(Enum):
 
 
 class Kernel:
-    def __init__(self, task: Task, name: str, app: str, deps: List[str]) -> None:
+    def __init__(self, task: Task, name: str, app: str, deps: Sequence[str], idx: int = 0) -> None:
         self.task = task
         self.name = name
+        # Index of the kernel in the topological order of its task
+        self.idx = idx
         self.tag = f"{self.task.tag}_{self.name}"
         self.app = app
         self.status = KernelStatus.PENDING
@@ -35,8 +37,17 @@ class Kernel:
 
         self.prrs: List[PRR] = []
         self.banks: List[Bank] = []
+        # Allocations of a running kernel that were left before it finished, as (start, end, prr ids, bank ids), and
+        # the start of its current allocation
+        self.segments: List[Tuple[int, int, List[int], List[int]]] = []
+        self.segment_start = 0
 
         self.app_config: AppConfig
+        # Kernels of other tasks that run in the execution of this kernel. They hold no prrs or banks of their own.
+        self.batch: List[Kernel] = []
+        # Runtime left when the kernel was preempted, or None if it runs from the start
+        self.remaining_runtime: Optional[int] = None
+        self.num_preemptions = 0
 
     def set_app_config(self, app_config: AppConfig) -> None:
         """Set app configuration."""
@@ -49,7 +60,7 @@ class Kernel:
         else:
             return self.app_config.prr_shape
 
-    def update_deps(self, deps: List[str]):
+    def update_deps(self, deps: Sequence[str]):
         self.deps = deps
 
     def set_prrs(self, prrs: List[PRR]) -> None:
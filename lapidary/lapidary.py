@@ -1,10 +1,12 @@
 import simpy
-from lapidary.app import AppPool
+import numpy as np
+from functools import partial
+from lapidary.app import AppPoolType
 from lapidary.accelerator import Accelerator, AcceleratorConfigType
 from lapidary.workload import Workload
-from lapidary.scheduler import FCFSScheduler
+from lapidary.scheduler import FCFSScheduler, AffinityScheduler, DeadlineScheduler, LookaheadScheduler
 from lapidary.util.task_logger import TaskLogger
-from typing import Optional, Union, Dict
+from typing import Callable, Optional, Union, Dict
 import os
 import logging
 logger = logging.getLogger(__name__)
@@ -12,19 +14,32 @@ logger = logging.getLogger(__name__)
 
 class Lapidary:
     def __init__(self, accelerator_config: Optional[Union[str, AcceleratorConfigType]],
-                 workload_config: Optional[Union[str, Dict]], app_pool: AppPool) -> None:
+                 workload_config: Optional[Union[str, Dict]], app_pool: AppPoolType,
+                 stream_log_dir: Optional[str] = None, seed: Optional[int] = None,
+                 app_model: bool = False, scheduler: str = 'fcfs') -> None:
         # simpy environment
         self.env = simpy.Environment()
+        # Root of random streams. Every task generator derives its own stream from it.
+        self.seed_seq = np.random.SeedSequence(seed) if seed is not None else None
 
         self.accelerator = Accelerator(self.env, accelerator_config)
         # TODO: Get rid of num_prr argument from tasklogger
-        self.task_logger = TaskLogger(self.accelerator.config.num_prr_height * self.accelerator.config.num_prr_width, self.accelerator.config.num_glb_banks)
-        self.scheduler = FCFSScheduler(self.env)
+        self.task_logger = TaskLogger(self.accelerator.config.num_prr_height * self.accelerator.config.num_prr_width,
+                                      self.accelerator.config.num_glb_banks, stream_dir=stream_log_dir)
+        self.accelerator.trace_bank_fragmentation = self.task_logger.record_bank_fragmentation
+        schedulers: Dict[str, Callable[[simpy.Environment], FCFSScheduler]] = {
+            'fcfs': FCFSScheduler, 'affinity': AffinityScheduler, 'edf': partial(DeadlineScheduler, policy='edf'),
+            'least_slack': partial(DeadlineScheduler, policy='least_slack'), 'lookahead': LookaheadScheduler}
+        if scheduler not in schedulers:
+            raise Exception(f"Unknown scheduler: {scheduler}")
+        self.scheduler = schedulers[scheduler](self.env)
         self.app_pool = app_pool
-        self.workload = Workload(self.env, workload_config, self.task_logger)
+        self.workload = Workload(self.env, workload_config, self.task_logger, self.seed_seq)
 
         # Set app pool that scheduler can use
         self.scheduler.set_app_pool(self.app_pool)
+        # Let the scheduler choose any prr shape with runtimes modeled from the app pool
+        self.scheduler.use_app_model = app_model
 
         # TODO: Make accelerator system class and move scheduler inside the accelerator system
         # Set accelerator that scheduler can use
@@ -40,19 +55,58 @@ class Lapidary:
         self.scheduler.run()
         self.env.run(until=until)
 
-    def dump_logs(self, dir: str) -> None:
+    def dump_logs(self, dir: str, wide_kernel_log: bool = False) -> None:
         self.task_logger.post_process()
+        self.task_logger.bank_fragmentation = self.accelerator.bank_fragmentation
+        self.task_logger.rejections = {'total': self.scheduler.num_rejected,
+                                       'enough idle prrs': self.scheduler.num_rejected_fragmented}
+        self.task_logger.reconfiguration = {'hit rate': self.accelerator.configuration_hit_rate,
+                                            'time': self.accelerator.reconfiguration_time}
+        if self.accelerator.config.max_batch_size > 1:
+            self.task_logger.batching = {'batches': self.scheduler.num_batches,
+                                         'batched kernels': self.scheduler.num_batched_kernels}
+        if self.accelerator.config.elastic:
+            self.task_logger.resizing = {'resizes': self.accelerator.num_resizes}
 
         dir = os.path.realpath(dir)
         if not os.path.exists(dir):
             os.makedirs(dir)
 
-        self.task_logger.dump_task_df(os.path.join(dir, "task.csv"))
-        self.task_logger.dump_kernel_df(os.path.join(dir, "kernel.csv"))
+        # Task and kernel logs are already written to the stream directory in streaming mode
+        if not self.task_logger.streaming:
+            self.task_logger.dump_task_df(os.path.join(dir, "task.csv"))
+            self.task_logger.dump_kernel_df(os.path.join(dir, "kernel.csv"), wide=wide_kernel_log)
+            self.task_logger.dump_interval_df(os.path.join(dir, "prr_interval.csv"),
+                                              os.path.join(dir, "bank_interval.csv"))
+            self.task_logger.dump_fragmentation_df(os.path.join(dir, "bank_fragmentation.csv"))
         self.task_logger.dump_perf(os.path.join(dir, "perf.txt"))
 
         logger.info(f"Tail latency: {self.task_logger.tail_latency}")
         logger.info(f"Average latency: {self.task_logger.latency}")
         logger.info(f"ANTT: {self.task_logger.antt}")
         logger.info(f"STP: {self.task_logger.stp}")
+        if len(self.task_logger.sla) > 0:
+            logger.info(f"SLA: {self.task_logger.sla}")
+        logger.info(f"Bank fragmentation: {self.task_logger.bank_fragmentation}")
+        logger.info(f"Rejected kernels: {self.scheduler.num_rejected} "
+                    f"({self.scheduler.num_rejected_fragmented} with enough idle prrs)")
+        decision_cache = self.scheduler.decision_cache
+        logger.info(f"Scheduling decision cache: {decision_cache.hits} hits, {decision_cache.misses} misses "
+                    f"(hit rate {decision_cache.hit_rate:.3f})")
+        logger.info(f"Prr configuration: hit rate {self.accelerator.configuration_hit_rate:.3f}, "
+                    f"{self.accelerator.reconfiguration_time} cycles of reconfiguration")
+        if isinstance(self.scheduler, LookaheadScheduler):
+            logger.info(f"Lookahead plans: {self.scheduler.num_planned} kernels planned, "
+                        f"{self.scheduler.num_repairs} repairs")
+        if self.accelerator.config.max_batch_size > 1:
+            logger.info(f"Batching: {self.scheduler.num_batched_kernels} kernels in {self.scheduler.num_batches} "
+                        f"batches")
+        if self.accelerator.config.defragmentation:
+            logger.info(f"Migrated kernels: {self.accelerator.num_migrations}")
+        if self.accelerator.config.preemption:
+            logger.info(f"Preempted kernels: {self.accelerator.num_preemptions} {self.task_logger.preemptions}")
+        if self.accelerator.config.elastic:
+            logger.info(f"Resized kernels: {self.accelerator.num_resizes}")
+        if self.accelerator.bandwidth_model is not None:
+            logger.info(f"Off-chip bandwidth model: {self.accelerator.bandwidth_model.num_updates} rate updates")
         # logger.info(f"Total utilization: {self.task_logger.utilization}")
@@ -1,13 +1,20 @@
 from __future__ import annotations
+import heapq
+import math
 import simpy
 import random
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Generator, Any, List, Optional, Tuple
+from itertools import repeat
+from typing import TYPE_CHECKING, Generator, Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 from lapidary.components import PRR, Bank
 from lapidary.task_queue import TaskQueue
 from lapidary.kernel import Kernel, KernelStatus
-from lapidary.app import AppConfig, AppPool
+from lapidary.task import Task
+from lapidary.app import AppConfig, AppPoolType, FootprintType, group_by_footprint
+from lapidary.app_model import AppModel
 from lapidary.util.exceptions import NoAppConfigException
+from lapidary.util.decision_cache import DecisionCache
+from lapidary.util.resource_timeline import ResourceTimeline
 if TYPE_CHECKING:
     from lapidary.accelerator import Accelerator
 import logging
@@ -19,18 +26,90 @@ class Scheduler(ABC):
         self.env = env
         self.delay = 0
         self.task_queue: TaskQueue
-        self.app_pool: AppPool
+        self.app_pool: AppPoolType
         self.accelerator: Accelerator
-        self.mut_controller = simpy.Resource(self.env, capacity=1)
+        self.proc: simpy.Process
+        # Memo of (prr occupancy, bank occupancy, app, batch size) -> (app_config, prr ids, bank ids)
+        self.decision_cache = DecisionCache()
+        # Footprints that did not fit at the occupancy (prr occupancy, bank occupancy)
+        self._infeasible_footprints: Set[FootprintType] = set()
+        self._infeasible_occupancy: Tuple[int, int] = (0, 0)
+        # If True, app configs of every prr shape are modeled from the profiled ones in the app pool
+        self.use_app_model = False
+        self._app_models: Dict[str, AppModel] = {}
+        # App configs of each (app, batch size) profiled in the app pool
+        self._batch_app_configs: Dict[Tuple[str, int], List[AppConfig]] = {}
+        # App config candidates of each (app, batch size) grouped by footprint, unless the app pool groups them for
+        # single kernels
+        self._footprints: Dict[Tuple[str, int], Dict[FootprintType, List[AppConfig]]] = {}
+        # Number of kernels that were not mapped, and how many of them had enough idle prrs in total. Each kernel is
+        # counted once however many passes it waits, until it is mapped.
+        self.num_rejected = 0
+        self.num_rejected_fragmented = 0
+        self._rejected: Set[Kernel] = set()
+        self._rejected_fragmented: Set[Kernel] = set()
+        # Number of prrs of the smallest app config of each app, and the number of idle prrs of the last occupancy
+        self._min_areas: Dict[str, int] = {}
+        self._idle_prrs: Tuple[int, int] = (-1, 0)
+        # Remaining critical-path runtime from each kernel of a task type, and the app pool version it is based on
+        self._critical_paths: Dict[str, List[int]] = {}
+        self._critical_path_version = 0
 
     def set_accelerator(self, accelerator: Accelerator) -> None:
         self.accelerator = accelerator
 
-    def set_app_pool(self, app_pool: AppPool) -> None:
+    def set_app_pool(self, app_pool: AppPoolType) -> None:
         self.app_pool = app_pool
 
+    def get_app_configs(self, app: str, batch_size: int = 1) -> List[AppConfig]:
+        """Return app config candidates of an app for a batch of kernels sorted by runtime.
+
+            Candidates of a batch are the app configs profiled for at least its size, and candidates of a single
+            kernel are the ones profiled for single kernels. With use_app_model, candidates of a single kernel also
+            include modeled app configs of every prr shape that fits in the accelerator.
+        """
+        if batch_size > 1 or not self.use_app_model:
+            key = (app, batch_size)
+            if key not in self._batch_app_configs:
+                self._batch_app_configs[key] = [app_config for app_config in self.app_pool.get_sorted(app)
+                                                if (app_config.batch_size >= batch_size if batch_size > 1
+                                                    else app_config.batch_size <= 1)]
+            return self._batch_app_configs[key]
+        if app not in self._app_models:
+            self._app_models[app] = AppModel([app_config for app_config in self.app_pool.get(app)
+                                              if app_config.batch_size <= 1])
+        return self._app_models[app].get_sorted((self.accelerator.config.num_prr_height,
+                                                 self.accelerator.config.num_prr_width))
+
+    def get_footprints(self, app: str, batch_size: int = 1) -> Dict[FootprintType, List[AppConfig]]:
+        """Return app config candidates of an app for a batch of kernels grouped by footprint, in order of the
+            fastest candidate of each footprint.
+        """
+        if batch_size == 1 and not self.use_app_model:
+            return self.app_pool.get_footprints(app)
+        key = (app, batch_size)
+        if key not in self._footprints:
+            self._footprints[key] = group_by_footprint(self.get_app_configs(app, batch_size))
+        return self._footprints[key]
+
+    def get_critical_paths(self, task: Task) -> List[int]:
+        """Return the runtime of the longest path from each kernel of a task to its end, in kernel order."""
+        if self.app_pool.version != self._critical_path_version:
+            self._critical_paths.clear()
+            self._critical_path_version = self.app_pool.version
+        if task.name not in self._critical_paths:
+            template = task.template
+            critical_paths = [0 for _ in template.apps]
+            # Kernels are in topological order, so successors come later
+            for i in reversed(range(len(template.apps))):
+                app_configs = self.get_app_configs(template.apps[i])
+                runtime = app_configs[0].runtime if len(app_configs) > 0 else 0
+                critical_paths[i] = runtime + max([critical_paths[j] for j in template.successors[i]], default=0)
+            self._critical_paths[task.name] = critical_paths
+        return self._critical_paths[task.name]
+
     def run(self) -> None:
-        self.env.process(self.proc_schedule())
+        self.proc = self.env.process(self.proc_schedule())
 
     @abstractmethod
     def proc_schedule(self) -> Generator[simpy.events.Event, Any, Any]:
@@ -48,103 +127,633 @@ class FCFSScheduler(Scheduler):
         super().__init__(env)
         self.task_queue = TaskQueue(self.env, maxsize=100)
         self.delay = 100
+        # Number of task arrivals seen by scheduling passes
+        self._num_arrived_seen = 0
+        # Highest task priority of the scheduling pass in flight, or None if no pass is waiting for its delay
+        self._pass_priority: Optional[int] = None
+        # Number of executions of more than one kernel and the number of kernels in them
+        self.num_batches = 0
+        self.num_batched_kernels = 0
+        # Time when a scheduling pass first saw each ready kernel, for the batch window
+        self._ready_since: Dict[Kernel, int] = {}
+        # Time when a scheduling pass has to start so that the first batch left for later is dispatched when its
+        # batch window expires, or None if no batch is left
+        self.batch_deadline: Optional[int] = None
+
+    def run(self) -> None:
+        super().run()
+        self.env.process(self.proc_interrupt())
+
+    @property
+    def has_pending_work(self) -> bool:
+        """True if tasks arrived or kernels finished since the last scheduling pass started, or the batch window
+            of a batch left for later expires.
+        """
+        return (len(self.accelerator.done_kernels) > 0 or self.task_queue.num_arrived > self._num_arrived_seen
+                or self.batch_deadline is not None and self.env.now >= self.batch_deadline)
 
     def proc_schedule(self) -> Generator[simpy.events.Event, simpy.events.ConditionValue,
                                          None]:
-        """Call schedule function when new tasks arrive or old tasks finish."""
+        """Call schedule function when new tasks arrive or old tasks finish.
+
+            Every arrival and kernel completion since the last pass is coalesced into one pass, so a burst of events
+            pays the schedule delay once. A batch left for later wakes the scheduler up at its batch deadline.
+        """
         while True:
-            triggered = yield self.task_queue.evt_task_arrive | self.accelerator.evt_kernel_done
-            if self.accelerator.evt_kernel_done in triggered:
-                kernel, mut_kernel_done = triggered[self.accelerator.evt_kernel_done]
-                yield self.env.process(self.task_queue.update_kernel_done(kernel=kernel))
-                self.accelerator.acknowledge_kernel_done(mut_kernel_done)
+            if not self.has_pending_work:
+                events = [self.task_queue.evt_task_arrive, self.accelerator.evt_kernel_done]
+                if self.batch_deadline is not None:
+                    events.append(self.env.timeout(self.batch_deadline - self.env.now))
+                yield simpy.AnyOf(self.env, events)
+            for kernel in self.collect_done_kernels():
+                yield from self.task_queue.update_kernel_done(kernel=kernel)
             try:
-                yield self.env.process(self.schedule())
+                yield from self.schedule()
             except simpy.Interrupt:
-                # Interrupt when new task arrives while scheduling
-                pass
+                # Interrupt when a task of higher priority arrives while scheduling. The pass is rerun with it.
+                logger.debug(f"[@ {self.env.now}] Schedule is interrupted.")
+
+    def proc_interrupt(self) -> Generator[simpy.events.Event, None, None]:
+        """Interrupt the scheduling pass in flight when a task of higher priority than the pass arrives."""
+        while True:
+            yield self.task_queue.evt_task_arrive
+            if self.check_interrupt():
+                self.proc.interrupt()
+
+    def check_interrupt(self) -> bool:
+        """Return True and close the pass in flight if a ready kernel has a higher priority than the pass."""
+        top_priority = self.task_queue.top_priority
+        if self._pass_priority is None or top_priority is None or top_priority <= self._pass_priority:
+            return False
+        self._pass_priority = None
+        return True
+
+    def collect_done_kernels(self) -> List[Kernel]:
+        """Mark pending arrivals as seen and return kernels finished since the last pass."""
+        self._num_arrived_seen = self.task_queue.num_arrived
+        return self.accelerator.pop_done_kernels()
 
     def schedule(self) -> Generator[simpy.events.Event, None, None]:
         """Schedule kernels on the accelerator and return a list of kernels that are scheduled."""
-
+        kernels = self.start_pass()
         # If there is no ready kernel, just pass
-        if len(self.task_queue.get_ready_kernels()) == 0:
+        if len(kernels) == 0:
             return
 
-        logger.debug(f"[@ {self.env.now}] Call schedule.")
         # schedule delay
         yield self.env.timeout(self.delay)
 
+        for kernel in self.end_pass(kernels):
+            self.accelerator.execute(kernel)
+
+    def start_pass(self) -> List[Kernel]:
+        """Start a scheduling pass and return the ready kernels it decides on.
+
+            Kernels that become ready during the schedule delay are left for the next pass.
+        """
+        kernels = self.task_queue.get_ready_kernels()
+        # The pass decides on every held batch again
+        self.batch_deadline = None
+        if len(kernels) > 0:
+            logger.debug(f"[@ {self.env.now}] Call schedule.")
+            self._pass_priority = kernels[0].task.priority
+        elif self.accelerator.config.elastic:
+            self.grow_kernels()
+        return kernels
+
+    def end_pass(self, kernels: List[Kernel]) -> List[Kernel]:
+        """Finish a scheduling pass after the schedule delay and return the kernels to execute."""
+        self._pass_priority = None
+        kernels = self.dispatch(kernels)
+        if self.accelerator.config.elastic and self.task_queue.num_ready_kernels == 0:
+            self.grow_kernels()
+        return kernels
+
+    def grow_kernels(self) -> None:
+        """Grow running kernels into idle adjacent prrs, in order of their task priority and arrival.
+
+            It is only called when no kernel is waiting, so that growing kernels do not take prrs from ready ones.
+        """
+        order = {task: i for i, task in enumerate(self.task_queue.q)}
+        running = sorted(self.accelerator.get_running_kernels(),
+                         key=lambda kernel: (-kernel.task.priority, order[kernel.task], kernel.idx))
+        for kernel in running:
+            resize = self.accelerator.plan_resize(kernel, self.get_app_configs(kernel.app))
+            if resize is not None:
+                self._resize_kernel(kernel, *resize)
+
+    def _resize_kernel(self, kernel: Kernel, app_config: AppConfig, prrs: List[PRR], banks: List[Bank],
+                       end: int) -> None:
+        self.accelerator.resize(kernel, app_config, prrs, banks, end)
+
+    def dispatch(self, candidates: Optional[List[Kernel]] = None) -> List[Kernel]:
+        """Select kernels, allocate resources, mark them scheduled and return them in the order to execute.
+
+            Kernels are selected among candidates, or among every ready kernel if candidates is None.
+        """
         # Select kernels to run
-        kernels = self.select_kernels()
+        kernels = self.select_kernels(candidates)
         logger.debug(f"[@ {self.env.now}] Number of tasks being scheduled: {len(kernels)}")
 
         for kernel in kernels:
             logger.debug(f"[@ {self.env.now}] {kernel.tag} is scheduled to prr{list(map(lambda x: x.id, kernel.prrs))},"
                          f" bank {list(map(lambda x: x.id, kernel.banks))}.")
             self.task_queue.update_kernel_scheduled(kernel=kernel)
-            self.accelerator.execute(kernel)
 
-    def select_kernels(self) -> List[Kernel]:
+        # Batched kernels run in the execution of the first kernel of their batch
+        followers = {follower for kernel in kernels for follower in kernel.batch}
+        return [kernel for kernel in kernels if kernel not in followers]
+
+    def select_kernels(self, candidates: Optional[List[Kernel]] = None) -> List[Kernel]:
         # selected kernels list
         kernels = []
+        accelerator = self.accelerator
+        if candidates is None:
+            candidates = self.task_queue.get_ready_kernels()
+        batches: Iterable[Tuple[Kernel, Sequence[Kernel]]]
+        if accelerator.config.max_batch_size > 1:
+            batches = self.group_batches(candidates)
+        else:
+            batches = zip(candidates, repeat(()))
+
+        # (app, batch size) that did not fit at an occupancy. Later kernels of the app have no higher priority, so
+        # they do not fit either until the occupancy changes, and are rejected without searching app configs again.
+        # Also keeps whether the app fits in the idle prrs, to skip counting kernels that were rejected before.
+        blocked: Dict[Tuple[str, int], Tuple[Tuple[int, int], bool]] = {}
+        # Only searching app configs, making room and allocating change the occupancy
+        occupancy = (accelerator.prr_occupancy, accelerator.bank_occupancy)
 
         # Search kernels in the ready_kernels queue
-        for kernel in self.task_queue.get_ready_kernels():
-            app_config, prrs, banks = self.select_app_config(kernel)
+        for kernel, followers in batches:
+            resume = kernel.remaining_runtime is not None
+            key = (kernel.app, 1 + len(followers))
+            block = blocked.get(key)
+            if not resume and block is not None and block[0] == occupancy:
+                if kernel not in self._rejected or (block[1] and kernel not in self._rejected_fragmented):
+                    self._count_rejection(kernel)
+                continue
+            if resume:
+                app_config, prrs, banks = self._select_resume(kernel)
+            else:
+                app_config, prrs, banks = self.select_app_config(kernel, 1 + len(followers))
+            # A batch that does not fit leaves kernels for later passes until it does
+            while app_config is None and len(followers) > 0:
+                followers = followers[:-1]
+                app_config, prrs, banks = self.select_app_config(kernel, 1 + len(followers))
+            if app_config is None:
+                app_config, prrs, banks = self._make_room(kernel)
 
             # If map is not available, then continue
             if app_config is None:
+                new_occupancy = (accelerator.prr_occupancy, accelerator.bank_occupancy)
+                if not resume and occupancy == new_occupancy:
+                    blocked[key] = (occupancy, self._fits_idle_prrs(kernel.app))
+                occupancy = new_occupancy
+                self._count_rejection(kernel)
                 continue
             # Set app_config for the task
             kernel.set_app_config(app_config)
-            self.accelerator.allocate(kernel, prrs, banks)
+            accelerator.allocate(kernel, prrs, banks)
+            occupancy = (accelerator.prr_occupancy, accelerator.bank_occupancy)
             kernels.append(kernel)
+            kernel.batch = list(followers)
+            for follower in followers:
+                follower.set_app_config(app_config)
+                kernels.append(follower)
+            if len(followers) > 0:
+                self.num_batches += 1
+                self.num_batched_kernels += 1 + len(followers)
+            for batch_kernel in [kernel, *followers]:
+                self._ready_since.pop(batch_kernel, None)
+                self._clear_rejection(batch_kernel)
 
         return kernels
 
-    def select_app_config(self, kernel: Kernel) -> Tuple[Optional[AppConfig], List[PRR], List[Bank]]:
+    def group_batches(self, candidates: List[Kernel]) -> List[Tuple[Kernel, List[Kernel]]]:
+        """Group ready kernels of the same app and different tasks into batches, in order of their first kernel.
+
+            Batches have up to max_batch_size kernels and no more than the largest batch size profiled for the app.
+            Each kernel joins the first batch of its app without a kernel of its task. A batch that is not full is
+            left for later passes while other kernels run, until batch_window cycles after its first kernel became
+            ready, and batch_deadline is set so that a pass dispatches it then. Kernels are returned as
+            (first kernel, other kernels).
+        """
+        config = self.accelerator.config
+        now = int(self.env.now)
+        groups: Dict[str, List[Kernel]] = {}
+        batches: List[Tuple[Kernel, List[Kernel]]] = []
+        self.batch_deadline = None
+        for kernel in candidates:
+            # A preempted kernel resumes alone
+            if kernel.remaining_runtime is not None:
+                batches.append((kernel, []))
+                continue
+            groups.setdefault(kernel.app, []).append(kernel)
+            self._ready_since.setdefault(kernel, now)
+
+        for app, group in groups.items():
+            max_batch_size = min(config.max_batch_size,
+                                 max([app_config.batch_size for app_config in self.app_pool.get(app)], default=1))
+            # Batches of the app, and the ones that are not full yet
+            app_batches: List[List[Kernel]] = []
+            open_batches: List[List[Kernel]] = []
+            for kernel in group:
+                batch = next((batch for batch in open_batches
+                              if all(other.task is not kernel.task for other in batch)), None)
+                if batch is None:
+                    batch = []
+                    app_batches.append(batch)
+                    open_batches.append(batch)
+                batch.append(kernel)
+                if len(batch) == max_batch_size:
+                    open_batches.remove(batch)
+            for batch in app_batches:
+                if (len(batch) < max_batch_size and now - self._ready_since[batch[0]] < config.batch_window
+                        and self.accelerator.prr_occupancy != 0):
+                    deadline = self._ready_since[batch[0]] + config.batch_window - self.delay
+                    if self.batch_deadline is None or deadline < self.batch_deadline:
+                        self.batch_deadline = deadline
+                    continue
+                batches.append((batch[0], batch[1:]))
+        order = {kernel: i for i, kernel in enumerate(candidates)}
+        batches.sort(key=lambda batch: order[batch[0]])
+        return batches
+
+    def _num_idle_prrs(self) -> int:
+        occupancy = self.accelerator.prr_occupancy
+        if self._idle_prrs[0] != occupancy:
+            num_prrs = self.accelerator.config.num_prr_height * self.accelerator.config.num_prr_width
+            self._idle_prrs = (occupancy, num_prrs - bin(occupancy).count('1'))
+        return self._idle_prrs[1]
+
+    def _count_rejection(self, kernel: Kernel) -> None:
+        if kernel not in self._rejected:
+            self._rejected.add(kernel)
+            self.num_rejected += 1
+        if kernel not in self._rejected_fragmented and self._fits_idle_prrs(kernel.app):
+            self._rejected_fragmented.add(kernel)
+            self.num_rejected_fragmented += 1
+
+    def _fits_idle_prrs(self, app: str) -> bool:
+        if app not in self._min_areas:
+            config = self.accelerator.config
+            self._min_areas[app] = min([app_config.prr_shape[0] * app_config.prr_shape[1]
+                                        for app_config in self.get_app_configs(app)],
+                                       default=config.num_prr_height * config.num_prr_width + 1)
+        return self._min_areas[app] <= self._num_idle_prrs()
+
+    def _clear_rejection(self, kernel: Kernel) -> None:
+        """Forget the rejections of a kernel that is mapped."""
+        if kernel in self._rejected:
+            self._rejected.discard(kernel)
+            self._rejected_fragmented.discard(kernel)
+
+    def _defragment(self, kernel: Kernel) -> bool:
+        """Migrate running kernels so that the fastest app config of a blocked kernel that could fit does."""
+        num_idle_prrs = self._num_idle_prrs()
+        for app_config in self.get_app_configs(kernel.app):
+            if app_config.prr_shape[0] * app_config.prr_shape[1] > num_idle_prrs:
+                continue
+            moves = self.accelerator.plan_migration(app_config)
+            if moves is not None:
+                self.accelerator.migrate(moves)
+                return True
+        return False
+
+    def _preempt(self, kernel: Kernel, app_configs: List[AppConfig]) -> bool:
+        """Preempt running kernels of lower task priority for the first of app_configs of a blocked kernel that can
+            take their place.
+        """
+        for app_config in app_configs:
+            victims = self.accelerator.plan_preemption(app_config, kernel.task.priority)
+            if victims is not None:
+                for victim in victims:
+                    self._preempt_kernel(victim)
+                return True
+        return False
+
+    def _preempt_kernel(self, kernel: Kernel) -> None:
+        self.accelerator.preempt(kernel)
+        self.task_queue.update_kernel_preempted(kernel)
+
+    def _make_room(self, kernel: Kernel) -> Tuple[Optional[AppConfig], List[PRR], List[Bank]]:
+        """Defragment prrs and then preempt kernels, if enabled, until a blocked kernel fits."""
+        config = self.accelerator.config
+        resume = kernel.remaining_runtime is not None
+        select = self._select_resume if resume else self.select_app_config
+        if config.defragmentation and self._defragment(kernel):
+            app_config, prrs, banks = select(kernel)
+            if app_config is not None:
+                return app_config, prrs, banks
+        if config.preemption:
+            app_configs = [kernel.app_config] if resume else self.get_app_configs(kernel.app)
+            if self._preempt(kernel, app_configs):
+                return select(kernel)
+        return None, [], []
+
+    def _select_resume(self, kernel: Kernel) -> Tuple[Optional[AppConfig], List[PRR], List[Bank]]:
+        """Map a preempted kernel to its app config again, since its remaining runtime is in that config."""
+        prrs, banks = self.accelerator.map(kernel.app_config)
+        if len(prrs) == 0:
+            return None, [], []
+        return kernel.app_config, prrs, banks
+
+    def select_app_config(self, kernel: Kernel,
+                          batch_size: int = 1) -> Tuple[Optional[AppConfig], List[PRR], List[Bank]]:
         """
         TODO:
         For now, we select app_config, and hardware resources in the same function. It can be changed in the future.
         e.g. First select the amount of resources and then dataflow.
         """
-        # Get app_config candidates from an app_pool
-        app_config_list = self.app_pool.get(kernel.app)
+        # The decision only depends on the occupancy of prrs and banks, the app pool and the allocation policies
+        config = self.accelerator.config
+        if self.decision_cache.validate((id(self.app_pool), self.app_pool.version, config.partition,
+                                         config.bank_allocation, config.glb_bank_size, config.prr_placement,
+                                         self.use_app_model)):
+            self._infeasible_footprints.clear()
+            self._app_models.clear()
+            self._batch_app_configs.clear()
+            self._footprints.clear()
+            self._min_areas.clear()
+
+        # Get app_config candidates from an app_pool grouped by footprint, in order of runtime
+        footprints = self.get_footprints(kernel.app, batch_size)
 
         # Raise an error if there is no possible app config
-        if len(app_config_list) == 0:
+        if len(footprints) == 0:
+            if batch_size > 1:
+                return None, [], []
             raise NoAppConfigException(f"There is no app_config for {kernel.app} in the app_pool.")
+        key = (self.accelerator.prr_occupancy, self.accelerator.bank_occupancy, kernel.app, batch_size)
+        decision = self.decision_cache.get(key)
+        if decision is not None:
+            cached_app_config, prr_ids, bank_ids = decision
+            return cached_app_config, self.accelerator.get_prrs(prr_ids), self.accelerator.get_banks(bank_ids)
+
+        # A footprint that does not fit stays infeasible until resources are released, so it is only tried once
+        # while occupancy grows, e.g. within a scheduling pass.
+        occupancy = (self.accelerator.prr_occupancy, self.accelerator.bank_occupancy)
+        if (occupancy[0] & self._infeasible_occupancy[0] != self._infeasible_occupancy[0]
+                or occupancy[1] & self._infeasible_occupancy[1] != self._infeasible_occupancy[1]):
+            self._infeasible_footprints.clear()
+        self._infeasible_occupancy = occupancy
 
         # TODO: Implement how to choose best target app from app_pool
-        # For now, we just use the first available app_config from the app_pool.
-        runtime = 0
+        # For now, we use the fastest app_config that fits, which is the first one that fits. Mapping only depends on
+        # the footprint, so the fastest app config of each footprint is tried once.
         selected_app_config: Optional[AppConfig] = None
         selected_prrs: List[PRR] = []
         selected_banks: List[Bank] = []
-        choices = []
-        for i, app_config in enumerate(app_config_list):
+        for footprint, app_configs in footprints.items():
+            if footprint in self._infeasible_footprints:
+                continue
+            app_config = app_configs[0]
             prrs, banks = self.accelerator.map(app_config)
             if len(prrs) > 0:
-                choices.append(i)
-                if runtime == 0:
-                    runtime = app_config.runtime
-                    selected_app_config = app_config
-                    selected_prrs = prrs
-                    selected_banks = banks
-                elif app_config.runtime < runtime:
-                    runtime = app_config.runtime
-                    selected_app_config = app_config
-                    selected_prrs = prrs
-                    selected_banks = banks
-
-        # if (len(choices) > 0):
-        #     random_choice = random.choice(choices)
-        #     app_config = app_config_list[random_choice]
-        #     prrs, banks = self.accelerator.map(app_config)
-        #     runtime = app_config.runtime
-        #     selected_app_config = app_config
-        #     selected_prrs = prrs
-        #     selected_banks = banks
+                selected_app_config = app_config
+                selected_prrs = prrs
+                selected_banks = banks
+                break
+            self._infeasible_footprints.add(footprint)
+
+        self.decision_cache.put(key, (selected_app_config, tuple(prr.id for prr in selected_prrs),
+                                      tuple(bank.id for bank in selected_banks)))
+        return selected_app_config, selected_prrs, selected_banks
+
+
+class AffinityScheduler(FCFSScheduler):
+    def __init__(self, env: simpy.Environment) -> None:
+        """FCFS scheduler that prefers prrs already configured for the app of a kernel.
+
+            Among the app configs that fit, it selects the one that finishes first including the reconfiguration
+            of its prrs. Decisions depend on the bitstreams of prrs, so they are not cached.
+        """
+        super().__init__(env)
 
+    def select_app_config(self, kernel: Kernel,
+                          batch_size: int = 1) -> Tuple[Optional[AppConfig], List[PRR], List[Bank]]:
+        app_config_list = self.get_app_configs(kernel.app, batch_size)
+        if len(app_config_list) == 0:
+            if batch_size > 1:
+                return None, [], []
+            raise NoAppConfigException(f"There is no app_config for {kernel.app} in the app_pool.")
+
+        latency = self.accelerator.config.reconfiguration_latency
+        selected_app_config: Optional[AppConfig] = None
+        selected_prrs: List[PRR] = []
+        selected_banks: List[Bank] = []
+        selected_time = 0
+        for app_config in app_config_list:
+            # Candidates are sorted by runtime, so slower ones cannot finish earlier
+            if selected_app_config is not None and app_config.runtime >= selected_time:
+                break
+            prrs, banks = self.accelerator.map(app_config, app=kernel.app)
+            if len(prrs) == 0:
+                continue
+            time = app_config.runtime + latency * self.accelerator.count_reconfigurations(kernel.app, app_config, prrs)
+            if selected_app_config is None or time < selected_time:
+                selected_app_config, selected_prrs, selected_banks, selected_time = app_config, prrs, banks, time
         return selected_app_config, selected_prrs, selected_banks
+
+
+class DeadlineScheduler(FCFSScheduler):
+    def __init__(self, env: simpy.Environment, policy: str = 'edf') -> None:
+        """Scheduler that orders ready kernels of the same priority by their task deadline.
+
+            'edf' runs kernels of the earliest deadline first. 'least_slack' runs kernels of the least slack first,
+            i.e. deadline - now - remaining critical-path runtime of the task from the kernel, where runtimes are
+            those of the fastest app configs. Kernels of tasks without a deadline run after those with one.
+        """
+        super().__init__(env)
+        if policy not in ['edf', 'least_slack']:
+            raise Exception(f"Unknown deadline scheduling policy: {policy}")
+        self.policy = policy
+        self.task_queue.urgency = self.get_urgency
+
+    def get_urgency(self, kernel: Kernel) -> float:
+        """Return the key of a kernel in the ready queue, lower first.
+
+            Slack keys leave out now, which is the same for every kernel compared in a scheduling pass.
+        """
+        deadline = kernel.task.deadline
+        if deadline is None:
+            return math.inf
+        if self.policy == 'edf':
+            return deadline
+        return deadline - self.get_critical_paths(kernel.task)[kernel.idx]
+
+
+class LookaheadScheduler(FCFSScheduler):
+    def __init__(self, env: simpy.Environment) -> None:
+        """Scheduler that plans app configs and start times of every kernel of a task when the task arrives.
+
+            Kernels of a task are list-scheduled in order of their remaining critical path. Each kernel gets the app
+            config that finishes first on a projected timeline of busy prrs, which holds running and planned
+            kernels. A ready kernel runs its planned app config as soon as it fits, and waits for it until its
+            planned start while other kernels run. Only the task of a kernel that is late is replanned, and the
+            kernel falls back to FCFS selection if the new plan does not fit either. The timeline counts prrs, so
+            shapes and glb banks are only checked when kernels are mapped.
+        """
+        super().__init__(env)
+        self.timeline = ResourceTimeline(0)
+        # Planned (app config, start) of kernels that have not started
+        self._plans: Dict[Kernel, Tuple[AppConfig, int]] = {}
+        # Timeline reservation (start, end, number of prrs) of planned and running kernels
+        self._reservations: Dict[Kernel, Tuple[int, int, int]] = {}
+        self.num_planned = 0
+        self.num_repairs = 0
+
+    def set_accelerator(self, accelerator: Accelerator) -> None:
+        super().set_accelerator(accelerator)
+        self.timeline = ResourceTimeline(accelerator.config.num_prr_height * accelerator.config.num_prr_width,
+                                         int(self.env.now))
+
+    def collect_done_kernels(self) -> List[Kernel]:
+        kernels = super().collect_done_kernels()
+        for kernel in kernels:
+            self._release(kernel, kernel.timestamp.done)
+        return kernels
+
+    def _release(self, kernel: Kernel, time: int) -> None:
+        """Release the reservation of a kernel from time on."""
+        reservation = self._reservations.pop(kernel, None)
+        if reservation is not None:
+            start, end, num_prrs = reservation
+            self.timeline.reserve(max(start, time), end, -num_prrs)
+
+    def _preempt_kernel(self, kernel: Kernel) -> None:
+        super()._preempt_kernel(kernel)
+        self._release(kernel, int(self.env.now))
+
+    def _resize_kernel(self, kernel: Kernel, app_config: AppConfig, prrs: List[PRR], banks: List[Bank],
+                       end: int) -> None:
+        super()._resize_kernel(kernel, app_config, prrs, banks, end)
+        now = int(self.env.now)
+        self._release(kernel, now)
+        self._reserve(kernel, now, end, len(prrs))
+
+    def _reserve(self, kernel: Kernel, start: int, end: int, num_prrs: int) -> None:
+        self.timeline.reserve(start, end, num_prrs)
+        self._reservations[kernel] = (start, end, num_prrs)
+
+    def plan(self, task: Task) -> None:
+        """Plan app configs and start times of the pending kernels of a task on the timeline."""
+        now = int(self.env.now)
+        template = task.template
+        critical_paths = self.get_critical_paths(task)
+        # Projected end of each kernel, and number of pending dependencies of each pending kernel
+        ends: Dict[int, int] = {}
+        num_deps = [0 for _ in task.kernels]
+        for kernel in task.kernels:
+            if kernel.status == KernelStatus.PENDING:
+                self._release(kernel, now)
+                self._plans.pop(kernel, None)
+                for i in template.successors[kernel.idx]:
+                    num_deps[i] += 1
+            elif kernel.status == KernelStatus.RUNNING:
+                ends[kernel.idx] = max(self._reservations.get(kernel, (now, now, 0))[1], now)
+            else:
+                ends[kernel.idx] = kernel.timestamp.done
+        deps: List[List[int]] = [[] for _ in task.kernels]
+        for i, successors in enumerate(template.successors):
+            for j in successors:
+                deps[j].append(i)
+
+        heap = [(-critical_paths[kernel.idx], kernel.idx) for kernel in task.kernels
+                if kernel.status == KernelStatus.PENDING and num_deps[kernel.idx] == 0]
+        heapq.heapify(heap)
+        while heap:
+            _, idx = heapq.heappop(heap)
+            kernel = task.kernels[idx]
+            ready = max([ends[i] for i in deps[idx]] + [now])
+            # The app config that finishes first. Candidates are sorted by runtime, so slower ones cannot beat it.
+            best: Optional[Tuple[AppConfig, int, int]] = None
+            for app_config in self.get_app_configs(kernel.app):
+                if best is not None and ready + app_config.runtime >= best[2]:
+                    break
+                num_prrs = app_config.prr_shape[0] * app_config.prr_shape[1]
+                if num_prrs > self.timeline.capacity:
+                    continue
+                start = self.timeline.earliest(ready, app_config.runtime, num_prrs)
+                if best is None or start + app_config.runtime < best[2]:
+                    best = (app_config, start, start + app_config.runtime)
+            if best is None:
+                # Left to FCFS selection, finishing as if it ran its fastest app config right away
+                ends[idx] = ready + critical_paths[idx] - max([critical_paths[i] for i in template.successors[idx]],
+                                                              default=0)
+            else:
+                app_config, start, end = best
+                self._plans[kernel] = (app_config, start)
+                self._reserve(kernel, start, end, app_config.prr_shape[0] * app_config.prr_shape[1])
+                self.num_planned += 1
+                ends[idx] = end
+            for i in template.successors[idx]:
+                num_deps[i] -= 1
+                if num_deps[i] == 0:
+                    heapq.heappush(heap, (-critical_paths[i], i))
+
+    def select_kernels(self, candidates: Optional[List[Kernel]] = None) -> List[Kernel]:
+        kernels = []
+        if candidates is None:
+            candidates = self.task_queue.get_ready_kernels()
+        now = int(self.env.now)
+        self.timeline.advance(now)
+
+        for kernel in candidates:
+            runtime: Optional[int] = kernel.remaining_runtime
+            if runtime is not None:
+                app_config, prrs, banks = self._select_resume(kernel)
+                if app_config is None:
+                    app_config, prrs, banks = self._make_room(kernel)
+                if app_config is None:
+                    self._count_rejection(kernel)
+            else:
+                # A task is planned when the first pass sees it
+                if kernel not in self._plans:
+                    self.plan(kernel.task)
+                app_config, prrs, banks = self.select_planned_app_config(kernel)
+            if app_config is None:
+                continue
+            kernel.set_app_config(app_config)
+            self.accelerator.allocate(kernel, prrs, banks)
+            self._clear_rejection(kernel)
+            self._plans.pop(kernel, None)
+            self._release(kernel, now)
+            end = now + (runtime if runtime is not None else app_config.runtime)
+            self._reserve(kernel, now, end, app_config.prr_shape[0] * app_config.prr_shape[1])
+            kernels.append(kernel)
+
+        return kernels
+
+    def select_planned_app_config(self, kernel: Kernel) -> Tuple[Optional[AppConfig], List[PRR], List[Bank]]:
+        """Return the planned app config of a kernel if it fits, None if the kernel waits for it, or else the
+            app config that FCFS selects.
+        """
+        now = int(self.env.now)
+        for repair in [False, True]:
+            if repair:
+                # The plan is late, so the rest of the task is planned again from the current timeline
+                self.num_repairs += 1
+                self.plan(kernel.task)
+            plan = self._plans.get(kernel)
+            if plan is None:
+                break
+            planned_app_config, start = plan
+            prrs, banks = self.accelerator.map(planned_app_config)
+            if len(prrs) > 0:
+                return planned_app_config, prrs, banks
+            # Wait for the planned start unless nothing runs, since only kernel completions start scheduling passes
+            if start > now and self.accelerator.prr_occupancy != 0:
+                # Kernels of lower priority that the plan waits for are preempted instead, if enabled
+                if self.accelerator.config.preemption and self._preempt(kernel, [planned_app_config]):
+                    prrs, banks = self.accelerator.map(planned_app_config)
+                    if len(prrs) > 0:
+                        return planned_app_config, prrs, banks
+                return None, [], []
+
+        app_config, prrs, banks = self.select_app_config(kernel)
+        if app_config is None:
+            app_config, prrs, banks = self._make_room(kernel)
+        if app_config is None:
+            self._count_rejection(kernel)
+        return app_config, prrs, banks
@@ -0,0 +1,173 @@
+import copy
+import hashlib
+import itertools
+import json
+import os
+import yaml
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set, Tuple, Union, cast
+from lapidary.app import AppPool, AppPoolType
+from lapidary.accelerator import AcceleratorConfigType
+from lapidary.lapidary import Lapidary
+import logging
+logger = logging.getLogger(__name__)
+
+METRIC_COLUMNS = ['task', 'latency', 'p95', 'p99', 'p999', 'antt', 'stp', 'prr_utilization', 'glb_utilization']
+
+
+def _load_yaml(config: Union[str, Dict]) -> Dict:
+    if isinstance(config, str):
+        config = os.path.realpath(config)
+        if not os.path.exists(config):
+            raise Exception(f"[ERROR] Config file not found: {config}")
+        with open(config, 'r') as f:
+            return yaml.load(f, Loader=yaml.SafeLoader)
+    return copy.deepcopy(config)
+
+
+def _set_nested(config: Dict, keys: List[str], value: Any) -> None:
+    """Set a value in a nested dict. '*' matches every key at its level."""
+    key = keys[0]
+    targets = list(config.keys()) if key == '*' else [key]
+    for target in targets:
+        if len(keys) == 1:
+            config[target] = value
+        else:
+            if target not in config:
+                config[target] = {}
+            _set_nested(config[target], keys[1:], value)
+
+
+def apply_point(arch_config: Dict, workload_config: Dict, point: Dict[str, Any]) -> Tuple[Dict, Dict]:
+    """Return copies of architecture and workload configs with the parameters of a sweep point applied.
+
+        Parameter names are dotted paths prefixed with 'arch.' or 'workload.',
+        e.g. 'arch.num_prr_width' or 'workload.*.dist.lambda'.
+    """
+    arch_config = copy.deepcopy(arch_config)
+    workload_config = copy.deepcopy(workload_config)
+    for name, value in point.items():
+        keys = name.split('.')
+        if keys[0] == 'arch':
+            _set_nested(arch_config, keys[1:], value)
+        elif keys[0] == 'workload':
+            _set_nested(workload_config, keys[1:], value)
+        elif name != 'seed':
+            raise Exception(f"Sweep parameter should start with 'arch.' or 'workload.': {name}")
+    return arch_config, workload_config
+
+
+def expand_points(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return sweep points from the cartesian product of 'grid', the explicit 'points' list, and 'seeds'."""
+    points: List[Dict[str, Any]] = []
+    grid = spec.get('grid', {})
+    if len(grid) > 0:
+        names = list(grid.keys())
+        for values in itertools.product(*[grid[name] for name in names]):
+            points.append(dict(zip(names, values)))
+    points += [dict(point) for point in spec.get('points', [])]
+    if len(points) == 0:
+        points = [{}]
+    if 'seeds' in spec:
+        points = [{**point, 'seed': seed} for point in points for seed in spec['seeds']]
+    return points
+
+
+def workload_apps(workload_config: Dict) -> Set[str]:
+    """Return the apps of every kernel in a workload config."""
+    return {kernel['app'] for task in workload_config.values() for kernel in task.get('kernels', {}).values()}
+
+
+def point_id(point: Dict[str, Any]) -> str:
+    """Return a stable id of a sweep point."""
+    return hashlib.sha1(json.dumps(point, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def run_point(arch_config: Dict, workload_config: Dict, app_pool: AppPoolType,
+              point: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run a Lapidary simulation for a sweep point and return one row of compact metrics per task type."""
+    arch_config, workload_config = apply_point(arch_config, workload_config, point)
+    lapidary = Lapidary(cast(AcceleratorConfigType, arch_config), workload_config, app_pool, seed=point.get('seed'))
+    lapidary.run()
+    task_logger = lapidary.task_logger
+    task_logger.post_process()
+
+    prr_utilization, glb_utilization = task_logger.utilization
+    rows = []
+    for task, latency in task_logger.latency.items():
+        tail_latency = task_logger.tail_latency[task]
+        rows.append({'task': task,
+                     'latency': float(latency),
+                     'p95': float(tail_latency[0.95]),
+                     'p99': float(tail_latency[0.99]),
+                     'p999': float(tail_latency[0.999]),
+                     'antt': float(task_logger.antt[task]),
+                     'stp': float(task_logger.stp[task]),
+                     'prr_utilization': prr_utilization,
+                     'glb_utilization': glb_utilization})
+    return rows
+
+
+class Sweep:
+    def __init__(self, spec: Union[str, Dict[str, Any]], app_pool: AppPoolType) -> None:
+        """Design space sweep over architecture and workload parameters.
+
+            spec has 'arch' and 'workload' config files (or dicts) and a 'grid' of parameter values and/or an
+            explicit list of 'points'. An optional 'seeds' list replicates every point.
+        """
+        self.spec = _load_yaml(spec)
+        self.arch_config = _load_yaml(self.spec['arch'])
+        self.workload_config = _load_yaml(self.spec['workload'])
+        self.points = expand_points(self.spec)
+        self.param_names = sorted({name for point in self.points for name in point})
+        # A frozen snapshot is shared by every point and is not affected by later changes to the pool. It only has
+        # the apps that the workloads of the points use, so other apps are not loaded.
+        if isinstance(app_pool, AppPool):
+            apps = {app for point in self.points
+                    for app in workload_apps(apply_point(self.arch_config, self.workload_config, point)[1])}
+            self.app_pool: AppPoolType = app_pool.freeze(apps)
+        else:
+            self.app_pool = app_pool
+
+    def _rows(self, point: Dict[str, Any], metric_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        params = {name: point.get(name) for name in self.param_names}
+        return [{'point_id': point_id(point), **params, **row} for row in metric_rows]
+
+    def run(self, output: str, processes: Optional[int] = None) -> pd.DataFrame:
+        """Run every sweep point that is not in output yet and return the whole result table.
+
+            Rows are appended to the output csv as soon as each point finishes, so an interrupted sweep resumes
+            where it stopped. Points run in a pool of processes, or serially if processes is 1.
+        """
+        output = os.path.realpath(output)
+        columns = ['point_id'] + self.param_names + METRIC_COLUMNS
+        done = set()
+        if os.path.exists(output) and os.path.getsize(output) > 0:
+            header = list(pd.read_csv(output, nrows=0).columns)
+            if header != columns:
+                raise Exception(f"[ERROR] Columns of {output} do not match the sweep: {header} != {columns}")
+            done = set(pd.read_csv(output, usecols=['point_id'], dtype={'point_id': str})['point_id'])
+        else:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            pd.DataFrame(columns=columns).to_csv(output, index=False)
+        points = [point for point in self.points if point_id(point) not in done]
+        logger.info(f"Sweep: {len(points)} points to run, {len(self.points) - len(points)} points already done.")
+
+        def _append(point: Dict[str, Any], metric_rows: List[Dict[str, Any]]) -> None:
+            df = pd.DataFrame(self._rows(point, metric_rows), columns=columns)
+            df.to_csv(output, mode='a', header=False, index=False)
+
+        if processes == 1:
+            for i, point in enumerate(points):
+                _append(point, run_point(self.arch_config, self.workload_config, self.app_pool, point))
+                logger.info(f"Sweep: {i + 1}/{len(points)} points done.")
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = {executor.submit(run_point, self.arch_config, self.workload_config, self.app_pool, point):
+                           point for point in points}
+                for i, future in enumerate(as_completed(futures)):
+                    _append(futures[future], future.result())
+                    logger.info(f"Sweep: {i + 1}/{len(points)} points done.")
+
+        return pd.read_csv(output, dtype={'point_id': str})
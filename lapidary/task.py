@@ -1,11 +1,10 @@
 from __future__ import annotations
 import simpy
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from lapidary.kernel import Kernel, KernelStatus
 import logging
 logger = logging.getLogger(__name__)
-if TYPE_CHECKING:
-    from lapidary.kernel import Kernel
 
 
 @dataclass
@@ -16,44 +15,67 @@ class Timestamp:
     done: int = 0
 
 
+@dataclass(frozen=True)
+class TaskTemplate:
+    """Kernel graph of a task compiled once and shared by every task instance.
+
+        Kernels are indexed in topological order.
+    """
+    names: Tuple[str, ...] = ()
+    apps: Tuple[str, ...] = ()
+    deps: Tuple[Tuple[str, ...], ...] = ()
+    successors: Tuple[Tuple[int, ...], ...] = ()
+    in_degree: Tuple[int, ...] = ()
+
+
 class Task:
-    def __init__(self, env: simpy.Environment, name: str, id: int) -> None:
+    def __init__(self, env: simpy.Environment, name: str, id: int, template: TaskTemplate = TaskTemplate(),
+                 priority: int = 0, deadline: Optional[int] = None) -> None:
         self.env = env
         self.name = name
         self.id = id
+        self.priority = priority
         self.tag = f"{self.name}_{self.id}"
         self.timestamp: Timestamp = Timestamp(generate=int(self.env.now))
+        # Absolute time by which the task should be done, given a latency target from its generation
+        self.deadline = self.timestamp.generate + deadline if deadline is not None else None
 
-        # TODO: Change this to graph for fast traversal
-        self._kernels: List[Kernel]
-        self.next_kernel_idx: int = 0
+        self.template = template
+        self._kernels: List[Kernel] = [Kernel(self, kernel_name, app, deps, idx=i) for i, (kernel_name, app, deps)
+                                       in enumerate(zip(template.names, template.apps, template.deps))]
+        # Number of unfinished dependencies of each kernel
+        self.num_deps: List[int] = list(template.in_degree)
+        self.num_done_kernels: int = 0
 
         # task_done event
         self.evt_task_done = self.env.event()
 
     @property
     def pending_kernels(self) -> List[Kernel]:
-        return self.kernels[self.next_kernel_idx:]
+        return [kernel for kernel in self._kernels if kernel.status == KernelStatus.PENDING]
+
+    @property
+    def done(self) -> bool:
+        return self.num_done_kernels == len(self._kernels)
 
     @property
     def kernels(self) -> List[Kernel]:
         return self._kernels
 
-    @kernels.setter
-    def kernels(self, kernels: List[Kernel]) -> None:
-        self._kernels = kernels
-
-    # TODO: For now, we just iterate through all pending kernels
     @property
     def ready_kernels(self) -> List[Kernel]:
         ready_kernels = []
         for kernel in self.pending_kernels:
-            if len(kernel.deps) == 0:
+            if self.num_deps[kernel.idx] == 0:
                 ready_kernels.append(kernel)
 
         return ready_kernels
 
-    def update_dependency(self, kernel: Kernel) -> None:
-        for pending_kernel in self.pending_kernels:
-            if kernel.name in pending_kernel.deps:
-                pending_kernel.deps.remove(kernel.name)
+    def update_dependency(self, kernel: Kernel) -> List[Kernel]:
+        """Remove a finished kernel from dependencies and return kernels that become ready."""
+        ready_kernels = []
+        for i in self.template.successors[kernel.idx]:
+            self.num_deps[i] -= 1
+            if self.num_deps[i] == 0:
+                ready_kernels.append(self._kernels[i])
+        return ready_kernels
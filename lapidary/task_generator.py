@@ -1,14 +1,13 @@
 import simpy
 import numpy as np
 from typing import Optional, TypedDict, Union, Dict, List, Generator
-from lapidary.task import Task
-from lapidary.kernel import Kernel
+from lapidary.task import Task, TaskTemplate
+from lapidary.arrival import ArrivalProcess, PoissonArrival, MMPPArrival, OnOffArrival, DiurnalArrival
 from lapidary.scheduler import Scheduler
-from lapidary.util.exceptions import DistributionTypeException
+from lapidary.util.exceptions import DistributionTypeException, CyclicDependencyException
 from lapidary.util.task_logger import TaskLogger
 from enum import Enum
 import logging
-from collections import defaultdict
 logger = logging.getLogger(__name__)
 
 
@@ -17,24 +16,40 @@ class KernelConfigType(TypedDict):
     dependencies: List[str]
 
 
-class DistributionConfigType(TypedDict):
+class DistributionConfigType(TypedDict, total=False):
     type: str
     start: int
     interval: int
     lambda_: int
     size: int
     delay: int
+    lambdas: List[Optional[int]]
+    dwells: List[int]
+    transition: List[List[float]]
+    on: int
+    off: int
+    period: int
+    amplitude: float
+    phase: float
 
 
-class TaskGeneratorConfigType(TypedDict):
+class _TaskGeneratorConfigType(TypedDict):
     dist: DistributionConfigType
     kernels: Dict[str, KernelConfigType]
 
 
+class TaskGeneratorConfigType(_TaskGeneratorConfigType, total=False):
+    priority: int
+    deadline: int
+
+
 class DistributionType(Enum):
     STREAM = 0
     POISSON = 1
     FIXED = 2
+    MMPP = 3
+    ON_OFF = 4
+    DIURNAL = 5
 
 
 class TaskGeneratorDistribution:
@@ -45,6 +60,15 @@ class TaskGeneratorDistribution:
         self.lambda_ = 0
         self.size = 0
         self.delay = 0
+        # Bursty arrival parameters
+        self.lambdas: List[Optional[int]] = []
+        self.dwells: List[int] = []
+        self.transition: Optional[List[List[float]]] = None
+        self.on = 0
+        self.off = 0
+        self.period = 0
+        self.amplitude = 0.0
+        self.phase = 0.0
 
     def set_distribution(self, config) -> None:
         if config['type'] == 'stream':
@@ -62,17 +86,62 @@ class TaskGeneratorDistribution:
             self.start = config['start']
             self.interval = config['interval']
             self.size = config['size']
+        elif config['type'] == 'mmpp':
+            self.type = DistributionType.MMPP
+            self.start = config['start']
+            self.lambdas = config['lambdas']
+            self.dwells = config['dwells']
+            self.transition = config.get('transition')
+            self.size = config['size']
+        elif config['type'] == 'onoff':
+            self.type = DistributionType.ON_OFF
+            self.start = config['start']
+            self.lambda_ = config['lambda']
+            self.on = config['on']
+            self.off = config['off']
+            self.size = config['size']
+        elif config['type'] == 'diurnal':
+            self.type = DistributionType.DIURNAL
+            self.start = config['start']
+            self.lambda_ = config['lambda']
+            self.period = config['period']
+            self.amplitude = config['amplitude']
+            self.phase = config.get('phase', 0.0)
+            self.size = config['size']
+        else:
+            raise DistributionTypeException()
+
+    def create_arrival_process(self, rng: np.random.Generator) -> ArrivalProcess:
+        """Return an arrival process of the distribution. 'lambda' is the mean inter-arrival time."""
+        if self.type == DistributionType.POISSON:
+            return PoissonArrival(rng, self.lambda_)
+        elif self.type == DistributionType.MMPP:
+            return MMPPArrival(rng, list(self.lambdas), list(self.dwells), self.transition)
+        elif self.type == DistributionType.ON_OFF:
+            return OnOffArrival(rng, self.lambda_, self.on, self.off)
+        elif self.type == DistributionType.DIURNAL:
+            return DiurnalArrival(rng, self.lambda_, self.period, self.amplitude, self.phase)
         else:
             raise DistributionTypeException()
 
 
 class TaskGenerator:
     def __init__(self, env: simpy.Environment, name: str, config: Optional[TaskGeneratorConfigType],
-                 task_logger: Union[TaskLogger, None] = None) -> None:
+                 task_logger: Union[TaskLogger, None] = None,
+                 seed: Optional[Union[int, np.random.SeedSequence]] = None) -> None:
         self.env = env
         self.name = name
+        # Independent random stream of the generator. It is drawn from the global numpy random state if seed is None.
+        if seed is None:
+            seed = int(np.random.randint(2**31))
+        self.rng = np.random.default_rng(seed)
         self.dist = TaskGeneratorDistribution()
         self.kernels: Dict[str, KernelConfigType] = {}
+        self.template = TaskTemplate()
+        # Tasks of higher priority are scheduled first and interrupt a scheduling pass of lower priority tasks
+        self.priority = 0
+        # Latency target of tasks in cycles from their generation, or None if they have no deadline
+        self.deadline: Optional[int] = None
         if config is not None:
             self.set_task_generator(config)
         self.task_logger = task_logger
@@ -82,27 +151,21 @@ class TaskGenerator:
         """Set task generator properties with input configuration file."""
         self.dist.set_distribution(config['dist'])
         self.kernels = config["kernels"]
+        self.priority = config.get('priority', 0)
+        self.deadline = config.get('deadline')
         for kernel in self.kernels.values():
             # If dependencies field is empty, make empty list
             if 'dependencies' not in kernel:
                 kernel['dependencies'] = []
+        self.template = self.compile_template(self.kernels)
 
     def set_scheduler(self, scheduler: Scheduler) -> None:
         """Set a scheduler for each task generator."""
         self.scheduler = scheduler
 
     def _create_task(self, id: int) -> Task:
-        # Create task
-        task = Task(self.env, self.name, id)
-        # Create kernels
-        kernels = []
-        for kernel_name, kernel_v in self.kernels.items():
-            kernel_app = kernel_v['app']
-            kernel_deps = [dep for dep in kernel_v['dependencies']]
-            kernel = Kernel(task, kernel_name, kernel_app, kernel_deps)
-            kernels.append(kernel)
-        kernels = self.kernel_topological_sort(kernels)
-        task.kernels = kernels
+        # Create task and its kernels from the compiled template
+        task = Task(self.env, self.name, id, self.template, self.priority, self.deadline)
         if self.task_logger is not None:
             self.task_logger.add_task(task)
 
@@ -112,8 +175,9 @@ class TaskGenerator:
         """Generate tasks and put it in a task queue."""
         if self.dist.type == DistributionType.STREAM:
             self.env.process(self._generate_stream())
-        elif self.dist.type == DistributionType.POISSON:
-            self.env.process(self._generate_poisson())
+        elif self.dist.type in [DistributionType.POISSON, DistributionType.MMPP, DistributionType.ON_OFF,
+                                DistributionType.DIURNAL]:
+            self.env.process(self._generate_arrivals(self.dist.create_arrival_process(self.rng)))
         elif self.dist.type == DistributionType.FIXED:
             self.env.process(self._generate_fixed())
         else:
@@ -133,19 +197,15 @@ class TaskGenerator:
                 break
             id += 1
 
-    def _generate_poisson(self) -> Generator[simpy.events.Event, None, None]:
-        # Generate temporary 1000 intervals for poisson distribution and loop this interval if size is larger than 1000
-        NUM_INTERVALS = 1000
-        intervals = list(np.random.poisson(self.dist.lambda_, NUM_INTERVALS))
-        wait_time = 0
-        id = 1
+    def _generate_arrivals(self, arrival_process: ArrivalProcess) -> Generator[simpy.events.Event, None, None]:
+        """Generate tasks at the arrival times of an arrival process. The first task arrives at start."""
+        arrival_times = iter(arrival_process)
+        arrival_time = 0.0
         for id in range(1, self.dist.size + 1):
-            if id == 1:
-                yield self.env.timeout(self.dist.start)
-            else:
-                # TODO: Check if this logic is correct or not
-                interval = max(intervals[(id - 1) % NUM_INTERVALS] - wait_time, 0)
-                yield self.env.timeout(interval)
+            if id > 1:
+                arrival_time = next(arrival_times)
+            # Arrival times are absolute, so blocking on a full queue does not shift later arrivals.
+            yield self.env.timeout(max(self.dist.start + int(round(arrival_time)) - int(self.env.now), 0))
             task = self._create_task(id)
             logger.debug(f"[@ {self.env.now}] {task.tag} is generated.")
 
@@ -157,10 +217,6 @@ class TaskGenerator:
             if wait_time > 0:
                 logger.warning(f"[@ {self.env.now}] {task.tag} has been blocked for {wait_time}.")
 
-            if id == self.dist.size:
-                break
-            id += 1
-
     def _generate_fixed(self) -> Generator[simpy.events.Event, None, None]:
         """Generate tasks and put it in a task queue."""
         wait_time = 0
@@ -187,34 +243,60 @@ class TaskGenerator:
                 break
             id += 1
 
-    def kernel_topological_sort(self, kernels: List[Kernel]) -> List[Kernel]:
-        index_dict = {}
-        for i, task in enumerate(kernels):
-            index_dict[task.name] = i
-
-        adj_list = defaultdict(list)
-        for i, task in enumerate(kernels):
-            for adj in task.deps:
-                adj_list[i].append(index_dict[adj])
-
-        num_v = len(kernels)
-        visited = [False for _ in range(num_v)]
-        stack: List[int] = []
-
-        def _topological_sort(v, visited, stack):
-            visited[v] = True
-            for i in adj_list[v]:
-                if visited[i] is False:
-                    _topological_sort(i, visited, stack)
-
-            stack.append(v)
-
-        for i in range(num_v):
-            if visited[i] is False:
-                _topological_sort(i, visited, stack)
-
-        result: List[Kernel] = []
-        for i in stack:
-            result.append(kernels[i])
+    def compile_template(self, kernels: Dict[str, KernelConfigType]) -> TaskTemplate:
+        """Compile kernel configurations into a task template indexed in topological order."""
+        names = list(kernels.keys())
+        index_dict = {name: i for i, name in enumerate(names)}
+        deps_list: List[List[int]] = []
+        for name in names:
+            deps = []
+            for dep in kernels[name]['dependencies']:
+                if dep not in index_dict:
+                    raise Exception(f"{self.name}: {name} depends on unknown kernel {dep}.")
+                deps.append(index_dict[dep])
+            deps_list.append(deps)
+
+        order = self.kernel_topological_sort(deps_list)
+        new_index = {v: i for i, v in enumerate(order)}
+        successors: List[List[int]] = [[] for _ in order]
+        for v in order:
+            for u in deps_list[v]:
+                successors[new_index[u]].append(new_index[v])
+
+        return TaskTemplate(names=tuple(names[v] for v in order),
+                            apps=tuple(kernels[names[v]]['app'] for v in order),
+                            deps=tuple(tuple(kernels[names[v]]['dependencies']) for v in order),
+                            successors=tuple(tuple(succ) for succ in successors),
+                            in_degree=tuple(len(deps_list[v]) for v in order))
+
+    def kernel_topological_sort(self, deps_list: List[List[int]]) -> List[int]:
+        """Return kernel indices sorted so that every kernel comes after its dependencies.
+
+            deps_list[i] is the list of kernel indices that kernel i depends on.
+        """
+        UNVISITED, VISITING, VISITED = 0, 1, 2
+        num_v = len(deps_list)
+        state = [UNVISITED for _ in range(num_v)]
+        result: List[int] = []
+
+        # Iterative depth-first search to avoid hitting the recursion limit on large graphs
+        for root in range(num_v):
+            if state[root] != UNVISITED:
+                continue
+            state[root] = VISITING
+            stack = [(root, iter(deps_list[root]))]
+            while stack:
+                v, adj = stack[-1]
+                for u in adj:
+                    if state[u] == VISITING:
+                        raise CyclicDependencyException(f"{self.name}: Kernel dependencies have a cycle.")
+                    if state[u] == UNVISITED:
+                        state[u] = VISITING
+                        stack.append((u, iter(deps_list[u])))
+                        break
+                else:
+                    stack.pop()
+                    state[v] = VISITED
+                    result.append(v)
 
         return result
@@ -1,8 +1,9 @@
 import simpy
+import bisect
 from lapidary.kernel import KernelStatus
 from lapidary.task import Task
 from lapidary.kernel import Kernel
-from typing import Union, List, Optional, Generator
+from typing import Callable, Union, List, Optional, Generator, Dict, Tuple
 import logging
 logger = logging.getLogger(__name__)
 
@@ -15,6 +16,16 @@ class TaskQueue:
         self._q = simpy.Container(self.env, init=0, capacity=self.maxsize)  # simpy container
         self.evt_task_arrive = self.env.event()
 
+        # Ready kernels sorted by (-task priority, urgency, task arrival order, kernel order in task). It is updated
+        # incrementally when tasks arrive and kernels are scheduled or done, so that schedulers do not rescan every
+        # queued task.
+        self._ready_kernels: List[Tuple[int, float, int, int, Kernel]] = []
+        self._kernel_keys: Dict[Kernel, Tuple[int, float, int, int]] = {}
+        self._num_arrived = 0
+        # Urgency of a kernel among kernels of the same priority, lower first. It is evaluated once when its task
+        # arrives. Kernels are in arrival order if it is None.
+        self.urgency: Optional[Callable[[Kernel], float]] = None
+
         self._controller = simpy.Resource(self.env, capacity=1)
 
     def __getitem__(self, key: int) -> Task:
@@ -30,40 +41,93 @@ class TaskQueue:
 
     def put(self, task: Task) -> Generator[simpy.events.Event, None, None]:
         yield self._q.put(amount=1)
+        self.enqueue(task)
+
+        self.evt_task_arrive.succeed(value=task)
+        self.evt_task_arrive = self.env.event()
+
+    def enqueue(self, task: Task) -> None:
+        """Add a task to the queue once there is room for it."""
         self.q.append(task)
         task.timestamp.queue = int(self.env.now)
+        for i, kernel in enumerate(task.kernels):
+            urgency = self.urgency(kernel) if self.urgency is not None else 0.0
+            self._kernel_keys[kernel] = (-task.priority, urgency, self._num_arrived, i)
+        self._num_arrived += 1
+        for kernel in task.ready_kernels:
+            self._push_ready_kernel(kernel)
         logger.debug(f"[@ {self.env.now}] {task.tag} is added to a task queue.")
 
-        self.evt_task_arrive.succeed(value=task)
-        self.evt_task_arrive = self.env.event()
+    @property
+    def num_arrived(self) -> int:
+        """Number of tasks that have arrived in the queue so far."""
+        return self._num_arrived
+
+    @property
+    def num_ready_kernels(self) -> int:
+        return len(self._ready_kernels)
+
+    @property
+    def top_priority(self) -> Optional[int]:
+        """Highest task priority among ready kernels, or None if there is no ready kernel."""
+        if len(self._ready_kernels) == 0:
+            return None
+        return -self._ready_kernels[0][0]
 
     def get_ready_kernels(self) -> List[Kernel]:
-        ready_kernels = []
-        for task in self.q:
-            ready_kernels += task.ready_kernels
-        return ready_kernels
+        return [kernel for *_, kernel in self._ready_kernels]
+
+    def _push_ready_kernel(self, kernel: Kernel) -> None:
+        bisect.insort(self._ready_kernels, (*self._kernel_keys[kernel], kernel))
+
+    def _pop_ready_kernel(self, kernel: Kernel) -> None:
+        key = self._kernel_keys[kernel]
+        i = bisect.bisect_left(self._ready_kernels, key)
+        if i == len(self._ready_kernels) or self._ready_kernels[i][4] is not kernel:
+            raise Exception(f"{kernel.tag} is not ready.")
+        del self._ready_kernels[i]
 
     def remove(self, task: Task) -> Generator[simpy.events.Event, None, None]:
+        self.dequeue(task)
+        yield self._q.get(amount=1)
+
+    def dequeue(self, task: Task) -> None:
+        """Remove a task from the queue."""
         logger.debug(f"[@ {self.env.now}] {task.tag} is removed from a queue.")
         self.q.remove(task)
-        yield self._q.get(amount=1)
+        for kernel in task.kernels:
+            del self._kernel_keys[kernel]
 
     def update_kernel_done(self, kernel: Kernel) -> Generator[simpy.events.Event, None, None]:
-        # kernel status update
-        kernel.status = KernelStatus.DONE
-        # dependency update
         task = kernel.task
-        task.update_dependency(kernel)
-        if len(task.pending_kernels) == 0:
-            yield self.env.process(self.remove(task))
+        if self.set_kernel_done(kernel):
+            yield from self.remove(task)
             task.timestamp.done = int(self.env.now)
             task.evt_task_done.succeed()
 
+    def set_kernel_done(self, kernel: Kernel) -> bool:
+        """Update kernel status and dependencies, and return True if its task is done."""
+        # kernel status update
+        kernel.status = KernelStatus.DONE
+        task = kernel.task
+        task.num_done_kernels += 1
+        # dependency update
+        for ready_kernel in task.update_dependency(kernel):
+            self._push_ready_kernel(ready_kernel)
+        return task.done
+
+    def update_kernel_preempted(self, kernel: Kernel) -> None:
+        """Return a preempted kernel to the ready kernels."""
+        kernel.status = KernelStatus.PENDING
+        self._push_ready_kernel(kernel)
+
     def update_kernel_scheduled(self, kernel: Kernel) -> None:
         # timestamp update
-        kernel.timestamp.schedule = int(self.env.now)
+        # A preempted kernel keeps the time it was first scheduled
+        if kernel.num_preemptions == 0:
+            kernel.timestamp.schedule = int(self.env.now)
+        kernel.segment_start = int(self.env.now)
         kernel.task.timestamp.schedule = min(int(self.env.now), kernel.task.timestamp.schedule)
         # kernel status update
         kernel.status = KernelStatus.RUNNING
-        # task next kernel_idx update
-        kernel.task.next_kernel_idx += 1
+        self._pop_ready_kernel(kernel)
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class DecisionCache:
+    """LRU-bounded memo of scheduling decisions.
+
+        Entries are only valid for the signature they were recorded with, e.g. the app pool version and the partition
+        mode. validate() clears the cache when the signature changes. A maxsize of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._signature: Optional[Hashable] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def validate(self, signature: Hashable) -> bool:
+        """Clear the cache and return True if signature differs from the one the entries were recorded with."""
+        if signature == self._signature:
+            return False
+        if self._signature is not None:
+            self.invalidations += 1
+        self._entries.clear()
+        self._signature = signature
+        return True
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the value of key and mark it as recently used, or None on a miss."""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize == 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
@@ -1,7 +1,13 @@
 class DistributionTypeException(Exception):
-    def __init__(self, msg="This distribution is not supported. ['stream', 'poission', 'fixed']", *args, **kwargs):
+    def __init__(self,
+                 msg="This distribution is not supported. ['stream', 'poisson', 'fixed', 'mmpp', 'onoff', 'diurnal']",
+                 *args, **kwargs):
         super().__init__(msg, *args, **kwargs)
 
 
 class NoAppConfigException(Exception):
     pass
+
+
+class CyclicDependencyException(Exception):
+    pass
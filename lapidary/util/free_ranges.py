@@ -0,0 +1,99 @@
+import bisect
+from typing import Dict, List, Optional, Tuple
+
+
+class FreeRangeIndex:
+    """Sorted index of runs of consecutive free resource ids, e.g. glb banks.
+
+        Runs are kept merged, so the largest free run and contiguous allocations are found without scanning every
+        resource.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._starts: List[int] = [0] if size > 0 else []
+        self._lengths: Dict[int, int] = {0: size} if size > 0 else {}
+        self.num_free = size
+
+    @property
+    def runs(self) -> List[Tuple[int, int]]:
+        """Return (start, length) of every free run in order."""
+        return [(start, self._lengths[start]) for start in self._starts]
+
+    @property
+    def largest(self) -> int:
+        """Return the length of the largest free run."""
+        return max(self._lengths.values(), default=0)
+
+    @property
+    def external_fragmentation(self) -> float:
+        """Return 1 - largest free run / free resources, or 0 if nothing is free."""
+        if self.num_free == 0:
+            return 0.0
+        return 1 - self.largest / self.num_free
+
+    def allocate(self, i: int) -> None:
+        """Mark resource i as used."""
+        k = bisect.bisect_right(self._starts, i) - 1
+        start = self._starts[k] if k >= 0 else -1
+        if start < 0 or i >= start + self._lengths[start]:
+            raise Exception(f"Resource {i} is not free.")
+        end = start + self._lengths[start]
+        if i == start:
+            del self._starts[k]
+            del self._lengths[start]
+        else:
+            self._lengths[start] = i - start
+        if i + 1 < end:
+            bisect.insort(self._starts, i + 1)
+            self._lengths[i + 1] = end - i - 1
+        self.num_free -= 1
+
+    def free(self, i: int) -> None:
+        """Mark resource i as free, merging it with adjacent free runs."""
+        k = bisect.bisect_right(self._starts, i)
+        prev_start = self._starts[k - 1] if k > 0 else None
+        if prev_start is not None and i < prev_start + self._lengths[prev_start]:
+            raise Exception(f"Resource {i} is already free.")
+        start, length = i, 1
+        if prev_start is not None and prev_start + self._lengths[prev_start] == i:
+            start, length = prev_start, self._lengths[prev_start] + 1
+        else:
+            self._starts.insert(k, i)
+            k += 1
+        if k < len(self._starts) and self._starts[k] == i + 1:
+            length += self._lengths.pop(i + 1)
+            del self._starts[k]
+        self._lengths[start] = length
+        self.num_free += 1
+
+    def first_fit(self, num: int) -> Optional[int]:
+        """Return the start of the first free run that has num resources."""
+        for start in self._starts:
+            if self._lengths[start] >= num:
+                return start
+        return None
+
+    def best_fit(self, num: int) -> Optional[int]:
+        """Return the start of the smallest free run that has num resources. Ties go to the first run."""
+        best: Optional[int] = None
+        for start in self._starts:
+            length = self._lengths[start]
+            if length >= num and (best is None or length < self._lengths[best]):
+                best = start
+        return best
+
+    def nearest_fit(self, num: int, center: float) -> Optional[int]:
+        """Return the start of num free resources in a run whose middle is closest to center."""
+        best: Optional[int] = None
+        best_distance = 0.0
+        for start in self._starts:
+            length = self._lengths[start]
+            if length < num:
+                continue
+            # Slide the window within the run towards center
+            position = min(max(int(round(center - num / 2)), start), start + length - num)
+            distance = abs(position + num / 2 - center)
+            if best is None or distance < best_distance:
+                best, best_distance = position, distance
+        return best
@@ -0,0 +1,58 @@
+import math
+from typing import Dict, Tuple
+
+
+class LatencyHistogram:
+    """Log-linear histogram of non-negative integer values in the style of an HDR histogram.
+
+        Values below 2**(sub_bucket_bits + 1) are recorded exactly. Larger values are bucketed with a relative error
+        of at most 2**-(sub_bucket_bits + 1), so memory is bounded by the dynamic range, not by the number of values.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 10) -> None:
+        self.sub_bucket_bits = sub_bucket_bits
+        self.buckets: Dict[Tuple[int, int], int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def _bucket(self, value: int) -> Tuple[int, int]:
+        magnitude = max(value.bit_length() - self.sub_bucket_bits - 1, 0)
+        return magnitude, value >> magnitude
+
+    def record(self, value: int) -> None:
+        value = int(value)
+        if value < 0:
+            raise Exception(f"Cannot record negative value {value} in a latency histogram.")
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        if self.count == 0:
+            self.min = value
+            self.max = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+        self.count += 1
+        self.total += value
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return float('nan')
+        return self.total / self.count
+
+    def quantile(self, q: float) -> float:
+        """Return the smallest recorded value (up to bucket precision) such that a fraction q of values are <= it."""
+        if self.count == 0:
+            return float('nan')
+        # Round before ceil so that float error in q * count does not skip a rank
+        rank = max(math.ceil(round(q * self.count, 6)), 1)
+        seen = 0
+        for magnitude, sub in sorted(self.buckets):
+            seen += self.buckets[(magnitude, sub)]
+            if seen >= rank:
+                low = sub << magnitude
+                high = ((sub + 1) << magnitude) - 1
+                return float(min(max((low + high) / 2, self.min), self.max))
+        return float(self.max)
@@ -0,0 +1,135 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# Rectangle of prrs: (x, y, width, height)
+RectType = Tuple[int, int, int, int]
+
+
+@lru_cache(maxsize=4096)
+def _build(occupancy: int, width: int, height: int) -> Tuple[RectType, ...]:
+    """Return every maximal empty rectangle of a grid where bit (y * width + x) of occupancy is set if used."""
+    full_row = (1 << width) - 1
+    free_rows = [~(occupancy >> (y * width)) & full_row for y in range(height)]
+    rects: List[RectType] = []
+    for y0 in range(height):
+        free = full_row
+        for y1 in range(y0, height):
+            free &= free_rows[y1]
+            if free == 0:
+                break
+            x = 0
+            while x < width:
+                if not (free >> x) & 1:
+                    x += 1
+                    continue
+                x0 = x
+                while x < width and (free >> x) & 1:
+                    x += 1
+                run = ((1 << (x - x0)) - 1) << x0
+                # Runs are maximal horizontally. Keep the ones that cannot grow up or down.
+                if (y0 > 0 and free_rows[y0 - 1] & run == run) or (y1 < height - 1 and free_rows[y1 + 1] & run == run):
+                    continue
+                rects.append((x0, y0, x - x0, y1 - y0 + 1))
+    return tuple(rects)
+
+
+class MaximalRectangles:
+    def __init__(self, width: int, height: int) -> None:
+        """Set of maximal empty rectangles of a 2-D grid of prrs.
+
+            Placing a rectangle splits the free rectangles it overlaps. Releasing one rebuilds the set from the
+            occupancy, which is memoized since the same occupancies recur.
+        """
+        self.width = width
+        self.height = height
+        self.rects: List[RectType] = [(0, 0, width, height)] if width > 0 and height > 0 else []
+
+    def rebuild(self, occupancy: int) -> None:
+        self.rects = list(_build(occupancy, self.width, self.height))
+
+    def place(self, rect: RectType) -> None:
+        """Mark a rectangle as used."""
+        x, y, w, h = rect
+        rects: List[RectType] = []
+        for free in self.rects:
+            fx, fy, fw, fh = free
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                rects.append(free)
+                continue
+            # Free parts left, right, above and below the placed rectangle
+            if x > fx:
+                rects.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                rects.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                rects.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                rects.append((fx, y + h, fw, fy + fh - y - h))
+        # Drop rectangles contained in others
+        self.rects = [r for i, r in enumerate(rects)
+                      if not any(_contains(other, r) and (other != r or j < i) for j, other in enumerate(rects)
+                                 if j != i)]
+
+    def find(self, shape: Tuple[int, int], policy: str, occupancy: int = 0) -> Optional[Tuple[int, int]]:
+        """Return the (x, y) where a (height, width) shape is placed by a policy, or None if it does not fit.
+
+            The shape is placed at the top-left corner of a free rectangle. 'best_short_side_fit' minimizes the
+            shorter leftover side of the rectangle, 'bottom_left' the topmost then leftmost position, and
+            'contact_perimeter' maximizes the edges shared with used prrs and the grid border.
+        """
+        height, width = shape
+        best: Optional[Tuple[int, int]] = None
+        best_score: Tuple[int, ...] = ()
+        for fx, fy, fw, fh in self.rects:
+            if fw < width or fh < height:
+                continue
+            score: Tuple[int, ...]
+            if policy == 'best_short_side_fit':
+                leftover = (fw - width, fh - height)
+                score = (min(leftover), max(leftover), fy, fx)
+            elif policy == 'bottom_left':
+                score = (fy + height, fx)
+            elif policy == 'contact_perimeter':
+                score = (-self._contact(fx, fy, width, height, occupancy), fy, fx)
+            else:
+                raise Exception(f"Unknown prr placement policy: {policy}")
+            if best is None or score < best_score:
+                best, best_score = (fx, fy), score
+        return best
+
+    def score(self, position: Tuple[int, int], shape: Tuple[int, int], policy: str,
+              occupancy: int = 0) -> Tuple[int, ...]:
+        """Return the score of a free (height, width) window at (x, y) under a policy. Lower is better.
+
+            Scores agree with find, so that windows other than the corners of free rectangles can be ranked. For
+            'best_short_side_fit', the window is scored in the free rectangle that contains it most tightly.
+        """
+        x, y = position
+        height, width = shape
+        if policy == 'best_short_side_fit':
+            leftovers = [(min(fw - width, fh - height), max(fw - width, fh - height)) for fx, fy, fw, fh in self.rects
+                         if _contains((fx, fy, fw, fh), (x, y, width, height))]
+            return (*min(leftovers, default=(self.width, self.height)), y, x)
+        elif policy == 'bottom_left':
+            return y + height, x
+        elif policy == 'contact_perimeter':
+            return -self._contact(x, y, width, height, occupancy), y, x
+        raise Exception(f"Unknown prr placement policy: {policy}")
+
+    def _contact(self, x: int, y: int, width: int, height: int, occupancy: int) -> int:
+        def used(cx: int, cy: int) -> bool:
+            if cx < 0 or cy < 0 or cx >= self.width or cy >= self.height:
+                return True
+            return bool((occupancy >> (cy * self.width + cx)) & 1)
+
+        contact = 0
+        for dx in range(width):
+            contact += used(x + dx, y - 1) + used(x + dx, y + height)
+        for dy in range(height):
+            contact += used(x - 1, y + dy) + used(x + width, y + dy)
+        return contact
+
+
+def _contains(outer: RectType, inner: RectType) -> bool:
+    return (outer[0] <= inner[0] and outer[1] <= inner[1] and inner[0] + inner[2] <= outer[0] + outer[2]
+            and inner[1] + inner[3] <= outer[1] + outer[3])
@@ -0,0 +1,65 @@
+import bisect
+from typing import List
+
+
+class ResourceTimeline:
+    """Projected usage of a pool of identical resources over time, as a step function.
+
+        Segment i covers [times[i], times[i + 1]) and the last one extends forever. Reservations split segments, and
+        segments before the current time are dropped, so queries only scan the projected horizon.
+    """
+
+    def __init__(self, capacity: int, start: int = 0) -> None:
+        self.capacity = capacity
+        self.times: List[int] = [start]
+        self.usage: List[int] = [0]
+
+    def _split(self, time: int) -> int:
+        """Return the index of the segment that starts at time, splitting a segment if needed."""
+        i = bisect.bisect_right(self.times, time) - 1
+        if i < 0:
+            # Times before the timeline are merged into its first segment
+            return 0
+        if self.times[i] == time:
+            return i
+        self.times.insert(i + 1, time)
+        self.usage.insert(i + 1, self.usage[i])
+        return i + 1
+
+    def advance(self, now: int) -> None:
+        """Drop segments that end by now."""
+        i = bisect.bisect_right(self.times, now) - 1
+        if i > 0:
+            del self.times[:i]
+            del self.usage[:i]
+        self.times[0] = max(self.times[0], now)
+
+    def reserve(self, start: int, end: int, amount: int) -> None:
+        """Add amount to the usage in [start, end). A negative amount releases a reservation."""
+        start = max(start, self.times[0])
+        if end <= start:
+            return
+        i = self._split(start)
+        j = self._split(end)
+        for k in range(i, j):
+            self.usage[k] += amount
+
+    def earliest(self, time: int, duration: int, amount: int) -> int:
+        """Return the earliest start at or after time of an interval of duration where amount is free."""
+        limit = self.capacity - amount
+        if self.usage[-1] > limit:
+            raise Exception(f"{amount} resources are never free.")
+        start = max(time, self.times[0])
+        i = bisect.bisect_right(self.times, start) - 1
+        while True:
+            if self.usage[i] > limit:
+                i += 1
+                start = self.times[i]
+                continue
+            # Check that the interval stays free until it ends
+            j = i + 1
+            while j < len(self.times) and self.times[j] < start + duration and self.usage[j] <= limit:
+                j += 1
+            if j == len(self.times) or self.times[j] >= start + duration:
+                return start
+            i = j
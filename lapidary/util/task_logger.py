@@ -1,35 +1,202 @@
+import numpy as np
 import pandas as pd
 import pathlib
-from typing import Union, List, Dict, Tuple
+import os
+from dataclasses import dataclass, field
+from typing import Union, List, Dict, Tuple, Optional, Any
 from lapidary.task import Task
+from lapidary.kernel import Kernel
 from lapidary.instruction import Instruction
+from lapidary.util.latency_histogram import LatencyHistogram
 import logging
 import yaml
 logger = logging.getLogger(__name__)
 
+TAIL_QUANTILES = [0.95, 0.99, 0.999]
+INTERVAL_COLUMNS = ['resource_id', 'start', 'end', 'kernel_idx']
+FRAGMENTATION_COLUMNS = ['time', 'largest_free_run', 'external_fragmentation']
+
+
+@dataclass
+class TaskStats:
+    """Online accumulators of finished tasks of one task type."""
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    ntt_sum: float = 0.0
+    # Number of tasks in ntt_sum. A task with no latency and no service time has no ntt, like NaN in pandas.
+    num_ntt: int = 0
+    max_id: int = 0
+    max_ts_done: int = 0
+    # Number of tasks with a deadline and how many of them met it
+    num_deadlines: int = 0
+    num_met: int = 0
+    num_preemptions: int = 0
+
 
 class TaskLogger:
-    def __init__(self, num_prr: int = 8, num_banks: int = 16) -> None:
+    def __init__(self, num_prr: int = 8, num_banks: int = 16, stream_dir: Optional[str] = None,
+                 batch_size: int = 1000) -> None:
+        """Log tasks and calculate performance metrics.
+
+            If stream_dir is given, finished tasks are appended to task.csv and kernel.csv in stream_dir every
+            batch_size tasks and dropped from memory. Metrics are then calculated with online accumulators
+            and only finished tasks are reported. Bank fragmentation samples are likewise appended to
+            bank_fragmentation.csv every batch_size samples.
+        """
         self.task_list: List[Task] = []
         self.instruction_list: List[Instruction] = []
 
         self.num_prr = num_prr
         self.num_banks = num_banks
 
+        self.stream_dir = stream_dir
+        self.batch_size = batch_size
+        self._task_batch: List[Task] = []
+        self._num_flushed_tasks = 0
+        self.task_stats: Dict[str, TaskStats] = {}
+        self._prr_busy_time = [0 for _ in range(self.num_prr)]
+        self._bank_busy_time = [0 for _ in range(self.num_banks)]
+        self._ts_queue_min: Optional[int] = None
+        self._ts_schedule_min: Optional[int] = None
+        self._ts_done_max: Optional[int] = None
+        # (time, largest free run, external fragmentation) of glb banks, with the last state of each time. In
+        # streaming mode, only samples that are not flushed yet.
+        self.bank_fragmentation_trace: List[Tuple[int, int, float]] = []
+        self._num_flushed_samples = 0
+        if self.stream_dir is not None:
+            self.stream_dir = os.path.realpath(self.stream_dir)
+            if not os.path.exists(self.stream_dir):
+                os.makedirs(self.stream_dir)
+            for filename in [self.stream_task_csv, self.stream_kernel_csv, self.stream_fragmentation_csv]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+
         self.task_df = pd.DataFrame(columns=['tag', 'task', 'id', 'ts_generate',
                                     'ts_queue', 'ts_schedule', 'ts_done', 'antt', 'latency'])
 
         self.kernel_df = pd.DataFrame(columns=['tag', 'kernel', 'task', 'task_id',
-                                               'ts_generate', 'ts_queue', 'ts_schedule', 'ts_done', 'prr'])
+                                               'ts_generate', 'ts_queue', 'ts_schedule', 'ts_done', 'prr', 'bank'])
+
+        # Resource allocations as (resource_id, start, end, kernel_idx) intervals where kernel_idx is a row of kernel_df
+        self.prr_interval_df = pd.DataFrame(columns=INTERVAL_COLUMNS)
+        self.bank_interval_df = pd.DataFrame(columns=INTERVAL_COLUMNS)
 
         self.latency: Dict[str, float] = {}
         self.tail_latency: Dict[str, Dict[float, float]] = {}
         self.stp: Dict[str, float] = {}
         self.antt: Dict[str, float] = {}
+        # SLA attainment and deadline-miss rate of each task type with a deadline
+        self.sla: Dict[str, Dict[str, float]] = {}
+        # Number of kernel preemptions of each task type that was preempted
+        self.preemptions: Dict[str, int] = {}
         self.utilization: Tuple[float, float]
+        # Time averages of glb bank fragmentation, set by the accelerator
+        self.bank_fragmentation: Dict[str, float] = {}
+        # Number of kernels that were not mapped, set by the scheduler
+        self.rejections: Dict[str, int] = {}
+        # Prr configuration hit rate and cycles spent on reconfiguration, set by the accelerator
+        self.reconfiguration: Dict[str, float] = {}
+        # Number of batched executions and the kernels in them, set by the scheduler
+        self.batching: Dict[str, int] = {}
+        # Number of running kernels grown into idle prrs, set by the accelerator
+        self.resizing: Dict[str, int] = {}
+
+    @property
+    def streaming(self) -> bool:
+        return self.stream_dir is not None
+
+    @property
+    def stream_task_csv(self) -> str:
+        return os.path.join(str(self.stream_dir), "task.csv")
+
+    @property
+    def stream_kernel_csv(self) -> str:
+        return os.path.join(str(self.stream_dir), "kernel.csv")
+
+    @property
+    def stream_fragmentation_csv(self) -> str:
+        return os.path.join(str(self.stream_dir), "bank_fragmentation.csv")
 
     def add_task(self, task: Task) -> None:
-        self.task_list.append(task)
+        if self.streaming:
+            task.evt_task_done.callbacks.append(lambda _: self._stream_task(task))
+        else:
+            self.task_list.append(task)
+
+    def _stream_task(self, task: Task) -> None:
+        """Update online accumulators with a finished task and flush it to disk in batches."""
+        latency = task.timestamp.done - task.timestamp.queue
+        service_time = task.timestamp.done - task.timestamp.schedule
+        if task.name not in self.task_stats:
+            self.task_stats[task.name] = TaskStats()
+        stats = self.task_stats[task.name]
+        stats.latency.record(latency)
+        if service_time > 0 or latency > 0:
+            # A task with latency but no service time has an infinite ntt, as in the in-memory task_df
+            stats.ntt_sum += latency / service_time if service_time > 0 else float('inf')
+            stats.num_ntt += 1
+        stats.max_id = max(stats.max_id, task.id)
+        stats.max_ts_done = max(stats.max_ts_done, task.timestamp.done)
+        if task.deadline is not None:
+            stats.num_deadlines += 1
+            stats.num_met += int(task.timestamp.done <= task.deadline)
+
+        for kernel in task.kernels:
+            stats.num_preemptions += kernel.num_preemptions
+            runtime = kernel.timestamp.done - kernel.segment_start
+            for prr in kernel.prrs:
+                self._prr_busy_time[prr.id] += runtime
+            for bank in kernel.banks:
+                self._bank_busy_time[bank.id] += runtime
+            for start, end, prr_ids, bank_ids in kernel.segments:
+                for prr_id in prr_ids:
+                    self._prr_busy_time[prr_id] += end - start
+                for bank_id in bank_ids:
+                    self._bank_busy_time[bank_id] += end - start
+            self._ts_queue_min = self._min(self._ts_queue_min, task.timestamp.queue)
+            self._ts_schedule_min = self._min(self._ts_schedule_min, kernel.timestamp.schedule)
+            self._ts_done_max = max(self._ts_done_max or 0, kernel.timestamp.done)
+
+        self._task_batch.append(task)
+        if len(self._task_batch) >= self.batch_size:
+            self.flush()
+
+    @staticmethod
+    def _min(a: Optional[int], b: int) -> int:
+        return b if a is None else min(a, b)
+
+    def flush(self) -> None:
+        """Append finished tasks in the current batch to the stream files and drop them."""
+        if len(self._task_batch) == 0:
+            return
+        header = self._num_flushed_tasks == 0
+        pd.DataFrame(data=self._task_dict(self._task_batch)).to_csv(
+            self.stream_task_csv, mode='a', header=header, index=False)
+        pd.DataFrame(data=self._kernel_dict(self._task_batch)).to_csv(
+            self.stream_kernel_csv, mode='a', header=header, index=False)
+        self._num_flushed_tasks += len(self._task_batch)
+        self._task_batch = []
+
+    def record_bank_fragmentation(self, time: int, largest_free_run: int, external_fragmentation: float) -> None:
+        """Record the fragmentation of glb banks after they are allocated or released."""
+        sample = (time, largest_free_run, external_fragmentation)
+        trace = self.bank_fragmentation_trace
+        # Keep the last state of each time
+        if len(trace) > 0 and trace[-1][0] == time:
+            trace[-1] = sample
+        else:
+            trace.append(sample)
+        # The last sample may still be replaced, so it is flushed with the next batch
+        if self.streaming and len(trace) > self.batch_size:
+            self._flush_fragmentation(len(trace) - 1)
+
+    def _flush_fragmentation(self, num_samples: int) -> None:
+        """Append the first num_samples bank fragmentation samples to the stream file and drop them."""
+        if num_samples == 0:
+            return
+        pd.DataFrame(self.bank_fragmentation_trace[:num_samples], columns=FRAGMENTATION_COLUMNS).to_csv(
+            self.stream_fragmentation_csv, mode='a', header=self._num_flushed_samples == 0, index=False)
+        self._num_flushed_samples += num_samples
+        del self.bank_fragmentation_trace[:num_samples]
 
     def remove_task(self, task: Task) -> None:
         self.task_list.remove(task)
@@ -42,6 +209,11 @@ class TaskLogger:
         self.kernel_df.set_index('tag', inplace=True)
 
     def post_process(self) -> None:
+        if self.streaming:
+            self.flush()
+            self._flush_fragmentation(len(self.bank_fragmentation_trace))
+            self._update_stream_metrics()
+            return
         # TODO: Need to change kernel dict and task dict. Need to decide what to store
         # TODO: For now, we just flatten all kernels
         self._generate_task_df()
@@ -51,67 +223,113 @@ class TaskLogger:
         self.update_tail_latency()
         self.update_antt()
         self.update_stp()
+        self.update_sla()
+        self.update_preemptions()
         self.update_utilization()
 
+    def _task_dict(self, task_list: List[Task]) -> Dict[str, List[Any]]:
+        task_dict: Dict[str, List[Any]] = {'tag': [task.tag for task in task_list],
+                                           'task': [task.name for task in task_list],
+                                           'id': [task.id for task in task_list],
+                                           'ts_generate': [task.timestamp.generate for task in task_list],
+                                           'ts_queue': [task.timestamp.queue for task in task_list],
+                                           'ts_schedule': [task.timestamp.schedule for task in task_list],
+                                           'ts_done': [task.timestamp.done for task in task_list]}
+        task_dict['latency'] = [done - queue for done, queue in zip(task_dict['ts_done'], task_dict['ts_queue'])]
+        # Deadlines are only logged if a task type has one
+        if any(task.deadline is not None for task in task_list):
+            task_dict['deadline'] = [task.deadline for task in task_list]
+        return task_dict
+
+    @staticmethod
+    def _kernel_list(task_list: List[Task]) -> List[Kernel]:
+        kernel_list = []
+        for task in task_list:
+            kernel_list += task.kernels
+        return kernel_list
+
+    def _kernel_dict(self, task_list: List[Task]) -> Dict[str, List[Any]]:
+        kernel_list = self._kernel_list(task_list)
+        kernel_dict: Dict[str, List[Any]] = {'tag': [kernel.tag for kernel in kernel_list],
+                                             'kernel': [kernel.name for kernel in kernel_list],
+                                             'task': [kernel.task.name for kernel in kernel_list],
+                                             'task_id': [kernel.task.id for kernel in kernel_list],
+                                             'ts_queue': [kernel.task.timestamp.queue for kernel in kernel_list],
+                                             'ts_schedule': [kernel.timestamp.schedule for kernel in kernel_list],
+                                             'ts_done': [kernel.timestamp.done for kernel in kernel_list]}
+
+        kernel_dict['prr'] = [[prr.id for prr in kernel.prrs] for kernel in kernel_list]
+        kernel_dict['bank'] = [[bank.id for bank in kernel.banks] for kernel in kernel_list]
+        return kernel_dict
+
+    def _interval_df(self, kernel_list: List[Kernel], kernel_dict: Dict[str, List[Any]],
+                     resource: str) -> pd.DataFrame:
+        """Return one (resource_id, start, end, kernel_idx) row per resource allocated to a kernel.
+
+            A kernel that was migrated, preempted or resized has rows for each of its allocations, in time order.
+        """
+        resource_ids = kernel_dict[resource]
+        counts = np.array([len(ids) for ids in resource_ids], dtype=np.int64)
+        kernel_idx = np.repeat(np.arange(len(resource_ids), dtype=np.int64), counts)
+        starts = np.fromiter((kernel.segment_start for kernel in kernel_list), dtype=np.int64, count=len(kernel_list))
+        interval_df = pd.DataFrame({'resource_id': np.fromiter((i for ids in resource_ids for i in ids),
+                                                               dtype=np.int64, count=int(counts.sum())),
+                                    'start': starts[kernel_idx],
+                                    'end': np.asarray(kernel_dict['ts_done'], dtype=np.int64)[kernel_idx],
+                                    'kernel_idx': kernel_idx})
+
+        segment_rows = [(resource_id, start, end, idx) for idx, kernel in enumerate(kernel_list)
+                        for start, end, prr_ids, bank_ids in kernel.segments
+                        for resource_id in (prr_ids if resource == 'prr' else bank_ids)]
+        if len(segment_rows) == 0:
+            return interval_df
+        segment_df = pd.DataFrame(segment_rows, columns=INTERVAL_COLUMNS, dtype=np.int64)
+        return pd.concat([segment_df, interval_df]).sort_values('kernel_idx', kind='stable').reset_index(drop=True)
+
     def _generate_task_df(self) -> None:
-        task_dict = {'tag': [task.tag for task in self.task_list],
-                     'task': [task.name for task in self.task_list],
-                     'id': [task.id for task in self.task_list],
-                     'ts_generate': [task.timestamp.generate for task in self.task_list],
-                     'ts_queue': [task.timestamp.queue for task in self.task_list],
-                     'ts_schedule': [task.timestamp.schedule for task in self.task_list],
-                     'ts_done': [task.timestamp.done for task in self.task_list]}
-
-        self.task_df = pd.DataFrame(data=task_dict)
+        self.task_df = pd.DataFrame(data=self._task_dict(self.task_list))
         self.task_df.set_index('tag', inplace=True)
-        self.task_df['latency'] = self.task_df['ts_done'] - self.task_df['ts_queue']
 
     def _generate_kernel_df(self) -> None:
-        kernel_list = []
-        for task in self.task_list:
-            kernel_list += task.kernels
-        kernel_dict = {'tag': [kernel.tag for kernel in kernel_list],
-                       'kernel': [kernel.name for kernel in kernel_list],
-                       'task': [kernel.task.name for kernel in kernel_list],
-                       'task_id': [kernel.task.id for kernel in kernel_list],
-                       'ts_queue': [kernel.task.timestamp.queue for kernel in kernel_list],
-                       'ts_schedule': [kernel.timestamp.schedule for kernel in kernel_list],
-                       'ts_done': [kernel.timestamp.done for kernel in kernel_list]}
-
-        kernel_prr_dict: Dict[str, List[int]] = {}
-        kernel_bank_dict: Dict[str, List[int]] = {}
-        for i in range(self.num_prr):
-            kernel_prr_dict[f"prr{i}"] = []
-        for i in range(self.num_banks):
-            kernel_bank_dict[f"bank{i}"] = []
-        for task in self.task_list:
-            for kernel in task.kernels:
-                kernel_prr_id = list(map(lambda x: x.id, kernel.prrs))
-                kernel_bank_id = list(map(lambda x: x.id, kernel.banks))
-                for i in range(self.num_prr):
-                    if i in kernel_prr_id:
-                        kernel_prr_dict[f"prr{i}"].append(1)
-                    else:
-                        kernel_prr_dict[f"prr{i}"].append(0)
-                for i in range(self.num_banks):
-                    if i in kernel_bank_id:
-                        kernel_bank_dict[f"bank{i}"].append(1)
-                    else:
-                        kernel_bank_dict[f"bank{i}"].append(0)
-
-        kernel_dict = {**kernel_dict, **kernel_prr_dict}
-        kernel_dict = {**kernel_dict, **kernel_bank_dict}
-
+        kernel_list = self._kernel_list(self.task_list)
+        kernel_dict = self._kernel_dict(self.task_list)
         self.kernel_df = pd.DataFrame(data=kernel_dict)
         self.kernel_df.set_index('tag', inplace=True)
+        self.prr_interval_df = self._interval_df(kernel_list, kernel_dict, 'prr')
+        self.bank_interval_df = self._interval_df(kernel_list, kernel_dict, 'bank')
+
+    def wide_kernel_df(self) -> pd.DataFrame:
+        """Return kernel_df with one 0/1 column per prr and per bank (legacy format)."""
+        num_kernels = len(self.kernel_df)
+        df = self.kernel_df.drop(columns=['prr', 'bank'])
+        for resource, num_resources, interval_df in [('prr', self.num_prr, self.prr_interval_df),
+                                                     ('bank', self.num_banks, self.bank_interval_df)]:
+            one_hot = np.zeros((num_kernels, num_resources), dtype=np.int64)
+            one_hot[interval_df['kernel_idx'].to_numpy(), interval_df['resource_id'].to_numpy()] = 1
+            df = pd.concat([df, pd.DataFrame(one_hot, index=df.index,
+                                             columns=[f"{resource}{i}" for i in range(num_resources)])], axis=1)
+        return df
 
     def dump_task_df(self, filename: str) -> None:
         logger.info(f"A task log file was generated: {filename}")
         self.task_df.to_csv(filename)
 
-    def dump_kernel_df(self, filename: str) -> None:
+    def dump_kernel_df(self, filename: str, wide: bool = False) -> None:
         logger.info(f"A kernel log file was generated: {filename}")
-        self.kernel_df.to_csv(filename)
+        if wide:
+            self.wide_kernel_df().to_csv(filename)
+        else:
+            self.kernel_df.to_csv(filename)
+
+    def dump_interval_df(self, prr_filename: str, bank_filename: str) -> None:
+        logger.info(f"Resource interval log files were generated: {prr_filename}, {bank_filename}")
+        self.prr_interval_df.to_csv(prr_filename, index=False)
+        self.bank_interval_df.to_csv(bank_filename, index=False)
+
+    def dump_fragmentation_df(self, filename: str) -> None:
+        """Dump (time, largest free run, external fragmentation) of glb banks."""
+        logger.info(f"A fragmentation file was generated: {filename}")
+        pd.DataFrame(self.bank_fragmentation_trace, columns=FRAGMENTATION_COLUMNS).to_csv(filename, index=False)
 
     def update_latency(self) -> None:
         for task in self.task_df['task'].unique():
@@ -121,7 +339,7 @@ class TaskLogger:
     def update_tail_latency(self) -> None:
         for task in self.task_df['task'].unique():
             self.tail_latency[task] = self.task_df.loc[self.task_df['task']
-                                                       == task]['latency'].quantile([0.95, 0.99]).to_dict()
+                                                       == task]['latency'].quantile(TAIL_QUANTILES).to_dict()
 
     def update_antt(self) -> None:
         # Turnaround Time (TT) = Waiting Time + Service Time
@@ -138,7 +356,26 @@ class TaskLogger:
         stp_dict = df['stp'].to_dict()
         self.stp = stp_dict
 
-    def update_utilization(self) -> float:
+    def update_sla(self) -> None:
+        if 'deadline' not in self.task_df:
+            return
+        df = self.task_df.loc[self.task_df['deadline'].notna()]
+        met = (df['ts_done'] <= df['deadline']).groupby(df['task']).mean()
+        self.sla = {task: self._sla(float(attainment)) for task, attainment in met.to_dict().items()}
+
+    def update_preemptions(self) -> None:
+        preemptions: Dict[str, int] = {}
+        for task in self.task_list:
+            num_preemptions = sum(kernel.num_preemptions for kernel in task.kernels)
+            if num_preemptions > 0:
+                preemptions[task.name] = preemptions.get(task.name, 0) + num_preemptions
+        self.preemptions = preemptions
+
+    @staticmethod
+    def _sla(attainment: float) -> Dict[str, float]:
+        return {'attainment': attainment, 'miss rate': 1 - attainment}
+
+    def update_utilization(self) -> None:
         prr_utilization = self.calculate_prr_utilization()
         total_prr_utilization = float(sum(prr_utilization.values()) / len(prr_utilization.values()))
 
@@ -146,41 +383,88 @@ class TaskLogger:
         total_glb_utilization = float(sum(glb_utilization.values()) / len(glb_utilization.values()))
         self.utilization = (total_prr_utilization, total_glb_utilization)
 
+    def _busy_time(self, interval_df: pd.DataFrame, num_resources: int) -> np.ndarray:
+        """Return total allocated time of each resource."""
+        return np.bincount(interval_df['resource_id'].to_numpy(dtype=np.int64),
+                           weights=(interval_df['end'] - interval_df['start']).to_numpy(dtype=np.float64),
+                           minlength=num_resources)
+
     def calculate_prr_utilization(self) -> Dict[str, float]:
-        result = {}
         start = self.kernel_df['ts_schedule'].min()
         end = self.kernel_df['ts_done'].max()
-        total_runtime = end - start
-
-
-        for i in range(self.num_prr):
-            df = self.kernel_df[self.kernel_df[f"prr{i}"] == 1]
-            runtime_col = df['ts_done'] - df['ts_schedule']
-            total_prr_runtime = runtime_col.sum()
-            utilization = float(total_prr_runtime / total_runtime)
-            result[f"prr{i}"] = utilization
-
-        return result
+        busy_time = self._busy_time(self.prr_interval_df, self.num_prr)
+        return {f"prr{i}": float(busy_time[i] / (end - start)) for i in range(self.num_prr)}
 
     def calculate_bank_utilization(self) -> Dict[str, float]:
-        result = {}
         start = self.kernel_df['ts_queue'].min()
         end = self.kernel_df['ts_done'].max()
-        for i in range(self.num_banks):
-            df = self.kernel_df[self.kernel_df[f"bank{i}"] == 1]
-            runtime_col = df['ts_done'] - df['ts_schedule']
-            total_runtime = runtime_col.sum()
-            utilization = float(total_runtime / (end - start))
-            result[f"bank{i}"] = utilization
-
-        return result
-
+        busy_time = self._busy_time(self.bank_interval_df, self.num_banks)
+        return {f"bank{i}": float(busy_time[i] / (end - start)) for i in range(self.num_banks)}
+
+    def calculate_occupancy(self, resource: str = 'prr') -> pd.DataFrame:
+        """Return the number of allocated prrs or banks from each event time until the next one.
+
+            Allocations are swept once in time order. Releases at a timestamp are applied before allocations.
+        """
+        interval_df = self.prr_interval_df if resource == 'prr' else self.bank_interval_df
+        start = interval_df['start'].to_numpy(dtype=np.int64)
+        end = interval_df['end'].to_numpy(dtype=np.int64)
+        times = np.concatenate([start, end])
+        deltas = np.concatenate([np.ones_like(start), -np.ones_like(end)])
+        order = np.lexsort((deltas, times))
+        times = times[order]
+        occupancy = np.cumsum(deltas[order])
+        # Keep the occupancy after the last event at each timestamp
+        last = np.append(times[1:] != times[:-1], True)
+        return pd.DataFrame({'time': times[last], 'occupancy': occupancy[last]})
+
+    def calculate_busy_time_histogram(self, resource: str = 'prr') -> Dict[int, float]:
+        """Return total time during which exactly n prrs or banks are allocated, for each n."""
+        occupancy_df = self.calculate_occupancy(resource)
+        if len(occupancy_df) == 0:
+            return {}
+        durations = np.diff(occupancy_df['time'].to_numpy())
+        histogram = np.bincount(occupancy_df['occupancy'].to_numpy()[:-1], weights=durations)
+        return {n: float(t) for n, t in enumerate(histogram)}
+
+    def _update_stream_metrics(self) -> None:
+        for task, stats in self.task_stats.items():
+            self.latency[task] = stats.latency.mean
+            self.tail_latency[task] = {q: stats.latency.quantile(q) for q in TAIL_QUANTILES}
+            self.antt[task] = stats.ntt_sum / stats.num_ntt if stats.num_ntt > 0 else float('nan')
+            self.stp[task] = stats.max_id / stats.max_ts_done * 1e6
+            if stats.num_deadlines > 0:
+                self.sla[task] = self._sla(stats.num_met / stats.num_deadlines)
+            if stats.num_preemptions > 0:
+                self.preemptions[task] = stats.num_preemptions
+
+        if self._ts_done_max is None or self._ts_schedule_min is None or self._ts_queue_min is None:
+            return
+        prr_runtime = self._ts_done_max - self._ts_schedule_min
+        bank_runtime = self._ts_done_max - self._ts_queue_min
+        total_prr_utilization = sum(busy / prr_runtime for busy in self._prr_busy_time) / self.num_prr
+        total_glb_utilization = sum(busy / bank_runtime for busy in self._bank_busy_time) / self.num_banks
+        self.utilization = (float(total_prr_utilization), float(total_glb_utilization))
 
     def dump_perf(self, filename: str) -> None:
         logger.info(f"A perf file was generated: {filename}")
-        log = {}
+        log: Dict[str, Any] = {}
         log['tail latency'] = self.tail_latency
         log['utilization'] = self.utilization
+        if len(self.sla) > 0:
+            log['sla'] = self.sla
+        if len(self.bank_fragmentation) > 0:
+            log['bank fragmentation'] = self.bank_fragmentation
+        if len(self.rejections) > 0:
+            log['rejections'] = self.rejections
+        if len(self.reconfiguration) > 0:
+            log['reconfiguration'] = self.reconfiguration
+        if len(self.batching) > 0:
+            log['batching'] = self.batching
+        if len(self.preemptions) > 0:
+            log['preemptions'] = self.preemptions
+        if len(self.resizing) > 0:
+            log['resizing'] = self.resizing
         # log = {**log, **self.calculate_prr_utilization()}
         with open(filename, 'w') as f:
             yaml.dump(log, f, default_flow_style=False)
@@ -1,6 +1,8 @@
 import simpy
 import os
 import yaml
+import zlib
+import numpy as np
 from typing import Dict, Optional, Union, List
 from lapidary.scheduler import Scheduler
 from lapidary.task_generator import TaskGenerator, TaskGeneratorConfigType
@@ -11,9 +13,13 @@ logger = logging.getLogger(__name__)
 
 class Workload:
     def __init__(self, env: simpy.Environment,  config: Optional[Union[str, Dict[str, TaskGeneratorConfigType]]] = None,
-                 task_logger: Union[TaskLogger, None] = None):
+                 task_logger: Union[TaskLogger, None] = None,
+                 seed: Optional[Union[int, np.random.SeedSequence]] = None):
         self.env = env
         self.task_logger = task_logger
+        self.seed_seq: Optional[np.random.SeedSequence] = None
+        if seed is not None:
+            self.seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
         self.task_generators: List[TaskGenerator] = []
         if config is not None:
             self.set_workload(config)
@@ -33,7 +39,18 @@ class Workload:
             config_dict = config
 
         for name, task_gen_config in config_dict.items():
-            self.task_generators.append(TaskGenerator(self.env, name, task_gen_config, self.task_logger))
+            self.task_generators.append(TaskGenerator(self.env, name, task_gen_config, self.task_logger,
+                                                      self._generator_seed(name)))
+
+    def _generator_seed(self, name: str) -> Optional[np.random.SeedSequence]:
+        """Return a seed of a task generator derived from its name.
+
+            Streams do not depend on the order or the number of task generators in the workload.
+        """
+        if self.seed_seq is None:
+            return None
+        return np.random.SeedSequence(self.seed_seq.entropy,
+                                      spawn_key=tuple(self.seed_seq.spawn_key) + (zlib.crc32(name.encode()),))
 
     def run_generate(self) -> None:
         """Run generate proccess of the task_generators."""
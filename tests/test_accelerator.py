@@ -3,6 +3,9 @@ import pytest
 from typing import Tuple
 from lapidary.accelerator import Accelerator
 from lapidary.app import AppConfig
+from lapidary.kernel import Kernel
+from lapidary.task import Task
+from lapidary.util.free_ranges import FreeRangeIndex
 from .test_configs import accelerator_config
 
 
@@ -24,12 +27,127 @@ def test_accelerator_map(shape: Tuple[int, int]):
 
 
 def test_accelerator_allocate():
-    pass
+    env = simpy.Environment()
+    accelerator = Accelerator(env, {**accelerator_config, 'partition': 'flexible'})
+    task = Task(env, 'task', 0)
+    kernel = Kernel(task, 'kernel_0', 'app', [])
+
+    prrs, banks = accelerator.map(AppConfig(prr_shape=(2, 2), glb=2))
+    accelerator.allocate(kernel, prrs, banks)
+    assert accelerator.prr_occupancy == 0b0011_0011
+    assert accelerator.bank_occupancy == 0b11
+    assert accelerator.prr_available_mask[1][1] is False
+    assert accelerator.prr_available_mask[1][2] is True
+
+    # Next 2x2 window is placed right next to the first one
+    prrs, banks = accelerator.map(AppConfig(prr_shape=(2, 2), glb=2))
+    assert [prr.id for prr in prrs] == [2, 3, 6, 7]
+    assert [bank.id for bank in banks] == [2, 3]
+
+    # 4x4 window does not fit anymore
+    prrs, banks = accelerator.map(AppConfig(prr_shape=(4, 4)))
+    assert prrs == [] and banks == []
 
 
 def test_accelerator_deallocate():
-    pass
+    env = simpy.Environment()
+    accelerator = Accelerator(env, {**accelerator_config, 'partition': 'flexible'})
+    task = Task(env, 'task', 0)
+    kernel = Kernel(task, 'kernel_0', 'app', [])
+
+    prrs, banks = accelerator.map(AppConfig(prr_shape=(4, 4), glb=4))
+    accelerator.allocate(kernel, prrs, banks)
+    assert accelerator.map(AppConfig(prr_shape=(1, 1))) == ([], [])
+
+    accelerator.deallocate(prrs, banks)
+    assert accelerator.prr_occupancy == 0
+    assert accelerator.bank_occupancy == 0
+    assert len(accelerator.map(AppConfig(prr_shape=(4, 4)))[0]) == 16
 
 
 def test_accelerator_execute():
     pass
+
+
+def test_accelerator_bandwidth():
+    env = simpy.Environment()
+    accelerator = Accelerator(env, {**accelerator_config, 'partition': 'flexible', 'offchip_bandwidth': 20,
+                                    'noc_bandwidth': 100})
+    task = Task(env, 'task', 0)
+    kernels = []
+    for i, (offchip_bw, runtime) in enumerate([(5, 1000), (20, 1000), (0, 500)]):
+        kernel = Kernel(task, f'kernel_{i}', 'app', [])
+        kernel.set_app_config(AppConfig(prr_shape=(1, 1), offchip_bw=offchip_bw, runtime=runtime))
+        accelerator.allocate(kernel, *accelerator.map(kernel.app_config))
+        accelerator.execute(kernel)
+        kernels.append(kernel)
+
+    # kernel_0 gets all of its demand and kernel_1 the remaining 15 until kernel_0 finishes
+    env.run(until=1)
+    assert accelerator.offchip_interface.bandwidth == 20
+    env.run()
+    assert [kernel.timestamp.done for kernel in kernels] == [1000, 1250, 500]
+    assert accelerator.offchip_interface.bandwidth == 0 and accelerator.prr_occupancy == 0
+
+
+def test_free_range_index():
+    index = FreeRangeIndex(8)
+    for i in [2, 3, 6]:
+        index.allocate(i)
+    assert index.runs == [(0, 2), (4, 2), (7, 1)]
+    assert (index.largest, index.num_free) == (2, 5) and index.external_fragmentation == 1 - 2 / 5
+    assert index.first_fit(1) == 0 and index.best_fit(1) == 7 and index.first_fit(3) is None
+    assert index.nearest_fit(2, 5.5) == 4 and index.nearest_fit(1, 5.5) == 5
+
+    index.free(3)
+    assert index.runs == [(0, 2), (3, 3), (7, 1)]
+    index.free(2)
+    index.free(6)
+    assert index.runs == [(0, 8)] and index.external_fragmentation == 0
+
+
+@pytest.mark.parametrize('bank_allocation, bank_ids', [('first_idle', [0, 1, 4, 5]), ('first_fit', [4, 5, 6, 7]),
+                                                       ('best_fit', [12, 13, 14, 15]),
+                                                       ('prr_adjacent', [22, 23, 24, 25])])
+def test_accelerator_bank_allocation(bank_allocation, bank_ids):
+    env = simpy.Environment()
+    accelerator = Accelerator(env, {**accelerator_config, 'partition': 'flexible', 'glb_bank_size': 1024,
+                                    'bank_allocation': bank_allocation})
+    samples = []
+    accelerator.trace_bank_fragmentation = lambda *sample: samples.append(sample)
+    task = Task(env, 'task', 0)
+    # Free runs of banks are [0, 2), [4, 11), [12, 16) and [17, 32)
+    kernel = Kernel(task, 'kernel_0', 'app', [])
+    accelerator.allocate(kernel, accelerator.get_prrs([0, 1]), accelerator.get_banks([2, 3, 11, 16]))
+    assert samples == [(0, 15, 1 - 15 / 28)]
+
+    # 4 banks for 3.5 KB. Prrs of columns 2 and 3 are over banks 16 to 31.
+    prrs, banks = accelerator.map(AppConfig(prr_shape=(1, 2), glb=1, glb_bytes=3584))
+    assert [prr.id for prr in prrs] == [2, 3]
+    assert [bank.id for bank in banks] == bank_ids
+
+
+@pytest.mark.parametrize('prr_placement, prr_id', [('first_fit', 0), ('best_short_side_fit', 3), ('bottom_left', 0),
+                                                   ('contact_perimeter', 3)])
+def test_accelerator_prr_placement(prr_placement, prr_id):
+    env = simpy.Environment()
+    accelerator = Accelerator(env, {**accelerator_config, 'partition': 'flexible', 'prr_placement': prr_placement})
+    task = Task(env, 'task', 0)
+    kernel = Kernel(task, 'kernel_0', 'app', [])
+    # Column 2 is used, which leaves a 4x2 and a 4x1 free rectangle
+    accelerator.allocate(kernel, accelerator.get_prrs([2, 6, 10, 14]), [])
+
+    app_config = AppConfig(prr_shape=(1, 1))
+    prrs, _ = accelerator.map(app_config)
+    assert [prr.id for prr in prrs] == [prr_id]
+    # With affinity, placements that need as many reconfigurations are chosen by the policy
+    prrs, _ = accelerator.map(app_config, app='app')
+    assert [prr.id for prr in prrs] == [prr_id]
+    accelerator.get_prrs([1])[0].bitstream = ('app', app_config, 0)
+    prrs, _ = accelerator.map(app_config, app='app')
+    assert [prr.id for prr in prrs] == [1]
+    accelerator.get_prrs([1])[0].bitstream = None
+    if accelerator.free_prrs is not None:
+        assert sorted(accelerator.free_prrs.rects) == [(0, 0, 2, 4), (3, 0, 1, 4)]
+        accelerator.deallocate(kernel.prrs, [])
+        assert accelerator.free_prrs.rects == [(0, 0, 4, 4)]
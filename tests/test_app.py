@@ -0,0 +1,122 @@
+import os
+import pickle
+from lapidary.app import AppConfig, AppPool
+from lapidary.app_loader import load_app_pool
+from lapidary.app_model import AppModel
+
+
+def test_app_pool_index():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), glb=2, runtime=900))
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=4, runtime=500))
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), glb=2, runtime=700))
+    app_pool.add("app", AppConfig(prr_shape=(1, 4), glb=4, runtime=500))
+
+    assert [app_config.runtime for app_config in app_pool.get("app")] == [900, 500, 700, 500]
+    assert [(app_config.prr_shape, app_config.runtime) for app_config in app_pool.get_sorted("app")] == \
+        [((1, 2), 500), ((1, 4), 500), ((1, 1), 700), ((1, 1), 900)]
+    footprints = app_pool.get_footprints("app")
+    assert list(footprints.keys()) == [((1, 2), 4, 0), ((1, 4), 4, 0), ((1, 1), 2, 0)]
+    assert [app_config.runtime for app_config in footprints[((1, 1), 2, 0)]] == [700, 900]
+
+    # Footprints are grouped again after an app config is added
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), glb=2, runtime=100))
+    assert list(app_pool.get_footprints("app").keys())[0] == ((1, 1), 2, 0)
+
+
+def test_frozen_app_pool():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), glb=2, runtime=900))
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=4, runtime=500))
+    frozen = app_pool.freeze()
+
+    assert frozen.get("app") == app_pool.get("app")
+    assert frozen.get_sorted("app") == app_pool.get_sorted("app")
+    assert frozen.get_footprints("app") == app_pool.get_footprints("app")
+    assert frozen.get("unknown") == [] and frozen.get_footprints("unknown") == {}
+    assert hash(frozen) == hash(app_pool.freeze()) and frozen == app_pool.freeze()
+    assert pickle.loads(pickle.dumps(frozen)).get_sorted("app") == frozen.get_sorted("app")
+
+    # The snapshot does not change with the pool
+    app_pool.add("app", AppConfig(prr_shape=(1, 4), glb=4, runtime=300))
+    assert len(frozen.get("app")) == 2 and frozen != app_pool.freeze()
+
+
+def test_load_app_pool(tmp_path):
+    yml = tmp_path / "pool.yml"
+    yml.write_text("name: pool\n"
+                   "apps:\n"
+                   "  app_0:\n"
+                   "    - {prr_shape: [1, 1], glb: 2, runtime: 900}\n"
+                   "    - {prr_shape: [1, 2], glb: 4, runtime: 500}\n"
+                   "  app_1:\n"
+                   "    - {prr_shape: [1, 4], pe: 150, mem: 15, input: 7, runtime: 205}\n")
+    csv = tmp_path / "pool.csv"
+    csv.write_text("app,prr_height,prr_width,glb,runtime\n"
+                   "app_0,1,1,2,900\n"
+                   "app_1,1,4,0,205\n"
+                   "app_0,1,2,4,500\n")
+
+    app_pool = load_app_pool(str(yml))
+    assert app_pool.name == "pool" and app_pool.app_names == ["app_0", "app_1"]
+    # App configs are created when the app is used
+    assert len(app_pool.app_pool) == 0
+    assert app_pool.get("app_0") == [AppConfig(prr_shape=(1, 1), glb=2, runtime=900),
+                                     AppConfig(prr_shape=(1, 2), glb=4, runtime=500)]
+    assert list(app_pool.app_pool.keys()) == ["app_0"]
+    assert app_pool.get_sorted("app_1") == [AppConfig(prr_shape=(1, 4), pe=150, mem=15, input=7, runtime=205)]
+
+    # A snapshot of some apps only loads those apps
+    frozen = load_app_pool(str(yml)).freeze(["app_1", "unknown"])
+    assert [app for app, _ in frozen.apps] == ["app_1"] and frozen.get("app_1") == app_pool.get("app_1")
+    partial_pool = load_app_pool(str(yml))
+    partial_pool.freeze(["app_1"])
+    assert list(partial_pool.app_pool.keys()) == ["app_1"]
+
+    csv_pool = load_app_pool(str(csv))
+    assert csv_pool.name == "pool"
+    assert csv_pool.get("app_0") == app_pool.get("app_0")
+    assert csv_pool.get("app_1") == [AppConfig(prr_shape=(1, 4), runtime=205)]
+
+
+def test_load_app_pool_cache(tmp_path):
+    yml = tmp_path / "pool.yml"
+    yml.write_text("apps:\n  app: [{prr_shape: [1, 1], glb: 2, runtime: 900}]\n")
+    cache_dir = tmp_path / ".lapidary_cache"
+
+    frozen = load_app_pool(str(yml)).freeze()
+    assert len(os.listdir(cache_dir)) == 2
+    # A warm load reads the compiled table
+    assert load_app_pool(str(yml)).freeze() == frozen
+    assert len(os.listdir(cache_dir)) == 2
+
+    # A changed file is compiled again
+    yml.write_text("apps:\n  app: [{prr_shape: [1, 2], glb: 4, runtime: 500}]\n")
+    assert load_app_pool(str(yml)).get("app") == [AppConfig(prr_shape=(1, 2), glb=4, runtime=500)]
+    assert len(os.listdir(cache_dir)) == 4
+    assert load_app_pool(str(yml), use_cache=False).freeze() == load_app_pool(str(yml)).freeze()
+
+
+def test_app_pool_file():
+    app_pool = load_app_pool("./cfg/app/app_pool_0.yml", use_cache=False)
+    assert app_pool.get("rn_conv2") == [AppConfig(prr_shape=(1, 1), glb=2, runtime=9508),
+                                        AppConfig(prr_shape=(1, 2), glb=3, runtime=2127),
+                                        AppConfig(prr_shape=(1, 6), glb=8, runtime=532)]
+    assert app_pool.get("harris")[2] == AppConfig(prr_shape=(1, 7), pe=150, mem=15, input=14, runtime=102)
+
+
+def test_app_model():
+    app_configs = [AppConfig(prr_shape=(1, 1), glb=2, runtime=8000),
+                   AppConfig(prr_shape=(1, 2), glb=3, runtime=4000),
+                   AppConfig(prr_shape=(1, 8), glb=9, runtime=1000)]
+    model = AppModel(app_configs)
+
+    assert model.predict((1, 2)) == app_configs[1]
+    # Runtime is interpolated in log-log space and glb banks linearly, rounded up
+    assert model.predict((1, 4)) == AppConfig(prr_shape=(1, 4), glb=5, runtime=2000)
+    assert model.predict((2, 2)) == AppConfig(prr_shape=(2, 2), glb=5, runtime=2000)
+    assert model.predict((2, 8)) is None
+    assert model.predict((1, 4)) is model.predict((1, 4))
+
+    assert [(app_config.prr_shape, app_config.runtime) for app_config in model.get_sorted((1, 4))] == \
+        [((1, 8), 1000), ((1, 4), 2000), ((1, 3), 2667), ((1, 2), 4000), ((1, 1), 8000)]
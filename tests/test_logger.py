@@ -1,6 +1,12 @@
 from lapidary.util.task_logger import TaskLogger
+from lapidary.util.latency_histogram import LatencyHistogram
+from lapidary.lapidary import Lapidary
+from lapidary.app import AppConfig, AppPool
+import os
 import tempfile
-from .test_configs import task_log
+import pandas as pd
+import pytest
+from .test_configs import task_log, query_config, accelerator_config
 
 
 def test_parse_csv():
@@ -16,3 +22,111 @@ def test_parse_csv():
         assert task_logger.kernel_df.loc['query_3_#0_task_0']['query'] == 'query_3'
         assert task_logger.kernel_df.loc['query_3_#0_task_0']['prr2'] == 0
         assert task_logger.kernel_df.loc['query_3_#0_task_0']['prr3'] == 1
+
+
+def test_stream_log():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=100))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lapidary = Lapidary(accelerator_config, {'query': query_config}, app_pool, stream_log_dir=tmp_dir)
+        lapidary.task_logger.batch_size = 3
+        lapidary.run()
+        lapidary.task_logger.post_process()
+
+        assert len(lapidary.task_logger.task_list) == 0
+        task_df = pd.read_csv(os.path.join(tmp_dir, "task.csv"))
+        kernel_df = pd.read_csv(os.path.join(tmp_dir, "kernel.csv"))
+        assert len(task_df) == query_config['dist']['size']
+        assert len(kernel_df) == 2 * query_config['dist']['size']
+        assert lapidary.task_logger.latency['query'] == task_df['latency'].mean()
+        assert lapidary.task_logger.tail_latency['query'][0.99] == task_df['latency'].max()
+
+
+def test_stream_fragmentation():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=100))
+    lapidary = Lapidary(accelerator_config, {'query': query_config}, app_pool)
+    lapidary.run()
+    trace = lapidary.task_logger.bank_fragmentation_trace
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lapidary = Lapidary(accelerator_config, {'query': query_config}, app_pool, stream_log_dir=tmp_dir)
+        lapidary.task_logger.batch_size = 3
+        lapidary.run()
+        assert len(lapidary.task_logger.bank_fragmentation_trace) <= 4
+        lapidary.task_logger.post_process()
+
+        # Streamed samples are the same as the trace kept in memory, and none are left in memory
+        fragmentation_df = pd.read_csv(os.path.join(tmp_dir, "bank_fragmentation.csv"))
+        assert len(trace) > 4 and list(fragmentation_df.itertuples(index=False, name=None)) == trace
+        assert lapidary.task_logger.bank_fragmentation_trace == []
+
+
+def test_stream_sla():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=100))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lapidary = Lapidary(accelerator_config, {'query': {**query_config, 'deadline': 400}}, app_pool,
+                            stream_log_dir=tmp_dir)
+        lapidary.run()
+        lapidary.task_logger.post_process()
+
+        # Streamed accumulators agree with the logged deadlines
+        task_df = pd.read_csv(os.path.join(tmp_dir, "task.csv"))
+        attainment = (task_df['ts_done'] <= task_df['deadline']).mean()
+        assert (task_df['deadline'] == task_df['ts_generate'] + 400).all()
+        assert lapidary.task_logger.sla['query'] == {'attainment': attainment, 'miss rate': 1 - attainment}
+
+
+def test_stream_zero_service_time():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=0))
+    workload = {'query': {**query_config, 'kernels': {'kernel_0': {'app': 'app', 'dependencies': []}}}}
+    antt = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for stream_log_dir in [None, tmp_dir]:
+            lapidary = Lapidary(accelerator_config, workload, app_pool, stream_log_dir=stream_log_dir)
+            lapidary.scheduler.delay = 0
+            lapidary.run()
+            lapidary.task_logger.post_process()
+            antt.append(lapidary.task_logger.antt['query'])
+
+    # The first task finishes at 0 with no service time. Both modes leave it out of the average.
+    assert antt[1] == pytest.approx(antt[0])
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(sub_bucket_bits=4)
+    for value in range(1, 101):
+        histogram.record(value)
+    assert histogram.count == 100
+    assert histogram.mean == 50.5
+    # Small values are exact
+    assert histogram.quantile(0.2) == 20
+    # Large values are within the relative error of the bucket
+    assert abs(histogram.quantile(0.95) - 95) <= 95 * 2 ** -5
+    assert histogram.quantile(1.0) == 100
+
+
+def test_resource_intervals():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=100))
+    lapidary = Lapidary(accelerator_config, {'query': query_config}, app_pool)
+    lapidary.run()
+    task_logger = lapidary.task_logger
+    task_logger.post_process()
+
+    kernel_df = task_logger.kernel_df
+    assert len(task_logger.prr_interval_df) == 2 * len(kernel_df)
+
+    wide_df = task_logger.wide_kernel_df()
+    runtime = wide_df['ts_done'] - wide_df['ts_schedule']
+    total_runtime = kernel_df['ts_done'].max() - kernel_df['ts_schedule'].min()
+    prr_utilization = task_logger.calculate_prr_utilization()
+    for i in range(task_logger.num_prr):
+        assert prr_utilization[f"prr{i}"] == runtime[wide_df[f"prr{i}"] == 1].sum() / total_runtime
+
+    histogram = task_logger.calculate_busy_time_histogram('prr')
+    assert sum(histogram.values()) == total_runtime
+    assert sum(n * t for n, t in histogram.items()) == runtime.sum() * 2
+    occupancy_df = task_logger.calculate_occupancy('prr')
+    assert occupancy_df['occupancy'].iloc[-1] == 0
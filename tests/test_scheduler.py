@@ -0,0 +1,354 @@
+import pytest
+import simpy
+from lapidary.accelerator import Accelerator, PartitionType
+from lapidary.app import AppConfig, AppPool
+from lapidary.lapidary import Lapidary
+from lapidary.scheduler import FCFSScheduler
+from lapidary.task_generator import TaskGenerator
+from lapidary.util.resource_timeline import ResourceTimeline
+from .test_configs import accelerator_config, query_config
+
+
+def _workload(priority: int):
+    kernels = {'kernel_0': {'app': 'app', 'dependencies': []}}
+    return {'low': {'dist': {'type': 'fixed', 'start': 0, 'interval': 100, 'size': 1}, 'kernels': kernels},
+            'high': {'dist': {'type': 'fixed', 'start': 50, 'interval': 100, 'size': 1}, 'kernels': kernels,
+                     'priority': priority}}
+
+
+@pytest.mark.parametrize('priority, schedule', [(0, {'low': 100, 'high': 200}), (1, {'low': 150, 'high': 150})])
+def test_scheduler_interrupt(priority, schedule):
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=1000))
+    lapidary = Lapidary(accelerator_config, _workload(priority), app_pool)
+    lapidary.run()
+
+    # A task of higher priority arriving during the schedule delay reruns the pass with it. Otherwise it waits for
+    # the next pass.
+    tasks = {task.name: task for task in lapidary.task_logger.task_list}
+    assert {name: task.kernels[0].timestamp.schedule for name, task in tasks.items()} == schedule
+
+
+def test_scheduler_decision_cache():
+    env = simpy.Environment()
+    accelerator = Accelerator(env, accelerator_config)
+    scheduler = FCFSScheduler(env)
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=1000))
+    scheduler.set_app_pool(app_pool)
+    scheduler.set_accelerator(accelerator)
+    kernel = TaskGenerator(env, 'query', query_config)._create_task(0).kernels[0]
+
+    decisions = [scheduler.select_app_config(kernel) for _ in range(2)]
+    assert (scheduler.decision_cache.hits, scheduler.decision_cache.misses) == (1, 1)
+    assert decisions[0] == decisions[1]
+
+    # A new app config invalidates cached decisions
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), glb=2, runtime=500))
+    app_config, prrs, _ = scheduler.select_app_config(kernel)
+    assert app_config is not None and app_config.runtime == 500 and len(prrs) == 1
+    assert scheduler.decision_cache.misses == 2
+
+    # So does a new partition mode
+    accelerator.config.partition = PartitionType.FLEXIBLE
+    scheduler.select_app_config(kernel)
+    assert scheduler.decision_cache.misses == 3 and scheduler.decision_cache.invalidations == 2
+
+    # Cached decisions are keyed on occupancy
+    accelerator.allocate(kernel, prrs, [])
+    scheduler.select_app_config(kernel)
+    assert scheduler.decision_cache.misses == 4
+
+
+def test_scheduler_app_model():
+    env = simpy.Environment()
+    accelerator = Accelerator(env, accelerator_config)
+    scheduler = FCFSScheduler(env)
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), glb=2, runtime=4000))
+    app_pool.add("app", AppConfig(prr_shape=(1, 4), glb=8, runtime=1000))
+    scheduler.set_app_pool(app_pool)
+    scheduler.set_accelerator(accelerator)
+    kernel = TaskGenerator(env, 'query', query_config)._create_task(0).kernels[0]
+
+    # Only 3 prrs of a row are free, so the profiled 1x4 config does not fit
+    accelerator.allocate(kernel, accelerator.get_prrs(range(3, 16)), [])
+    app_config, prrs, _ = scheduler.select_app_config(kernel)
+    assert app_config is not None and app_config.prr_shape == (1, 1)
+
+    # The modeled 1x3 config does
+    scheduler.use_app_model = True
+    app_config, prrs, _ = scheduler.select_app_config(kernel)
+    assert app_config is not None and app_config.prr_shape == (1, 3) and app_config.runtime == 1333
+    assert [prr.id for prr in prrs] == [0, 1, 2]
+
+
+def test_scheduler_rejections():
+    env = simpy.Environment()
+    accelerator = Accelerator(env, {**accelerator_config, 'partition': 'flexible'})
+    scheduler = FCFSScheduler(env)
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), runtime=1000))
+    scheduler.set_app_pool(app_pool)
+    scheduler.set_accelerator(accelerator)
+    kernel = TaskGenerator(env, 'query', query_config)._create_task(0).kernels[0]
+
+    # Half of the prrs are idle in a checkerboard, so no 1x2 window is
+    blocker = TaskGenerator(env, 'query', query_config)._create_task(1).kernels[0]
+    accelerator.allocate(blocker, accelerator.get_prrs([i for i in range(16) if (i % 4 + i // 4) % 2 == 0]), [])
+    assert scheduler.select_kernels([kernel]) == []
+    assert (scheduler.num_rejected, scheduler.num_rejected_fragmented) == (1, 1)
+
+    # A kernel that waits is counted once however many passes reject it, until it is mapped
+    assert scheduler.select_kernels([kernel]) == []
+    assert (scheduler.num_rejected, scheduler.num_rejected_fragmented) == (1, 1)
+    accelerator.deallocate(blocker.prrs, [])
+    assert scheduler.select_kernels([kernel]) == [kernel]
+    accelerator.deallocate(kernel.prrs, kernel.banks)
+    accelerator.allocate(blocker, accelerator.get_prrs([i for i in range(16) if (i % 4 + i // 4) % 2 == 0]), [])
+    assert scheduler.select_kernels([kernel]) == []
+    assert (scheduler.num_rejected, scheduler.num_rejected_fragmented) == (2, 2)
+
+
+@pytest.mark.parametrize('defragmentation, done', [(False, {'short': 200, 'long': 1100, 'big': 1700}),
+                                                   (True, {'short': 200, 'long': 1150, 'big': 850})])
+def test_scheduler_defragmentation(defragmentation, done):
+    app_pool = AppPool("app_pool")
+    app_pool.add("short", AppConfig(prr_shape=(1, 1), runtime=100))
+    app_pool.add("long", AppConfig(prr_shape=(1, 1), runtime=1000))
+    app_pool.add("big", AppConfig(prr_shape=(1, 3), runtime=500))
+    workload = {name: {'dist': {'type': 'fixed', 'start': start, 'interval': 100, 'size': 1},
+                       'kernels': {'kernel_0': {'app': name, 'dependencies': []}}}
+                for name, start in [('short', 0), ('long', 0), ('big', 200)]}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 4, 'partition': 'flexible',
+              'defragmentation': defragmentation, 'migration_delay': 50}
+    lapidary = Lapidary(config, workload, app_pool)
+    lapidary.run()
+
+    # The long kernel in prr 1 blocks the big kernel until it moves to prr 3. Both wait for the migration.
+    kernels = {task.name: task.kernels[0] for task in lapidary.task_logger.task_list}
+    assert {name: kernel.timestamp.done for name, kernel in kernels.items()} == done
+    assert lapidary.accelerator.num_migrations == int(defragmentation)
+
+    # The migrated kernel is logged in prr 1 until it moves and in prr 3 after
+    lapidary.task_logger.post_process()
+    intervals = lapidary.task_logger.prr_interval_df
+    long_intervals = intervals.loc[intervals['kernel_idx'] == 1, ['resource_id', 'start', 'end']]
+    expected = [(1, 100, 300), (3, 300, 1150)] if defragmentation else [(1, 100, 1100)]
+    assert list(long_intervals.itertuples(index=False, name=None)) == expected
+
+
+@pytest.mark.parametrize('scheduler, done, hit_rate', [('fcfs', {'a': 210, 'b': 410, 'c': 610}, 0.0),
+                                                       ('affinity', {'a': 210, 'b': 410, 'c': 600}, 1 / 3)])
+def test_scheduler_affinity(scheduler, done, hit_rate):
+    app_pool = AppPool("app_pool")
+    app_pool.add("app_a", AppConfig(prr_shape=(1, 1), runtime=100))
+    app_pool.add("app_b", AppConfig(prr_shape=(1, 1), runtime=100))
+    workload = {name: {'dist': {'type': 'fixed', 'start': start, 'interval': 1000, 'size': 1},
+                       'kernels': {'kernel_0': {'app': app, 'dependencies': []}}}
+                for name, app, start in [('a', 'app_a', 0), ('b', 'app_b', 200), ('c', 'app_a', 400)]}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 2, 'partition': 'flexible',
+              'reconfiguration_latency': 10}
+    lapidary = Lapidary(config, workload, app_pool, scheduler=scheduler)
+    lapidary.run()
+
+    # Every start reconfigures except the affinity scheduler placing task c back on the prr that ran task a
+    kernels = {task.name: task.kernels[0] for task in lapidary.task_logger.task_list}
+    assert {name: kernel.timestamp.done for name, kernel in kernels.items()} == done
+    assert lapidary.accelerator.configuration_hit_rate == pytest.approx(hit_rate)
+
+
+def test_scheduler_unknown():
+    with pytest.raises(Exception):
+        Lapidary(accelerator_config, query_config, AppPool("app_pool"), scheduler='unknown')
+
+
+def _deadline_task(start, deadline=None, num_kernels=1):
+    kernels = {f'kernel_{i}': {'app': 'app', 'dependencies': [f'kernel_{i - 1}'] if i > 0 else []}
+               for i in range(num_kernels)}
+    config = {'dist': {'type': 'fixed', 'start': start, 'interval': 100, 'size': 1}, 'kernels': kernels}
+    if deadline is not None:
+        config['deadline'] = deadline
+    return config
+
+
+@pytest.mark.parametrize('scheduler, done, attainment', [
+    ('fcfs', {'chain': [2200, 3300], 'single': [4400]}, {'chain': 1.0, 'single': 0.0}),
+    ('edf', {'chain': [3300, 4400], 'single': [2200]}, {'chain': 1.0, 'single': 1.0}),
+    ('least_slack', {'chain': [2200, 4400], 'single': [3300]}, {'chain': 1.0, 'single': 1.0})])
+def test_scheduler_deadline(scheduler, done, attainment):
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), runtime=1000))
+    # Deadlines are at 4410 for chain and 3520 for single. Chain has less slack since it has two kernels left.
+    workload = {'blocker': _deadline_task(0), 'chain': _deadline_task(10, 4400, 2),
+                'single': _deadline_task(20, 3500)}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 1, 'partition': 'flexible'}
+    lapidary = Lapidary(config, workload, app_pool, scheduler=scheduler)
+    lapidary.run()
+    lapidary.task_logger.post_process()
+
+    tasks = {task.name: task for task in lapidary.task_logger.task_list}
+    assert {name: [kernel.timestamp.done for kernel in tasks[name].kernels] for name in done} == done
+    assert {task: sla['attainment'] for task, sla in lapidary.task_logger.sla.items()} == attainment
+
+
+@pytest.mark.parametrize('scheduler, schedule', [('fcfs', [(200, (1, 1)), (1300, (1, 4))]),
+                                                 ('lookahead', [(700, (1, 4)), (1100, (1, 4))])])
+def test_scheduler_lookahead(scheduler, schedule):
+    app_pool = AppPool("app_pool")
+    app_pool.add("blocker", AppConfig(prr_shape=(1, 1), runtime=200))
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), runtime=1000))
+    app_pool.add("app", AppConfig(prr_shape=(1, 4), runtime=300))
+    kernels = {'kernel_0': {'app': '', 'dependencies': []}, 'kernel_1': {'app': '', 'dependencies': ['kernel_0']}}
+    workload = {name: {'dist': {'type': 'fixed', 'start': start, 'interval': 100, 'size': 1},
+                       'kernels': {kernel: {**config, 'app': app} for kernel, config in kernels.items()}}
+                for name, app, start in [('blocker', 'blocker', 0), ('task', 'app', 10)]}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 4, 'partition': 'flexible'}
+    lapidary = Lapidary(config, workload, app_pool, scheduler=scheduler)
+    lapidary.run()
+
+    # FCFS runs the slow config on the prrs the blocker leaves. Lookahead waits for the whole array.
+    task = [task for task in lapidary.task_logger.task_list if task.name == 'task'][0]
+    assert [(kernel.timestamp.schedule, kernel.app_config.prr_shape) for kernel in task.kernels] == schedule
+
+
+def test_resource_timeline():
+    timeline = ResourceTimeline(4)
+    timeline.reserve(0, 100, 3)
+    timeline.reserve(50, 200, 1)
+    assert (timeline.times, timeline.usage) == ([0, 50, 100, 200], [3, 4, 1, 0])
+    assert timeline.earliest(0, 10, 1) == 0
+    assert timeline.earliest(40, 20, 1) == 100
+    assert timeline.earliest(0, 10, 2) == 100
+    assert timeline.earliest(150, 10, 4) == 200
+
+    timeline.advance(120)
+    timeline.reserve(0, 130, -1)
+    assert (timeline.times, timeline.usage) == ([120, 130, 200], [0, 1, 0])
+    with pytest.raises(Exception):
+        timeline.earliest(0, 10, 5)
+
+
+@pytest.mark.parametrize('max_batch_size, batch_window, done', [(1, 0, [1100, 1200, 2200, 2200, 3300, 3300]),
+                                                                (4, 0, [1100, 1200, 2700, 2700, 2700, 2700]),
+                                                                (4, 1000, [1100, 1900, 1900, 1900, 1900, 2400])])
+def test_scheduler_batching(max_batch_size, batch_window, done):
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), runtime=1000))
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), runtime=1500, batch_size=4))
+    workload = {'task': {'dist': {'type': 'fixed', 'start': 0, 'interval': 50, 'size': 6},
+                         'kernels': {'kernel_0': {'app': 'app', 'dependencies': []}}}}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 2, 'partition': 'flexible',
+              'max_batch_size': max_batch_size, 'batch_window': batch_window}
+    lapidary = Lapidary(config, workload, app_pool)
+    lapidary.run()
+
+    # A batch runs on the prrs of its first kernel and finishes every kernel in it. With a window, the second task
+    # waits for three more tasks while the first one runs, and the last task runs alone when its window expires.
+    assert [task.timestamp.done for task in lapidary.task_logger.task_list] == done
+    for task in lapidary.task_logger.task_list:
+        for follower in task.kernels[0].batch:
+            assert follower.timestamp.done == task.timestamp.done and len(follower.prrs) == 0
+
+
+def test_scheduler_batch_window():
+    app_pool = AppPool("app_pool")
+    app_pool.add("x", AppConfig(prr_shape=(1, 1), runtime=100000))
+    app_pool.add("a", AppConfig(prr_shape=(1, 1), runtime=1000))
+    app_pool.add("a", AppConfig(prr_shape=(1, 1), runtime=1500, batch_size=4))
+    workload = {'x': {'dist': {'type': 'fixed', 'start': 0, 'interval': 100, 'size': 1},
+                      'kernels': {'kernel_0': {'app': 'x', 'dependencies': []}}},
+                'a': {'dist': {'type': 'fixed', 'start': 100, 'interval': 100, 'size': 1},
+                      'kernels': {'kernel_0': {'app': 'a', 'dependencies': []}}}}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 4, 'partition': 'flexible',
+              'max_batch_size': 4, 'batch_window': 500}
+    lapidary = Lapidary(config, workload, app_pool)
+    lapidary.run()
+
+    # The kernel of a is first seen by the pass that ends at 200, and is dispatched alone when its window expires
+    # rather than when the kernel of x finishes
+    tasks = {task.name: task for task in lapidary.task_logger.task_list}
+    assert tasks['a'].kernels[0].timestamp.schedule == 700
+    assert tasks['a'].timestamp.done == 1700
+
+
+def test_scheduler_batch_tasks():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), runtime=1000))
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), runtime=500, batch_size=2))
+    kernels = {'kernel_0': {'app': 'app', 'dependencies': []}, 'kernel_1': {'app': 'app', 'dependencies': []}}
+    workload = {'task': {'dist': {'type': 'fixed', 'start': 0, 'interval': 100, 'size': 1}, 'kernels': kernels}}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 2, 'partition': 'flexible',
+              'max_batch_size': 2}
+    lapidary = Lapidary(config, workload, app_pool)
+    lapidary.run()
+
+    # Kernels of the same task are not batched together, and single kernels do not use app configs of batches
+    task = lapidary.task_logger.task_list[0]
+    assert [kernel.batch for kernel in task.kernels] == [[], []]
+    assert [kernel.app_config.runtime for kernel in task.kernels] == [1000, 1000]
+    assert task.timestamp.done == 1100
+
+
+@pytest.mark.parametrize('scheduler', ['fcfs', 'lookahead'])
+@pytest.mark.parametrize('preemption, done', [(False, {'low': 10100, 'high': 11200}),
+                                              (True, {'low': 11500, 'high': 2200})])
+def test_scheduler_preemption(scheduler, preemption, done):
+    app_pool = AppPool("app_pool")
+    app_pool.add("long", AppConfig(prr_shape=(1, 2), runtime=10000))
+    app_pool.add("short", AppConfig(prr_shape=(1, 1), runtime=1000))
+    workload = {'low': {'dist': {'type': 'fixed', 'start': 0, 'interval': 100, 'size': 1},
+                        'kernels': {'kernel_0': {'app': 'long', 'dependencies': []}}},
+                'high': {'dist': {'type': 'fixed', 'start': 1000, 'interval': 100, 'size': 1},
+                         'kernels': {'kernel_0': {'app': 'short', 'dependencies': []}}, 'priority': 1}}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 2, 'partition': 'flexible',
+              'preemption': preemption, 'save_latency': 100, 'restore_latency': 200}
+    lapidary = Lapidary(config, workload, app_pool, scheduler=scheduler)
+    lapidary.run()
+
+    # The high priority task takes the prrs of the running low priority kernel after its checkpoint is saved. The
+    # low priority kernel resumes its remaining 9000 cycles and restores its checkpoint when the prrs are idle.
+    tasks = {task.name: task for task in lapidary.task_logger.task_list}
+    assert {name: task.timestamp.done for name, task in tasks.items()} == done
+    assert tasks['low'].kernels[0].num_preemptions == int(preemption)
+    assert lapidary.accelerator.num_preemptions == int(preemption)
+
+    # The preempted kernel keeps its first schedule time and is logged in its prrs before and after preemption
+    lapidary.task_logger.post_process()
+    assert lapidary.task_logger.kernel_df.loc['low_1_kernel_0', 'ts_schedule'] == 100
+    intervals = lapidary.task_logger.prr_interval_df
+    low_intervals = intervals.loc[intervals['kernel_idx'] == 0, ['resource_id', 'start', 'end']]
+    expected = [(0, 100, 1100), (1, 100, 1100), (0, 2300, 11500), (1, 2300, 11500)] if preemption else \
+        [(0, 100, 10100), (1, 100, 10100)]
+    assert list(low_intervals.itertuples(index=False, name=None)) == expected
+
+
+@pytest.mark.parametrize('elastic, done', [(False, {'a': 1100, 'b': 8100}), (True, {'a': 1100, 'b': 5100})])
+def test_scheduler_elastic(elastic, done):
+    app_pool = AppPool("app_pool")
+    app_pool.add("short", AppConfig(prr_shape=(1, 1), runtime=1000))
+    app_pool.add("app", AppConfig(prr_shape=(1, 1), runtime=8000))
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), runtime=4000))
+    workload = {'a': {'dist': {'type': 'fixed', 'start': 0, 'interval': 100, 'size': 1},
+                      'kernels': {'kernel_0': {'app': 'short', 'dependencies': []}}},
+                'b': {'dist': {'type': 'fixed', 'start': 0, 'interval': 100, 'size': 1},
+                      'kernels': {'kernel_0': {'app': 'app', 'dependencies': []}}}}
+    config = {**accelerator_config, 'num_prr_height': 1, 'num_prr_width': 2, 'partition': 'flexible',
+              'elastic': elastic, 'resize_penalty': 500}
+    lapidary = Lapidary(config, workload, app_pool)
+    lapidary.run()
+
+    # The kernel of b starts on one prr and grows to both when a finishes. Its remaining 7000 cycles are halved by
+    # the runtime ratio of the app configs and the resize penalty is added.
+    tasks = {task.name: task for task in lapidary.task_logger.task_list}
+    assert {name: task.timestamp.done for name, task in tasks.items()} == done
+
+    # The resized kernel is logged in its first prr until it grows
+    lapidary.task_logger.post_process()
+    intervals = lapidary.task_logger.prr_interval_df
+    b_intervals = intervals.loc[intervals['kernel_idx'] == 1, ['resource_id', 'start', 'end']]
+    expected = [(1, 100, 1100), (0, 1100, 5100), (1, 1100, 5100)] if elastic else [(1, 100, 8100)]
+    assert list(b_intervals.itertuples(index=False, name=None)) == expected
+    kernel = tasks['b'].kernels[0]
+    assert (kernel.app_config.prr_shape, len(kernel.prrs)) == (((1, 2), 2) if elastic else ((1, 1), 1))
+    assert lapidary.accelerator.num_resizes == int(elastic)
@@ -0,0 +1,68 @@
+import os
+import pytest
+import tempfile
+from lapidary.app import AppConfig, AppPool
+from lapidary.sweep import Sweep, apply_point, expand_points, point_id
+from .test_configs import query_config, accelerator_config
+
+
+def test_sweep_points():
+    spec = {'grid': {'arch.num_prr_width': [4, 8], 'workload.*.dist.size': [2, 4]},
+            'points': [{'arch.partition': 'flexible'}],
+            'seeds': [0, 1]}
+    points = expand_points(spec)
+    assert len(points) == (2 * 2 + 1) * 2
+    assert points[0] == {'arch.num_prr_width': 4, 'workload.*.dist.size': 2, 'seed': 0}
+    assert point_id(points[0]) == point_id(dict(reversed(list(points[0].items()))))
+
+    arch_config, workload_config = apply_point(accelerator_config, {'query0': query_config, 'query1': query_config},
+                                               points[0])
+    assert arch_config['num_prr_width'] == 4
+    assert workload_config['query0']['dist']['size'] == 2
+    assert workload_config['query1']['dist']['size'] == 2
+    assert accelerator_config['num_prr_width'] == 4 and query_config['dist']['size'] == 10
+
+
+def test_sweep_resume():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=100))
+    spec = {'arch': accelerator_config, 'workload': {'query': query_config},
+            'grid': {'arch.num_prr_width': [2, 4]}}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, "sweep.csv")
+        df = Sweep({**spec, 'grid': {'arch.num_prr_width': [2]}}, app_pool).run(output, processes=1)
+        assert len(df) == 1
+        df = Sweep(spec, app_pool).run(output, processes=1)
+        assert len(df) == 2
+        assert sorted(df['arch.num_prr_width']) == [2, 4]
+        assert df['latency'].gt(0).all()
+
+
+def test_sweep_apps():
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=100))
+    app_pool.add("other", AppConfig(prr_shape=(1, 1), glb=2, runtime=100))
+    app_pool.add("unused", AppConfig(prr_shape=(1, 1), glb=2, runtime=100))
+    spec = {'arch': accelerator_config, 'workload': {'query': query_config},
+            'points': [{}, {'workload.query.kernels.kernel_1.app': 'other'}]}
+
+    # The app pool is frozen with the apps of the workload of every point only
+    sweep = Sweep(spec, app_pool)
+    assert sorted(app for app, _ in sweep.app_pool.apps) == ['app', 'other']
+
+
+def test_sweep_resume_point_ids(monkeypatch):
+    app_pool = AppPool("app_pool")
+    app_pool.add("app", AppConfig(prr_shape=(1, 2), glb=2, runtime=100))
+    spec = {'arch': accelerator_config, 'workload': {'query': query_config}, 'grid': {'arch.num_prr_width': [2]}}
+    monkeypatch.setattr('lapidary.sweep.point_id', lambda point: '0123456789012345')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, "sweep.csv")
+        Sweep(spec, app_pool).run(output, processes=1)
+        # A point id of digits keeps its leading zero, so the point is not run again
+        df = Sweep(spec, app_pool).run(output, processes=1)
+        assert list(df['point_id']) == ['0123456789012345']
+
+        # A spec with other parameters does not append to the file
+        with pytest.raises(Exception):
+            Sweep({**spec, 'grid': {'arch.num_prr_height': [1]}}, app_pool).run(output, processes=1)
@@ -0,0 +1,104 @@
+import simpy
+import pytest
+import numpy as np
+from lapidary.task_generator import TaskGenerator
+from lapidary.workload import Workload
+from lapidary.util.exceptions import CyclicDependencyException
+from .test_configs import query_config
+
+
+def test_task_generator_template():
+    env = simpy.Environment()
+    config = {'dist': query_config['dist'],
+              'kernels': {'kernel_2': {'app': 'app', 'dependencies': ['kernel_0', 'kernel_1']},
+                          'kernel_1': {'app': 'app', 'dependencies': ['kernel_0']},
+                          'kernel_0': {'app': 'app'}}}
+    task_generator = TaskGenerator(env, 'query', config)
+    template = task_generator.template
+    assert template.names == ('kernel_0', 'kernel_1', 'kernel_2')
+    assert template.successors == ((1, 2), (2,), ())
+    assert template.in_degree == (0, 1, 2)
+
+    task = task_generator._create_task(0)
+    assert [kernel.name for kernel in task.ready_kernels] == ['kernel_0']
+    assert task.update_dependency(task.kernels[0]) == [task.kernels[1]]
+    assert task.update_dependency(task.kernels[1]) == [task.kernels[2]]
+    # Template is not modified by task instances
+    assert template.in_degree == (0, 1, 2)
+
+
+def test_task_generator_deep_graph():
+    env = simpy.Environment()
+    num_kernels = 10000
+    kernels = {f"kernel_{i}": {'app': 'app', 'dependencies': [f"kernel_{i + 1}"]} for i in range(num_kernels - 1)}
+    kernels[f"kernel_{num_kernels - 1}"] = {'app': 'app', 'dependencies': []}
+    task_generator = TaskGenerator(env, 'query', {'dist': query_config['dist'], 'kernels': kernels})
+    assert task_generator.template.names[0] == f"kernel_{num_kernels - 1}"
+    assert task_generator.template.names[-1] == "kernel_0"
+
+
+def test_task_generator_cycle():
+    env = simpy.Environment()
+    kernels = {'kernel_0': {'app': 'app', 'dependencies': ['kernel_1']},
+               'kernel_1': {'app': 'app', 'dependencies': ['kernel_0']}}
+    with pytest.raises(CyclicDependencyException):
+        TaskGenerator(env, 'query', {'dist': query_config['dist'], 'kernels': kernels})
+
+
+def test_task_generator_seed():
+    env = simpy.Environment()
+    dist = {'type': 'poisson', 'start': 0, 'lambda': 100, 'size': 10}
+    kernels = {'kernel_0': {'app': 'app', 'dependencies': []}}
+    config = {'query0': {'dist': dist, 'kernels': kernels}, 'query1': {'dist': dist, 'kernels': kernels}}
+    reordered = {'query2': {'dist': dist, 'kernels': kernels}, 'query1': config['query1'], 'query0': config['query0']}
+
+    draws = {}
+    for workload_config in [config, reordered]:
+        workload = Workload(env, workload_config, seed=7)
+        for task_generator in workload.task_generators:
+            draws.setdefault(task_generator.name, []).append(list(task_generator.rng.poisson(100, 10)))
+
+    # Streams depend only on the seed and the generator name
+    assert draws['query0'][0] == draws['query0'][1]
+    assert draws['query1'][0] == draws['query1'][1]
+    assert draws['query0'][0] != draws['query1'][0]
+
+
+@pytest.mark.parametrize('dist', [{'type': 'poisson', 'lambda': 100},
+                                  {'type': 'mmpp', 'lambdas': [20, 500], 'dwells': [1000, 5000]},
+                                  {'type': 'mmpp', 'lambdas': [20, None], 'dwells': [1000, 5000],
+                                   'transition': [[0, 1], [1, 0]]},
+                                  {'type': 'onoff', 'lambda': 20, 'on': 1000, 'off': 5000},
+                                  {'type': 'diurnal', 'lambda': 100, 'period': 100000, 'amplitude': 0.5}])
+def test_arrival_process(dist):
+    env = simpy.Environment()
+    kernels = {'kernel_0': {'app': 'app', 'dependencies': []}}
+    task_generator = TaskGenerator(env, 'query', {'dist': {'start': 0, 'size': 10, **dist}, 'kernels': kernels},
+                                   seed=0)
+    arrival_process = task_generator.dist.create_arrival_process(task_generator.rng)
+    arrival_process.chunk_size = 256
+    chunks = [arrival_process.next_chunk() for _ in range(40)]
+    times = np.concatenate(chunks)
+    # Arrival times keep increasing across chunks and do not repeat
+    assert np.all(np.diff(times) >= 0)
+    assert len(np.unique(np.diff(times))) > len(times) // 2
+    if dist['type'] == 'poisson':
+        assert abs(np.diff(times).mean() - 100) < 5
+
+
+class _MaxRandom:
+    def random(self, num):
+        return np.full(num, np.nextafter(1.0, 0.0))
+
+
+def test_arrival_mmpp_transition_rounding():
+    env = simpy.Environment()
+    kernels = {'kernel_0': {'app': 'app', 'dependencies': []}}
+    dist = {'type': 'mmpp', 'lambdas': [20, 50, 100], 'dwells': [1000, 1000, 1000],
+            'transition': [[1, 4, 1], [1, 4, 1], [1, 4, 1]]}
+    task_generator = TaskGenerator(env, 'query', {'dist': {'start': 0, 'size': 10, **dist}, 'kernels': kernels},
+                                   seed=0)
+    arrival_process = task_generator.dist.create_arrival_process(task_generator.rng)
+    # Normalized rows of [1, 4, 1] sum to just below 1. The largest draw still picks the last state.
+    arrival_process.rng = _MaxRandom()  # type: ignore
+    assert list(arrival_process._next_states(3)) == [0, 2, 2]
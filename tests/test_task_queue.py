@@ -0,0 +1,66 @@
+import simpy
+from lapidary.task_queue import TaskQueue
+from lapidary.task_generator import TaskGenerator
+from .test_configs import query_config
+
+
+def test_task_queue_ready_kernels():
+    env = simpy.Environment()
+    task_queue = TaskQueue(env, maxsize=4)
+    task_generator = TaskGenerator(env, 'query', query_config)
+    tasks = [task_generator._create_task(i) for i in range(2)]
+    for task in tasks:
+        env.process(task_queue.put(task))
+    env.run()
+
+    # Only the first kernel of each task is ready, in arrival order
+    assert [kernel.tag for kernel in task_queue.get_ready_kernels()] == ['query_0_kernel_0', 'query_1_kernel_0']
+
+    kernel = tasks[1].kernels[0]
+    task_queue.update_kernel_scheduled(kernel)
+    assert task_queue.num_ready_kernels == 1
+
+    env.process(task_queue.update_kernel_done(kernel))
+    env.run()
+    assert [kernel.tag for kernel in task_queue.get_ready_kernels()] == ['query_0_kernel_0', 'query_1_kernel_1']
+
+
+def test_task_queue_independent_kernels():
+    env = simpy.Environment()
+    task_queue = TaskQueue(env, maxsize=4)
+    config = {'dist': query_config['dist'],
+              'kernels': {'kernel_0': {'app': 'app', 'dependencies': []},
+                          'kernel_1': {'app': 'app', 'dependencies': ['kernel_0']},
+                          'kernel_2': {'app': 'app', 'dependencies': ['kernel_0']},
+                          'kernel_3': {'app': 'app', 'dependencies': ['kernel_1', 'kernel_2']}}}
+    task = TaskGenerator(env, 'query', config)._create_task(0)
+    kernel_0, kernel_1, kernel_2, kernel_3 = task.kernels
+    env.process(task_queue.put(task))
+    env.run()
+    task_queue.update_kernel_scheduled(kernel_0)
+    env.process(task_queue.update_kernel_done(kernel_0))
+    env.run()
+
+    # Both branches are ready at the same time
+    assert task_queue.get_ready_kernels() == [kernel_1, kernel_2]
+
+    # Scheduling the later branch first keeps the earlier one pending
+    task_queue.update_kernel_scheduled(kernel_2)
+    assert task.pending_kernels == [kernel_1, kernel_3]
+    assert task_queue.get_ready_kernels() == [kernel_1]
+
+    task_queue.update_kernel_scheduled(kernel_1)
+    env.process(task_queue.update_kernel_done(kernel_2))
+    env.run()
+    assert task_queue.num_ready_kernels == 0
+
+    env.process(task_queue.update_kernel_done(kernel_1))
+    env.run()
+    assert task_queue.get_ready_kernels() == [kernel_3]
+    assert task.done is False
+
+    task_queue.update_kernel_scheduled(kernel_3)
+    env.process(task_queue.update_kernel_done(kernel_3))
+    env.run()
+    assert task.done is True
+    assert task_queue.size == 0